@@ -0,0 +1,164 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Headless batch publisher. Publishes a list of scene files into  #
+#   new versions of one job, each scene in a pool of mayapy worker  #
+#   processes, without opening the CGAssets window.                 #
+#                                                                   #
+#   mayapy CGAssetBatch.py --project P --asset A --job J            #
+#       --artist NAME [--processes N] scene.mb [scene.mb ...]       #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import sys
+import argparse
+import logging
+import traceback
+import multiprocessing
+import CGAssetSettings
+import CGAssetObjWriter
+import CGAssetVersions
+
+
+
+
+log = logging.getLogger( "CGAssetManager" )
+
+
+
+
+def initWorker():
+
+    #every worker is its own headless maya session
+    import maya.standalone
+    maya.standalone.initialize( name='python' )
+
+    import maya.cmds as cmds
+    cmds.loadPlugin( 'objExport', quiet=True )
+
+    logging.basicConfig( level=logging.INFO, format="%(process)d %(message)s" )
+
+
+
+def publishScene( job ):
+
+    #runs in a worker, errors come back as text so one scene cannot stop the rest
+    scene, rndDir, versionDir, jobName, version, artist = job
+
+    try:
+        import maya.cmds as cmds
+        import CGAssetPublish
+
+        cmds.file( scene, open=True, force=True )
+
+        #pool workers cannot start a pool of their own, and exit before a background upload would finish
+        settings = CGAssetSettings.loadSettings( rndDir )
+        if settings[ "objWriter" ] == "python":
+            settings[ "objWriter" ] = "maya"
+        settings[ "sceneSave" ] = "direct"
+
+        result = CGAssetPublish.Publisher( rndDir, versionDir, jobName, version, artist, settings=settings ).run()
+
+        return {
+            "scene": scene,
+            "version": version,
+            "meshes": len(result.geoList),
+            "textures": len(result.textures),
+            "failed": [ src + ": " + error for src, dst, error in result.failedTextures ] + [ path + ": " + error for path, error in result.failedExports ],
+            "error": None
+        }
+
+    except Exception:
+        return { "scene": scene, "version": version, "failed": [], "error": traceback.format_exc() }
+
+
+
+def parseArgs( argv ):
+
+    parser = argparse.ArgumentParser( description="Publish scene files into new versions of a CG asset job." )
+    parser.add_argument( "scenes", nargs="*", help="maya scene files, one new version each" )
+    parser.add_argument( "--scene-list", help="text file with one scene file per line" )
+    parser.add_argument( "--project", required=True )
+    parser.add_argument( "--asset", required=True )
+    parser.add_argument( "--job", required=True )
+    parser.add_argument( "--artist", required=True )
+    parser.add_argument( "--processes", type=int, default=multiprocessing.cpu_count(), help="mayapy workers, one per core by default" )
+    parser.add_argument( "--root", default=CGAssetSettings.serverRoot, help="project root, //core/ripley/ by default" )
+
+    args = parser.parse_args( argv )
+
+    scenes = list( args.scenes )
+    if args.scene_list:
+        with open( args.scene_list, 'r' ) as f:
+            scenes += [ line.strip() for line in f if line.strip() and not line.startswith( "#" ) ]
+
+    if not scenes:
+        parser.error( "no scene files given" )
+
+    return args, scenes
+
+
+
+def main( argv=None ):
+
+    logging.basicConfig( level=logging.INFO, format="%(message)s" )
+    args, scenes = parseArgs( argv )
+
+    root = args.root.replace( "\\", "/" )
+    if not root.endswith( "/" ):
+        root += "/"
+
+    rndDir = root+args.project+"/09_CG_RnD"
+    jobDir = rndDir+"/CG_Assets/"+args.asset+"/"+args.job
+
+    if not os.path.isdir( rndDir ):
+        log.error( "Missing directory " + rndDir )
+        return 2
+
+    missing = [ scene for scene in scenes if not os.path.isfile( scene ) ]
+    if missing:
+        log.error( "Missing scene files:\n" + "\n".join( missing ) )
+        return 2
+
+    if not os.path.isdir( jobDir ):
+        os.makedirs( jobDir )
+
+    #versions are reserved here, before any worker starts
+    jobs = []
+    for scene in scenes:
+        version = CGAssetVersions.allocateVersion( jobDir )
+        jobs.append( ( os.path.abspath( scene ), rndDir, jobDir+"/"+version, args.job, version, args.artist ) )
+        log.info( scene + " -> " + version )
+
+    #this process has not started maya, so where spawn is missing forking it is safe
+    context = CGAssetObjWriter.workerContext() or multiprocessing
+
+    failures = 0
+    pool = context.Pool( max( 1, min( args.processes, len(jobs) ) ), initializer=initWorker )
+    try:
+        for result in pool.imap_unordered( publishScene, jobs ):
+            if result[ "error" ]:
+                failures += 1
+                log.error( "FAILED " + result[ "scene" ] + " (" + result[ "version" ] + ")\n" + result[ "error" ] )
+                continue
+
+            log.info( "Published " + result[ "scene" ] + " as " + result[ "version" ] + ": " + str(result[ "meshes" ]) + " meshes, " + str(result[ "textures" ]) + " textures." )
+            for failed in result[ "failed" ]:
+                log.warning( "  " + failed )
+    finally:
+        pool.close()
+        pool.join()
+
+    log.info( str(len(jobs)-failures) + " of " + str(len(jobs)) + " scenes published." )
+
+    return 1 if failures else 0
+
+
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
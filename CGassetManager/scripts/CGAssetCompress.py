@@ -0,0 +1,194 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Streaming gzip compression for files published to the server.   #
+#   Data goes through in chunks on its way out, never as a whole    #
+#   file in memory, and readers open a published file the same      #
+#   way whether it was compressed or not.                           #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import io
+import sys
+import gzip
+import hashlib
+import contextlib
+import CGAssetCopy
+import CGAssetFingerprint
+
+
+
+
+#extension added to compressed files
+gzipExt = ".gz"
+
+#zlib level, the link to the server is slower than level 6 on any workstation
+compressionLevel = 6
+
+
+
+
+def compressed( settings ):
+
+    return settings.get( "compression" ) == "gzip"
+
+
+
+def publishedName( name, settings ):
+
+    #name a file gets on the server under these settings
+    return name+gzipExt if compressed( settings ) else name
+
+
+
+def findPublished( path ):
+
+    #the file as published, plain or compressed, None if neither is there
+    for candidate in ( path, path+gzipExt ):
+        if os.path.isfile( candidate ):
+            return candidate
+    return None
+
+
+
+def stripExt( path ):
+
+    return path[ :-len(gzipExt) ] if path.endswith( gzipExt ) else path
+
+
+
+def openRead( path ):
+
+    #binary file object, decompressed on the fly for .gz files
+    if path.endswith( gzipExt ):
+        return gzip.open( path, 'rb' )
+    return open( path, 'rb' )
+
+
+
+
+class HashingFile():
+
+    #write-only wrapper that hashes every byte on its way to the file
+    def __init__( self, fileobj ):
+
+        self.fileobj = fileobj
+        self.hash = hashlib.new( CGAssetFingerprint.hashName )
+        self.size = 0
+
+
+
+    def write( self, data ):
+
+        self.hash.update( data )
+        self.size += len(data)
+        return self.fileobj.write( data )
+
+
+
+    def flush( self ):
+
+        self.fileobj.flush()
+
+
+
+    def hexdigest( self ):
+
+        return self.hash.hexdigest()
+
+
+
+
+def gzipWriter( fileobj, name ):
+
+    #the header carries the name the file has once decompressed
+    return gzip.GzipFile( filename=os.path.basename( stripExt( name ) ), mode='wb', compresslevel=compressionLevel, fileobj=fileobj )
+
+
+
+@contextlib.contextmanager
+def openWrite( partFile, name, text=False ):
+
+    #compressed file object for partFile, text mode writes str on python 2 and 3
+    raw = open( partFile, 'wb' )
+    try:
+        gz = gzipWriter( raw, name )
+        try:
+            if text and sys.version_info[0] >= 3:
+                wrapper = io.TextIOWrapper( gz, encoding="utf-8", newline="" )
+                yield wrapper
+                wrapper.flush()
+                wrapper.detach()
+            else:
+                yield gz
+        finally:
+            gz.close()
+    finally:
+        raw.close()
+
+
+
+def streamFile( src, dst, compress=False, heartbeat=None ):
+
+    #copy src into dst.part chunk by chunk, compressing on the way when asked.
+    #returns the hash and size of the bytes that were written
+    partFile = dst+".part"
+    with open( src, 'rb' ) as fIn:
+        with open( partFile, 'wb' ) as raw:
+            out = HashingFile( raw )
+            sink = gzipWriter( out, dst ) if compress else out
+            while True:
+                chunk = fIn.read( CGAssetCopy.chunkSize )
+                if not chunk:
+                    break
+                sink.write( chunk )
+                if heartbeat is not None:
+                    heartbeat()
+            if compress:
+                sink.close()
+            raw.flush()
+            os.fsync( raw.fileno() )
+
+    return out.hexdigest(), out.size
+
+
+
+def compressFile( src, dst ):
+
+    #compress src into dst, returns the hash of the compressed file
+    try:
+        digest, size = streamFile( src, dst, compress=True )
+        CGAssetCopy.replaceFile( dst+".part", dst )
+    finally:
+        if os.path.exists( dst+".part" ):
+            os.remove( dst+".part" )
+
+    CGAssetFingerprint.fingerprints.remember( dst, digest )
+    return digest
+
+
+
+def decompressFile( src, dst ):
+
+    #write the decompressed contents of src to dst
+    partFile = dst+".part"
+    try:
+        with gzip.open( src, 'rb' ) as fIn:
+            with open( partFile, 'wb' ) as fOut:
+                while True:
+                    chunk = fIn.read( CGAssetCopy.chunkSize )
+                    if not chunk:
+                        break
+                    fOut.write( chunk )
+        CGAssetCopy.replaceFile( partFile, dst )
+    finally:
+        if os.path.exists( partFile ):
+            os.remove( partFile )
+
+    return dst
@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Copy engine used when publishing files to the server. Files     #
+#   are copied by a pool of worker threads in chunks, so per file   #
+#   and total byte progress is known, and failures are collected    #
+#   and handed back instead of stopping the whole copy.             #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import shutil
+import threading
+import time
+import CGAssetTrace
+from multiprocessing.pool import ThreadPool
+
+
+
+
+#number of files copied at the same time
+defaultThreads = 8
+
+#bytes read and written per chunk
+chunkSize = 4*1024*1024
+
+#seconds between progress callbacks
+progressInterval = 0.1
+
+
+
+
+def replaceFile( src, dst ):
+
+    #rename over an existing file, windows will not do it on its own
+    try:
+        os.rename( src, dst )
+    except OSError:
+        if not os.path.exists( dst ):
+            raise
+        os.remove( dst )
+        os.rename( src, dst )
+
+
+
+
+class CopyResult():
+
+    #constructor
+    def __init__( self ):
+
+        #list of ( src, dst ) that made it
+        self.copied = []
+
+        #list of ( src, dst, error message ) that did not
+        self.failed = []
+
+        self.totalBytes = 0
+        self.copiedBytes = 0
+        self.seconds = 0.0
+
+
+
+
+class CopyEngine():
+
+    #constructor
+    def __init__( self, threads=defaultThreads ):
+
+        self.threads = max( 1, int(threads) )
+        self.lock = threading.Lock()
+        self.reset()
+
+
+
+    def reset( self ):
+
+        #src -> [ bytes done, bytes total ]
+        self.fileProgress = {}
+        self.filesDone = 0
+        self.filesTotal = 0
+        self.bytesDone = 0
+        self.bytesTotal = 0
+
+
+
+    def snapshot( self ):
+
+        with self.lock:
+            return {
+                "filesDone": self.filesDone,
+                "filesTotal": self.filesTotal,
+                "bytesDone": self.bytesDone,
+                "bytesTotal": self.bytesTotal,
+                "inFlight": dict( ( src, tuple(p) ) for src, p in self.fileProgress.items() if p[0] < p[1] )
+            }
+
+
+
+    def copyOne( self, job ):
+
+        src, dst = job
+        partFile = dst + ".part"
+        span = CGAssetTrace.span( os.path.basename( src ), "copy", src=src, bytes=self.fileProgress[ src ][1] )
+
+        try:
+            with open( src, 'rb' ) as fIn:
+                with open( partFile, 'wb' ) as fOut:
+                    while True:
+                        chunk = fIn.read( chunkSize )
+                        if not chunk:
+                            break
+                        fOut.write( chunk )
+
+                        with self.lock:
+                            self.fileProgress[ src ][0] += len(chunk)
+                            self.bytesDone += len(chunk)
+
+            shutil.copymode( src, partFile )
+            replaceFile( partFile, dst )
+
+        except Exception as e:
+            if os.path.exists( partFile ):
+                try:
+                    os.remove( partFile )
+                except OSError:
+                    pass
+            error = str(e)
+        else:
+            error = None
+
+        if error is not None:
+            span.set( error=error )
+        span.close()
+
+        with self.lock:
+            self.filesDone += 1
+
+        return src, dst, error
+
+
+
+    def copyFiles( self, jobs, progress=None ):
+
+        #jobs is a list of ( src, dst ). progress is called on the
+        #calling thread with a snapshot, never from a worker
+        self.reset()
+        result = CopyResult()
+        start = time.time()
+
+        todo = []
+        for src, dst in jobs:
+            try:
+                size = os.path.getsize( src )
+            except OSError as e:
+                result.failed.append( ( src, dst, str(e) ) )
+                continue
+
+            self.fileProgress[ src ] = [ 0, size ]
+            self.bytesTotal += size
+            todo.append( ( src, dst ) )
+
+        self.filesTotal = len(todo)
+        result.totalBytes = self.bytesTotal
+
+        if todo:
+            pool = ThreadPool( min( self.threads, len(todo) ) )
+            try:
+                pending = pool.map_async( self.copyOne, todo, chunksize=1 )
+
+                while not pending.ready():
+                    pending.wait( progressInterval )
+                    if progress is not None:
+                        progress( self.snapshot() )
+
+                for src, dst, error in pending.get():
+                    if error is None:
+                        result.copied.append( ( src, dst ) )
+                    else:
+                        result.failed.append( ( src, dst, error ) )
+            finally:
+                pool.close()
+                pool.join()
+
+        if progress is not None:
+            progress( self.snapshot() )
+
+        result.copiedBytes = sum( self.fileProgress[ src ][1] for src, dst in result.copied )
+        result.seconds = time.time() - start
+
+        return result
@@ -0,0 +1,401 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Local asset index service. One process per workstation keeps    #
+#   the project/asset/job/version tree warm in a DirIndex and       #
+#   answers every maya session over a loopback socket. Sessions     #
+#   start it on demand and scan the share themselves until it is    #
+#   up, or if it cannot be reached at all.                          #
+#                                                                   #
+#   python CGAssetDaemon.py [--root DIR] [--port N]                 #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import CGAssetIndex
+import CGAssetSettings
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+
+
+
+#loopback port of the service, CGAM_INDEX_PORT moves it
+defaultPort = int( os.environ.get( "CGAM_INDEX_PORT" ) or 47821 )
+
+#set CGAM_INDEX_DAEMON=0 to always scan the share directly
+daemonEnabled = os.environ.get( "CGAM_INDEX_DAEMON", "1" ) != "0"
+
+#seconds a listing the service holds is trusted before its mtime is checked again
+cacheLifetime = 20.0
+
+#seconds between walks that keep the tree warm, longer than cacheLifetime
+#so a walk finds unchanged listings cached and only stats them
+warmInterval = 60.0
+
+#the service quits after this many seconds without a request
+idleTimeout = 8*60*60
+
+#seconds a session waits before trying the service again
+retryInterval = 10.0
+
+#seconds a single request may take before the session gives up on it
+requestTimeout = 5.0
+
+
+
+
+def jobTree( index, root ):
+
+    #every job folder the window browses, in the order it browses them.
+    #the job listing is the deepest the window reads, a version folder is
+    #looked up in it and the rest comes from the job's version files and manifests
+    for project in index.listdir( root ):
+        rndDir = root+project+"/09_CG_RnD"
+        if not index.exists( rndDir ):
+            continue
+
+        assetsDir = rndDir+"/CG_Assets"
+        for asset in index.listdir( assetsDir ):
+            for job in index.listdir( assetsDir+"/"+asset ):
+                yield assetsDir+"/"+asset+"/"+job
+
+
+
+
+class IndexService():
+
+    #constructor
+    def __init__( self, root, ttl=cacheLifetime ):
+
+        self.root = CGAssetIndex.normPath( root ) + "/"
+        self.index = CGAssetIndex.DirIndex( ttl=ttl )
+        self.lastRequest = time.time()
+        self.running = True
+
+
+
+    def allowed( self, path ):
+
+        #only the project tree is served
+        path = CGAssetIndex.normPath( path )
+        return path + "/" == self.root or path.startswith( self.root )
+
+
+
+    def warmOnce( self ):
+
+        #one walk down to the job listings
+        for jobDir in jobTree( self.index, self.root ):
+            self.index.listdir( jobDir )
+            if not self.running:
+                return
+
+
+
+    def warm( self ):
+
+        #walk the tree so the first question from a session is already answered
+        while self.running:
+            start = time.time()
+            try:
+                self.warmOnce()
+            except Exception as e:
+                sys.stderr.write( "Index warm up failed: " + str(e) + "\n" )
+            if not self.running:
+                return
+
+            if time.time() - self.lastRequest > idleTimeout:
+                self.running = False
+                return
+
+            time.sleep( max( 1.0, warmInterval - ( time.time() - start ) ) )
+
+
+
+    def answer( self, request ):
+
+        self.lastRequest = time.time()
+        op = request.get( "op" )
+        path = request.get( "path" )
+
+        if op == "ping":
+            return { "ok": True, "root": self.root, "pid": os.getpid() }
+
+        if op == "shutdown":
+            self.running = False
+            return { "ok": True }
+
+        if path is None or not self.allowed( path ):
+            return { "ok": False, "error": "path outside of " + self.root }
+
+        if op == "listdir":
+            return { "ok": True, "names": self.index.listdir( path ) }
+        if op == "exists":
+            return { "ok": True, "exists": self.index.exists( path ) }
+        if op == "invalidate":
+            self.index.invalidate( path, recursive=bool( request.get( "recursive" ) ) )
+            return { "ok": True }
+        if op == "refresh":
+            return { "ok": True, "names": self.index.refresh( path, recursive=bool( request.get( "recursive" ) ) ) }
+
+        return { "ok": False, "error": "unknown op " + str(op) }
+
+
+
+
+class RequestHandler( socketserver.StreamRequestHandler ):
+
+    #one json request per line, one json answer per line
+    def handle( self ):
+
+        service = self.server.service
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                answer = service.answer( json.loads( line.decode( "utf-8" ) ) )
+            except Exception as e:
+                answer = { "ok": False, "error": str(e) }
+
+            self.wfile.write( ( json.dumps( answer ) + "\n" ).encode( "utf-8" ) )
+            self.wfile.flush()
+
+            if not service.running:
+                threading.Thread( target=self.server.shutdown ).start()
+                return
+
+
+
+
+class IndexServer( socketserver.ThreadingMixIn, socketserver.TCPServer ):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+
+
+def serve( root, port=defaultPort ):
+
+    service = IndexService( root )
+    server = IndexServer( ( "127.0.0.1", port ), RequestHandler )
+    server.service = service
+
+    warmer = threading.Thread( target=service.warm )
+    warmer.daemon = True
+    warmer.start()
+
+    #stop serving once the warmer has gone idle
+    def watchIdle():
+        while service.running:
+            time.sleep( 5.0 )
+        server.shutdown()
+
+    watcher = threading.Thread( target=watchIdle )
+    watcher.daemon = True
+    watcher.start()
+
+    try:
+        server.serve_forever()
+    finally:
+        service.running = False
+        server.server_close()
+
+
+
+def startService( root, port=defaultPort ):
+
+    #launch the service in the background, detached from this session
+    import CGAssetObjWriter
+    python = CGAssetObjWriter.pythonExecutable() or sys.executable
+
+    command = [ python, os.path.abspath( __file__ ).replace( ".pyc", ".py" ), "--root", root, "--port", str(port) ]
+
+    kwargs = {}
+    if os.name == 'nt':
+        #DETACHED_PROCESS | CREATE_NO_WINDOW
+        kwargs[ "creationflags" ] = 0x00000008 | 0x08000000
+    else:
+        kwargs[ "preexec_fn" ] = os.setsid
+
+    env = dict( os.environ )
+    env[ "PYTHONPATH" ] = os.path.dirname( os.path.abspath( __file__ ) ) + os.pathsep + env.get( "PYTHONPATH", "" )
+
+    devnull = open( os.devnull, 'w' )
+    subprocess.Popen( command, stdin=devnull, stdout=devnull, stderr=devnull, close_fds=( os.name != 'nt' ), env=env, **kwargs )
+    devnull.close()
+
+
+
+
+class DaemonIndex():
+
+    #same calls as CGAssetIndex.DirIndex, answered by the service when it is up
+    def __init__( self, root, port=defaultPort, fallback=None, autoStart=True ):
+
+        self.root = root
+        self.port = port
+        self.fallback = fallback or CGAssetIndex.assetIndex
+        self.autoStart = autoStart
+        self.started = False
+        self.sock = None
+        self.reader = None
+        self.nextTry = 0.0
+        self.lock = threading.Lock()
+
+
+
+    def connect( self ):
+
+        if self.sock is not None:
+            return True
+        if time.time() < self.nextTry:
+            return False
+
+        try:
+            sock = socket.create_connection( ( "127.0.0.1", self.port ), timeout=requestTimeout )
+        except ( socket.error, OSError ):
+            self.nextTry = time.time() + retryInterval
+
+            #nobody listening, start it for the next time round
+            if self.autoStart and not self.started:
+                self.started = True
+                try:
+                    startService( self.root, self.port )
+                except Exception as e:
+                    sys.stderr.write( "Could not start the asset index service: " + str(e) + "\n" )
+            return False
+
+        self.sock = sock
+        self.reader = sock.makefile( 'rb' )
+        return True
+
+
+
+    def disconnect( self ):
+
+        for closable in ( self.reader, self.sock ):
+            try:
+                if closable is not None:
+                    closable.close()
+            except ( socket.error, OSError ):
+                pass
+        self.sock = None
+        self.reader = None
+        self.nextTry = time.time() + retryInterval
+
+
+
+    def request( self, **request ):
+
+        #answer from the service, None if the share has to be scanned here
+        with self.lock:
+            if not self.connect():
+                return None
+
+            try:
+                self.sock.sendall( ( json.dumps( request ) + "\n" ).encode( "utf-8" ) )
+                line = self.reader.readline()
+                if not line:
+                    raise socket.error( "connection closed" )
+                answer = json.loads( line.decode( "utf-8" ) )
+            except ( socket.error, OSError, ValueError ):
+                self.disconnect()
+                return None
+
+        if not answer.get( "ok" ):
+            return None
+        return answer
+
+
+
+    def listdir( self, path ):
+
+        answer = self.request( op="listdir", path=path )
+        if answer is None:
+            return self.fallback.listdir( path )
+        return answer[ "names" ]
+
+
+
+    def exists( self, path ):
+
+        answer = self.request( op="exists", path=path )
+        if answer is None:
+            return self.fallback.exists( path )
+        return answer[ "exists" ]
+
+
+
+    def invalidate( self, path, recursive=False ):
+
+        #both copies have to forget, the session may fall back later
+        self.fallback.invalidate( path, recursive=recursive )
+        self.request( op="invalidate", path=path, recursive=recursive )
+
+
+
+    def refresh( self, path, recursive=False ):
+
+        self.fallback.invalidate( path, recursive=recursive )
+        answer = self.request( op="refresh", path=path, recursive=recursive )
+        if answer is None:
+            return self.fallback.refresh( path, recursive=recursive )
+        return answer[ "names" ]
+
+
+
+    def clear( self ):
+
+        self.fallback.clear()
+
+
+
+
+#one client per maya session
+_sessionIndex = None
+
+def sessionIndex( root=None ):
+
+    #index the window should use, the service when enabled, else the local cache
+    global _sessionIndex
+
+    if not daemonEnabled:
+        return CGAssetIndex.assetIndex
+
+    if _sessionIndex is None:
+        _sessionIndex = DaemonIndex( root or CGAssetSettings.serverRoot )
+    return _sessionIndex
+
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser( description="Serve the CG asset directory tree to every maya session on this workstation." )
+    parser.add_argument( "--root", default=CGAssetSettings.serverRoot, help="project root, //core/ripley/ by default" )
+    parser.add_argument( "--port", type=int, default=defaultPort )
+    args = parser.parse_args()
+
+    try:
+        serve( args.root, args.port )
+    except socket.error as e:
+        #another session got there first
+        sys.stderr.write( "Asset index service not started: " + str(e) + "\n" )
+        sys.exit( 1 )
@@ -0,0 +1,340 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Dirty tracking of meshes and file textures. Scene callbacks     #
+#   remember which mesh and file nodes changed since the scene      #
+#   matched a published version, and the set is saved with the      #
+#   scene in fileInfo, so a publish only has to look at those.      #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import json
+import time
+import maya.cmds as cmds
+import maya.api.OpenMaya as om2
+import CGAssetIndex
+
+
+
+
+#fileInfo entry the state is saved in
+fileInfoKey = "cgamDirty"
+
+#node types that are tracked, with their function set type
+trackedTypes = { "mesh": om2.MFn.kMesh, "file": om2.MFn.kFileTexture }
+
+#seconds a save may take, a scene written later than that was saved without the tracker
+saveSlack = 300.0
+
+
+
+
+class DirtyTracker():
+
+    #constructor
+    def __init__( self ):
+
+        self.installed = False
+        self.loading = False
+
+        #scene and type callbacks, per node callbacks by node hash
+        self.sceneCallbacks = []
+        self.nodeCallbacks = {}
+
+        #node hash -> MObjectHandle of every node that changed
+        self.dirty = {}
+
+        #version folder the clean nodes match, and whether the set can be believed
+        self.base = None
+        self.trusted = False
+
+
+
+    def install( self ):
+
+        #start watching, nothing before this is known so the set is only trusted if the scene is untouched
+        if self.installed:
+            return
+        self.installed = True
+
+        for message in ( om2.MSceneMessage.kBeforeOpen, om2.MSceneMessage.kBeforeNew ):
+            self.sceneCallbacks.append( om2.MSceneMessage.addCallback( message, self.beforeLoad ) )
+        for message in ( om2.MSceneMessage.kAfterOpen, om2.MSceneMessage.kAfterNew ):
+            self.sceneCallbacks.append( om2.MSceneMessage.addCallback( message, self.afterLoad ) )
+        self.sceneCallbacks.append( om2.MSceneMessage.addCallback( om2.MSceneMessage.kBeforeSave, self.beforeSave ) )
+
+        for nodeType in trackedTypes:
+            self.sceneCallbacks.append( om2.MDGMessage.addNodeAddedCallback( self.nodeAdded, nodeType ) )
+            self.sceneCallbacks.append( om2.MDGMessage.addNodeRemovedCallback( self.nodeRemoved, nodeType ) )
+
+        self.afterLoad()
+
+
+
+    def uninstall( self ):
+
+        if not self.installed:
+            return
+        om2.MMessage.removeCallbacks( self.sceneCallbacks )
+        self.sceneCallbacks = []
+        self.unwatchAll()
+        self.installed = False
+        self.trusted = False
+
+
+
+    def watch( self, node ):
+
+        key = om2.MObjectHandle( node ).hashCode()
+        if key in self.nodeCallbacks:
+            return
+
+        ids = [ om2.MNodeMessage.addNodeDirtyCallback( node, self.nodeChanged ),
+                om2.MNodeMessage.addAttributeChangedCallback( node, self.attributeChanged ) ]
+
+        #meshes are exported in world space, moving or reparenting a parent changes them too
+        if node.hasFn( om2.MFn.kDagNode ):
+            try:
+                dagPath = om2.MDagPath.getAPathTo( node )
+                ids.append( om2.MDagMessage.addWorldMatrixModifiedCallback( dagPath, self.matrixChanged, node ) )
+                ids.append( om2.MDagMessage.addAllDagChangesDagPathCallback( dagPath, self.dagChanged, node ) )
+            except RuntimeError:
+                #not under a transform yet, it is dirty anyway and watched again after the next publish
+                pass
+        self.nodeCallbacks[ key ] = ids
+
+
+
+    def unwatch( self, key ):
+
+        ids = self.nodeCallbacks.pop( key, None )
+        if ids:
+            om2.MMessage.removeCallbacks( ids )
+
+
+
+    def unwatchAll( self ):
+
+        for key in list( self.nodeCallbacks ):
+            self.unwatch( key )
+
+
+
+    def watchScene( self ):
+
+        self.unwatchAll()
+        for fnType in trackedTypes.values():
+            nodes = om2.MItDependencyNodes( fnType )
+            while not nodes.isDone():
+                self.watch( nodes.thisNode() )
+                nodes.next()
+
+
+
+    def markDirty( self, node ):
+
+        handle = om2.MObjectHandle( node )
+        self.dirty[ handle.hashCode() ] = handle
+
+
+
+    #-----------------------------------------------#
+    #                  CALLBACKS                    #
+    #-----------------------------------------------#
+
+    def nodeChanged( self, node, clientData ):
+
+        if not self.loading and om2.MObjectHandle( node ).hashCode() not in self.dirty:
+            self.markDirty( node )
+
+
+
+    def attributeChanged( self, message, plug, otherPlug, clientData ):
+
+        if self.loading:
+            return
+        if message & ( om2.MNodeMessage.kAttributeSet | om2.MNodeMessage.kConnectionMade | om2.MNodeMessage.kConnectionBroken ):
+            self.markDirty( plug.node() )
+
+
+
+    def matrixChanged( self, transform, modified, node ):
+
+        if not self.loading and om2.MObjectHandle( node ).hashCode() not in self.dirty:
+            self.markDirty( node )
+
+
+
+    def dagChanged( self, message, child, parent, node ):
+
+        if not self.loading:
+            self.markDirty( node )
+
+
+
+    def nodeAdded( self, node, clientData ):
+
+        #nodes read in by an open are the scene, imported and new ones are changes
+        if self.loading:
+            return
+        self.watch( node )
+        self.markDirty( node )
+
+
+
+    def nodeRemoved( self, node, clientData ):
+
+        key = om2.MObjectHandle( node ).hashCode()
+        self.unwatch( key )
+        self.dirty.pop( key, None )
+
+
+
+    def beforeLoad( self, clientData=None ):
+
+        self.loading = True
+
+
+
+    def afterLoad( self, clientData=None ):
+
+        #a freshly opened scene, its saved state is believed if the file was last written with it
+        self.loading = False
+        self.dirty = {}
+        self.watchScene()
+
+        state = self.readState()
+        self.base = state.get( "base" )
+        self.trusted = False
+        if self.base is not None and state.get( "trusted" ) and not cmds.file( query=True, modified=True ):
+            sceneName = cmds.file( query=True, sceneName=True )
+            try:
+                written = os.path.getmtime( sceneName )
+            except OSError:
+                written = None
+            if written is not None and 0 <= written - state.get( "saved", 0 ) < saveSlack:
+                self.trusted = True
+        self.restoreDirty( state.get( "meshes", [] ) + state.get( "files", [] ) )
+
+
+
+    def beforeSave( self, clientData=None ):
+
+        self.writeState()
+
+
+
+    #-----------------------------------------------#
+    #                    STATE                      #
+    #-----------------------------------------------#
+
+    def dirtyNames( self, nodeType ):
+
+        #names of the changed nodes of one type, the way cmds.ls prints them
+        names = set()
+        for handle in list( self.dirty.values() ):
+            if not handle.isValid():
+                continue
+            node = handle.object()
+            fn = om2.MFnDependencyNode( node )
+            if fn.typeName != nodeType:
+                continue
+            names.add( om2.MFnDagNode( node ).partialPathName() if node.hasFn( om2.MFn.kDagNode ) else fn.name() )
+        return names
+
+
+
+    def restoreDirty( self, names ):
+
+        for name in names:
+            selection = om2.MSelectionList()
+            try:
+                selection.add( name )
+            except RuntimeError:
+                continue
+            self.markDirty( selection.getDependNode( 0 ) )
+
+
+
+    def readState( self ):
+
+        values = cmds.fileInfo( fileInfoKey, query=True ) or []
+        if not values:
+            return {}
+
+        #some maya versions hand the string back escaped
+        text = values[0]
+        for candidate in ( text, text.replace( '\\\\', '\0' ).replace( '\\"', '"' ).replace( '\0', '\\' ) ):
+            try:
+                return json.loads( candidate )
+            except ValueError:
+                continue
+        return {}
+
+
+
+    def writeState( self ):
+
+        state = {
+            "base": self.base,
+            "trusted": self.trusted,
+            "saved": time.time(),
+            "meshes": sorted( self.dirtyNames( "mesh" ) ),
+            "files": sorted( self.dirtyNames( "file" ) )
+        }
+        cmds.fileInfo( fileInfoKey, json.dumps( state, sort_keys=True ) )
+
+
+
+    def openedVersion( self, versionDir ):
+
+        #the scene was just opened from a published version, which is only ever saved by a publish
+        if not self.installed:
+            return
+        if self.base is not None and CGAssetIndex.normPath( self.base ) == CGAssetIndex.normPath( versionDir ) and not cmds.file( query=True, modified=True ):
+            self.trusted = True
+
+
+
+    def cleanNames( self, nodeType, versionDir ):
+
+        #names of the nodes unchanged since versionDir was published, None if that is not known
+        if not self.installed or not self.trusted or self.base is None:
+            return None
+        if CGAssetIndex.normPath( self.base ) != CGAssetIndex.normPath( versionDir ):
+            return None
+        return set( cmds.ls( type=nodeType ) or [] ) - self.dirtyNames( nodeType )
+
+
+
+    def markPublished( self, versionDir ):
+
+        #everything matches versionDir from here on, written before the scene is saved so it is saved along
+        self.base = versionDir
+        self.dirty = {}
+        self.trusted = self.installed
+        if self.installed:
+            #dag callbacks follow the path a node had when it was watched
+            self.watchScene()
+        self.writeState()
+
+
+
+    def forget( self ):
+
+        #a publish did not finish, nothing is known about the scene any more
+        self.trusted = False
+        if self.installed:
+            self.writeState()
+
+
+
+
+#one tracker per maya session, installed by the window
+tracker = DirtyTracker()
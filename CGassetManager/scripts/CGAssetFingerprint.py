@@ -0,0 +1,217 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Persistent file fingerprint cache. Content hashes are kept on   #
+#   this workstation keyed by path, size, mtime and inode, so a     #
+#   file is only read and hashed again after it really changed.     #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import json
+import time
+import hashlib
+import threading
+import CGAssetCopy
+import CGAssetSettings
+
+
+
+
+#hash used for every fingerprint, also the key of the texture store
+hashName = "sha1"
+
+#bytes read per chunk while hashing
+hashChunkSize = 4*1024*1024
+
+#file inside the local cache folder
+cacheFileName = "fingerprints.json"
+
+#entries kept, least recently used ones are dropped past this
+maxEntries = 200000
+
+
+
+
+def hashFile( path ):
+
+    digest = hashlib.new( hashName )
+    with open( path, 'rb' ) as f:
+        while True:
+            chunk = f.read( hashChunkSize )
+            if not chunk:
+                break
+            digest.update( chunk )
+    return digest.hexdigest()
+
+
+
+def statKey( path ):
+
+    #what has to match for a stored hash to still be trusted
+    st = os.stat( path )
+    return [ st.st_size, st.st_mtime, st.st_ino ]
+
+
+
+
+class FingerprintCache():
+
+    #constructor
+    def __init__( self, cacheFile=None ):
+
+        self.cacheFile = cacheFile
+        self.lock = threading.Lock()
+
+        #normalized path -> [ size, mtime, inode, digest, last used ]
+        self.entries = None
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+
+
+    def path( self ):
+
+        if self.cacheFile is None:
+            self.cacheFile = os.path.join( CGAssetSettings.localDir(), cacheFileName )
+        return self.cacheFile
+
+
+
+    def readFile( self ):
+
+        try:
+            with open( self.path(), 'r' ) as f:
+                data = json.load( f )
+        except ( IOError, OSError, ValueError ):
+            return {}
+
+        if not isinstance( data, dict ) or data.get( "hash" ) != hashName:
+            return {}
+        return data.get( "entries", {} )
+
+
+
+    def load( self ):
+
+        with self.lock:
+            if self.entries is None:
+                self.entries = self.readFile()
+
+
+
+    def key( self, path ):
+
+        return os.path.normcase( os.path.abspath( path ) ).replace( "\\", "/" )
+
+
+
+    def digest( self, path ):
+
+        #content hash of path, read from disk only if it changed
+        self.load()
+        key = self.key( path )
+        stamp = statKey( path )
+
+        with self.lock:
+            entry = self.entries.get( key )
+            if entry is not None and entry[:3] == stamp:
+                entry[4] = time.time()
+                self.hits += 1
+                return entry[3]
+
+        digest = hashFile( path )
+
+        #keep the stamp from before the read, a write during it shows up next time
+        with self.lock:
+            self.entries[ key ] = stamp + [ digest, time.time() ]
+            self.dirty = True
+            self.misses += 1
+
+        return digest
+
+
+
+    def cached( self, path ):
+
+        #hash of path if it is known and the file is unchanged, never reads the file
+        self.load()
+        try:
+            stamp = statKey( path )
+        except OSError:
+            return None
+
+        with self.lock:
+            entry = self.entries.get( self.key( path ) )
+            if entry is not None and entry[:3] == stamp:
+                return entry[3]
+        return None
+
+
+
+    def remember( self, path, digest ):
+
+        #record a hash we already know, like a copy of a hashed file
+        self.load()
+        try:
+            stamp = statKey( path )
+        except OSError:
+            return
+
+        with self.lock:
+            self.entries[ self.key( path ) ] = stamp + [ digest, time.time() ]
+            self.dirty = True
+
+
+
+    def digests( self, paths ):
+
+        #path -> digest, files that cannot be read are left out
+        result = {}
+        for path in paths:
+            try:
+                result[ path ] = self.digest( path )
+            except ( IOError, OSError ):
+                pass
+        return result
+
+
+
+    def save( self ):
+
+        if not self.dirty:
+            return
+
+        with self.lock:
+            #other maya sessions write the same file, merge with theirs
+            merged = self.readFile()
+            merged.update( self.entries )
+
+            if len(merged) > maxEntries:
+                newest = sorted( merged.items(), key=lambda item: item[1][4], reverse=True )
+                merged = dict( newest[:maxEntries] )
+
+            self.entries = merged
+            self.dirty = False
+
+            cacheFile = self.path()
+            partFile = cacheFile + "." + str(os.getpid()) + ".part"
+            try:
+                with open( partFile, 'w' ) as f:
+                    json.dump( { "hash": hashName, "entries": merged }, f )
+                CGAssetCopy.replaceFile( partFile, cacheFile )
+            except ( IOError, OSError ):
+                #a lost cache only costs a rehash
+                self.dirty = True
+
+
+
+
+#one cache per maya session
+fingerprints = FingerprintCache()
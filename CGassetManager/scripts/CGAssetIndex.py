@@ -0,0 +1,162 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   In-memory index of the project/asset/job/version directory      #
+#   tree on the server. Every listing is kept in memory and only    #
+#   re-read from the share when the directory's mtime changes or    #
+#   its time to live runs out.                                      #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import time
+import threading
+
+
+
+
+#seconds a listing is trusted before the directory mtime is checked again
+defaultTTL = 30.0
+
+
+
+
+def normPath( path ):
+
+    #one key per directory no matter how the path was glued together
+    path = path.replace( "\\", "/" )
+    while "//" in path[2:]:
+        path = path[:2] + path[2:].replace( "//", "/" )
+    if len(path) > 2 and path.endswith( "/" ):
+        path = path[:-1]
+    return path
+
+
+
+
+class DirIndex():
+
+    #constructor
+    def __init__( self, ttl=defaultTTL ):
+
+        self.ttl = ttl
+
+        #path -> [ time checked, mtime, sorted names or None if missing ]
+        self.entries = {}
+        self.lock = threading.Lock()
+
+
+
+    def scan( self, path ):
+
+        #one round trip for the mtime, one for the listing
+        try:
+            mtime = os.stat( path ).st_mtime
+            names = sorted( os.listdir( path ) )
+        except OSError:
+            return None, None
+
+        return mtime, names
+
+
+
+    def lookup( self, path ):
+
+        path = normPath( path )
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get( path )
+
+        #still fresh, do not touch the share at all
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[2]
+
+        #stale, but an unchanged mtime means the listing is still good
+        if entry is not None and entry[2] is not None:
+            try:
+                mtime = os.stat( path ).st_mtime
+            except OSError:
+                mtime = None
+
+            if mtime is not None and mtime == entry[1]:
+                with self.lock:
+                    entry[0] = now
+                return entry[2]
+
+        mtime, names = self.scan( path )
+
+        with self.lock:
+            self.entries[ path ] = [ now, mtime, names ]
+
+        return names
+
+
+
+    def listdir( self, path ):
+
+        names = self.lookup( path )
+        if names is None:
+            return []
+        return list( names )
+
+
+
+    def exists( self, path ):
+
+        path = normPath( path )
+
+        #a known directory answers for itself
+        with self.lock:
+            entry = self.entries.get( path )
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            return entry[2] is not None
+
+        #otherwise answer from the parent listing
+        parent, name = path.rsplit( "/", 1 )
+        if parent and name:
+            names = self.lookup( parent )
+            return names is not None and name in names
+
+        return self.lookup( path ) is not None
+
+
+
+    def invalidate( self, path, recursive=False ):
+
+        path = normPath( path )
+
+        with self.lock:
+            self.entries.pop( path, None )
+
+            if recursive:
+                prefix = path + "/"
+                for key in list( self.entries.keys() ):
+                    if key.startswith( prefix ):
+                        del self.entries[ key ]
+
+
+
+    def refresh( self, path, recursive=False ):
+
+        #drop and re-read straight away so the next lookup is warm
+        self.invalidate( path, recursive=recursive )
+        return self.listdir( path )
+
+
+
+    def clear( self ):
+
+        with self.lock:
+            self.entries.clear()
+
+
+
+
+#one index per maya session, shared by every CGAssets window
+assetIndex = DirIndex()
@@ -0,0 +1,213 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Read-through cache of loaded versions on this workstation. The  #
+#   scene and textures of a version are copied locally the first    #
+#   time it is loaded, checked against the manifest (or size and    #
+#   mtime) every time after, and the least recently loaded          #
+#   versions are dropped once the cache is over its disk budget.    #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import CGAssetCopy
+import CGAssetIndex
+import CGAssetSettings
+import CGAssetManifest
+import CGAssetFingerprint
+import CGAssetUpload
+import CGAssetCompress
+import CGAssetTextures
+import CGAssetProxy
+
+
+
+
+#environment variable with the disk budget of the cache in GB
+cacheBudgetEnv = "CGAM_CACHE_GB"
+
+#GB kept when the environment variable is not set
+defaultBudgetGB = 50
+
+#what a cached version holds, inside its cache folder
+entryFileName = "entry.json"
+
+#files copied from the server at the same time
+cacheCopyThreads = 8
+
+
+
+
+def cacheBudget():
+
+    try:
+        gb = float( os.environ.get( cacheBudgetEnv ) or defaultBudgetGB )
+    except ValueError:
+        gb = defaultBudgetGB
+    return int( gb*1024*1024*1024 )
+
+
+
+
+class VersionCache():
+
+    #constructor
+    def __init__( self, cacheDir=None, budget=None ):
+
+        self.cacheDir = cacheDir or CGAssetSettings.localDir( "versions" )
+        self.budget = budget if budget is not None else cacheBudget()
+        self.fingerprints = CGAssetFingerprint.fingerprints
+
+
+
+    def entryDir( self, versionDir ):
+
+        return os.path.join( self.cacheDir, hashlib.sha1( CGAssetIndex.normPath( versionDir ).encode( "utf-8" ) ).hexdigest()[:20] )
+
+
+
+    def readEntry( self, entryDir ):
+
+        try:
+            with open( os.path.join( entryDir, entryFileName ), 'r' ) as f:
+                return json.load( f )
+        except ( IOError, OSError, ValueError ):
+            return None
+
+
+
+    def writeEntry( self, entryDir, entry ):
+
+        path = os.path.join( entryDir, entryFileName )
+        with open( path+".part", 'w' ) as f:
+            json.dump( entry, f, indent=1, sort_keys=True )
+        CGAssetCopy.replaceFile( path+".part", path )
+
+
+
+    def wanted( self, versionDir, sceneName, proxyDivisor=None ):
+
+        #( relative path, size, mtime, hash ) of every file a load needs
+        manifest = CGAssetManifest.readManifest( versionDir )
+        if manifest is not None and manifest[ "scene" ][ "size" ] is not None and not CGAssetUpload.isUploading( versionDir ):
+            #a built version does not change, the manifest is enough
+            files = [ ( "maya_files/"+sceneName, manifest[ "scene" ][ "size" ], None, manifest[ "scene" ].get( "hash" ) ) ]
+            for texture in manifest.get( "textures", [] ):
+                if texture[ "size" ] is not None:
+                    files.append( ( "textures/"+texture[ "file" ], texture[ "size" ], None, texture[ "hash" ] ) )
+        else:
+            #versions from before manifests are checked by size and mtime
+            files = []
+            names = [ name for name in sorted( os.listdir( versionDir+"/textures" ) ) if CGAssetProxy.proxyDivisor( name ) is None ]
+            for rel in [ "maya_files/"+sceneName ] + [ "textures/"+name for name in names ]:
+                stat = os.stat( versionDir+"/"+rel )
+                files.append( ( rel, stat.st_size, stat.st_mtime, None ) )
+
+        #proxies are not in the manifest, one listing gives their sizes
+        if proxyDivisor:
+            proxyDir = CGAssetProxy.proxyDir( versionDir+"/textures", proxyDivisor )
+            rel = os.path.basename( proxyDir )
+            for name, size in sorted( CGAssetTextures.listDir( proxyDir, {} ).items() ):
+                files.append( ( "textures/"+rel+"/"+name, size, None, None ) )
+        return files
+
+
+
+    def fetch( self, versionDir, sceneName, progress=None, proxyDivisor=None ):
+
+        #local scene file and textures folder, the textures folder is None if not every texture made it
+        entryDir = self.entryDir( versionDir )
+        entry = self.readEntry( entryDir ) or { "versionDir": versionDir, "files": {} }
+        files = self.wanted( versionDir, sceneName, proxyDivisor )
+
+        jobs = []
+        for rel, size, mtime, digest in files:
+            local = os.path.join( entryDir, rel )
+            cached = entry[ "files" ].get( rel )
+            valid = cached is not None and os.path.isfile( local ) and os.path.getsize( local ) == size and cached[ "size" ] == size
+            if valid and mtime is not None:
+                valid = cached.get( "mtime" ) == mtime
+            if valid and digest is not None and cached.get( "hash" ) != digest:
+                #cached before the version had a manifest, the local copy is read once
+                valid = cached.get( "hash" ) is None and self.fingerprints.digest( local ) == digest
+                if valid:
+                    cached[ "hash" ] = digest
+            if valid:
+                continue
+            entry[ "files" ].pop( rel, None )
+            jobs.append( ( versionDir+"/"+rel, local ) )
+
+        subs = [ "maya_files", "textures" ]
+        if proxyDivisor:
+            subs.append( "textures/"+CGAssetProxy.proxyDirPrefix+str(proxyDivisor) )
+        for sub in subs:
+            if not os.path.isdir( os.path.join( entryDir, sub ) ):
+                os.makedirs( os.path.join( entryDir, sub ) )
+
+        failed = set()
+        if jobs:
+            result = CGAssetCopy.CopyEngine( threads=cacheCopyThreads ).copyFiles( jobs, progress=progress )
+            failed = set( dst for src, dst, error in result.failed )
+
+        #what was copied has to match what was published
+        for rel, size, mtime, digest in files:
+            local = os.path.join( entryDir, rel )
+            if rel in entry[ "files" ] or local in failed:
+                continue
+            localDigest = self.fingerprints.digest( local ) if digest is not None else None
+            if os.path.getsize( local ) != size or localDigest != digest:
+                os.remove( local )
+                failed.add( local )
+                continue
+            entry[ "files" ][ rel ] = { "size": size, "mtime": mtime, "hash": digest }
+
+        localScene = os.path.join( entryDir, "maya_files", sceneName )
+        if localScene in failed:
+            raise IOError( "Could not cache " + versionDir+"/maya_files/"+sceneName )
+
+        #compressed scenes are unpacked once, next to their cached copy
+        if localScene.endswith( CGAssetCompress.gzipExt ):
+            plainScene = CGAssetCompress.stripExt( localScene )
+            if not os.path.isfile( plainScene ) or os.path.getmtime( plainScene ) < os.path.getmtime( localScene ):
+                CGAssetCompress.decompressFile( localScene, plainScene )
+            entry[ "unpackedBytes" ] = os.path.getsize( plainScene )
+            localScene = plainScene
+
+        entry[ "lastUsed" ] = time.time()
+        entry[ "bytes" ] = sum( record[ "size" ] for record in entry[ "files" ].values() ) + entry.get( "unpackedBytes", 0 )
+        self.writeEntry( entryDir, entry )
+        self.evict( keep=entryDir )
+
+        textureDir = os.path.join( entryDir, "textures" ) if not failed else None
+        return localScene, textureDir
+
+
+
+    def evict( self, keep=None ):
+
+        #least recently loaded versions go first until the cache fits its budget
+        entries = []
+        total = 0
+        for name in os.listdir( self.cacheDir ):
+            entryDir = os.path.join( self.cacheDir, name )
+            entry = self.readEntry( entryDir )
+            if entry is None:
+                continue
+            entries.append( ( entry.get( "lastUsed", 0 ), entryDir, entry.get( "bytes", 0 ) ) )
+            total += entry.get( "bytes", 0 )
+
+        for lastUsed, entryDir, size in sorted( entries ):
+            if total <= self.budget:
+                break
+            if entryDir == keep:
+                continue
+            shutil.rmtree( entryDir, ignore_errors=True )
+            total -= size
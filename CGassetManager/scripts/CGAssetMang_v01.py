@@ -18,11 +18,30 @@
 
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.utils
 import os
 import sys
-import datetime
+import time
 import shutil
+import tempfile
+import threading
 from functools import partial
+from multiprocessing.pool import ThreadPool
+import CGAssetDaemon
+import CGAssetSettings
+import CGAssetProgress
+import CGAssetPublish
+import CGAssetVersions
+import CGAssetManifest
+import CGAssetSearch
+import CGAssetThumbnail
+import CGAssetUpload
+import CGAssetLocalCache
+import CGAssetCompress
+import CGAssetDirty
+import CGAssetProxy
+import CGAssetTrace
+import CGAssetStore
 
 
 
@@ -39,9 +58,22 @@ else:
 
 
 #hard coded variables
-ripleyPath = "//core/ripley/"
+ripleyPath = CGAssetSettings.serverRoot
 iconPath = mayaPath+"plug-ins/CGassetManager/icons"
 
+#project folders that are never listed
+hiddenProjects = [ "rev_template" ]
+
+#number of projects checked on the server at the same time
+projectScanThreads = 8
+
+#seconds before the search index looks for new builds again
+searchRefreshInterval = 30.0
+
+#textures LOAD points the scene at, the proxy level taken from the ones the version has.
+#proxy levels are sorted by divisor, so the first is the largest proxy and the last the smallest
+textureChoices = [ ( "Full resolution", None ), ( "Largest proxies", 0 ), ( "Smallest proxies", -1 ) ]
+
 
 helpText = ["This is an asset mananger for all cg assets coming into and out of each\n"+
             "project. Select which project your asset is for, then choose the appropriate\n"+
@@ -75,6 +107,35 @@ class CGAssets():
         #create dictionary for access to local variables
         self.widgets = {}
 
+        #bumped every time project discovery starts, so old scans go quiet
+        self.projectScanId = 0
+
+        #cached view of the server directory tree, shared with other sessions when the index service runs
+        self.index = CGAssetDaemon.sessionIndex( ripleyPath )
+
+        #search over every project, filled in the background after the project scan
+        self.search = CGAssetSearch.SearchIndex( ripleyPath )
+        self.searchProjects = []
+        self.searchResults = []
+        self.searchRefreshed = 0.0
+        self.searchRefreshing = False
+
+        #thumbnails come from a local cache, fetched from the server in the background
+        self.thumbnails = CGAssetThumbnail.ThumbnailLoader()
+        self.thumbnailVersion = None
+
+        #scenes saved locally are still on their way to the server, the status line says when one is selected
+        self.statusShown = False
+        CGAssetUpload.uploader.addListener( self.uploadFinished )
+        CGAssetUpload.uploader.installSaveCheck()
+
+        #a scene linked from the previous version is given its own file before it is saved
+        CGAssetStore.installSaveCallback()
+        CGAssetUpload.uploader.resume()
+
+        #meshes and textures changed since the last build, so a version up only exports those
+        CGAssetDirty.tracker.install()
+
         #call the UI function
         self.CGAsset_UI()
 
@@ -88,7 +149,7 @@ class CGAssets():
 
         #create main window
         self.widgets[ "mainWindow" ] = cmds.window( "mainWindow", title='CG Asset Manager | v1.0', mnb=False, mxb=False, sizeable=False )
-        cmds.window( self.widgets[ "mainWindow" ], edit=True, h=410, w=400 )
+        cmds.window( self.widgets[ "mainWindow" ], edit=True, h=630, w=400 )
 
         self.widgets[ "tabLayout" ] = cmds.tabLayout()
 
@@ -103,6 +164,17 @@ class CGAssets():
 
         #option menu for projects
         self.widgets[ "uiLayout" ] = cmds.columnLayout( "uiLayout", w=400, co=('both', 15), p=self.widgets[ "mainLayout" ] )
+
+        #search box, results jump straight to the version
+        cmds.separator( h=15 )
+        cmds.rowColumnLayout( numberOfColumns=2, columnWidth=[( 1, 50 ), ( 2, 320 )] )
+        cmds.text( "Search: " )
+        self.widgets[ "searchField" ] = cmds.textField( text='', tcc=self.searchAssets, ec=self.searchAssets )
+        cmds.columnLayout( p=self.widgets[ "uiLayout" ] )
+        cmds.separator( h=5 )
+        self.widgets[ "searchResults" ] = cmds.textScrollList( w=370, h=80, allowMultiSelection=False, sc=self.searchSelect )
+
+        cmds.columnLayout( p=self.widgets[ "uiLayout" ] )
         cmds.separator( h=15 )
         self.widgets[ "ProjectOptionWidget" ] = cmds.optionMenu( label="Project:  ", w=370, cc=self.populateAssets )
 
@@ -125,6 +197,10 @@ class CGAssets():
         self.widgets[ "artistText" ] = cmds.text( "Artist: " )
         self.widgets[ "artistTextField" ] = cmds.textField( text='', editable=True )
 
+        #thumbnail of the selected version
+        cmds.columnLayout( p=self.widgets[ "uiLayout" ], w=370, columnAlign='center' )
+        cmds.separator( h=10 )
+        self.widgets[ "thumbnail" ] = cmds.image( w=CGAssetThumbnail.thumbnailSize[0], h=CGAssetThumbnail.thumbnailSize[1], visible=False )
 
         #create build and load buttons
         cmds.columnLayout( p=self.widgets[ "uiLayout" ] )
@@ -134,6 +210,13 @@ class CGAssets():
         self.widgets[ "buildButton" ] = cmds.button( label='BUILD', enable=False, h=50, w=174, c=self.buildButton )
         self.widgets[ "loadButton" ] = cmds.button( label='LOAD', enable=False, h=50, w=174, c=self.loadButton )
 
+        #reduced resolution textures for loading, when the version has them
+        cmds.columnLayout( p=self.widgets[ "uiLayout" ] )
+        cmds.separator( h=5 )
+        self.widgets[ "proxyMenu" ] = cmds.optionMenu( label='Textures: ', w=370 )
+        for label, level in textureChoices:
+            cmds.menuItem( label=label, p=self.widgets[ "proxyMenu" ] )
+
         #progress bar
         cmds.columnLayout( p=self.widgets[ "uiLayout" ] )
         cmds.separator( h=10 )
@@ -189,12 +272,10 @@ class CGAssets():
         #directory for versions
         versionDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+currentAsset+"/"+currentJob
 
-        if os.path.exists( versionDir ):
-
-            vList = os.listdir( versionDir )
-            for v in vList:
-                versions.append( v )
+        if self.index.exists( versionDir ):
 
+            #sorted by number, from the job's version index
+            versions = CGAssetVersions.listVersions( versionDir )
 
             for version in versions:
                 cmds.menuItem( label=version, p=self.widgets[ "versionMenu" ] )
@@ -215,33 +296,13 @@ class CGAssets():
 
 
         #alway select most recent version
-        versionList = []
-
-        #scan versions dir
-        if os.path.exists( versionDir ):
-            jobList = os.listdir( versionDir )
-            for d in jobList:
-                versionList.append(d)
-
-            #latest version folder
-            latestVer = len(versionList)
-            paddedNumber = '%03d' % latestVer
-            verFolder = "v"+str(paddedNumber)
-
+        verFolder = CGAssetVersions.latestVersion( versionDir, versions ) if versions else None
+        if verFolder is not None:
             cmds.optionMenu( self.widgets[ "versionMenu" ], edit=True, value=verFolder )
 
 
         #check to see if maya file exists
-        if os.path.exists( versionDir ):
-            curVer = cmds.optionMenu( self.widgets[ "versionMenu" ], query=True, value=True )
-            mayaPath = versionDir+"/"+curVer+"/maya_files"
-
-            if len(os.listdir(mayaPath)) == 0:
-                cmds.button( self.widgets[ "buildButton" ], edit=True, enable=True )
-                cmds.button( self.widgets[ "loadButton" ], edit=True, enable=False )
-            else:
-                cmds.button( self.widgets[ "buildButton" ], edit=True, enable=False )
-                cmds.button( self.widgets[ "loadButton" ], edit=True, enable=True )
+        self.updateBuildLoadButtons( versionDir )
 
 
     def versionUpdate( self, *args ):
@@ -260,23 +321,54 @@ class CGAssets():
 
 
         #check to see if maya file exists
-        if os.path.exists( versionDir ):
+        self.updateBuildLoadButtons( versionDir )
+
+
+
+    def updateBuildLoadButtons( self, versionDir ):
+
+        #BUILD an empty version, LOAD one that has been built
+        if self.index.exists( versionDir ):
             curVer = cmds.optionMenu( self.widgets[ "versionMenu" ], query=True, value=True )
-            mayaPath = versionDir+"/"+curVer+"/maya_files"
 
-            if len(os.listdir(mayaPath)) == 0:
-                cmds.button( self.widgets[ "buildButton" ], edit=True, enable=True )
-                cmds.button( self.widgets[ "loadButton" ], edit=True, enable=False )
+            #the manifest is written last and names the scene file
+            manifest = CGAssetManifest.readManifest( versionDir+"/"+str(curVer) )
+            self.showThumbnail( versionDir+"/"+str(curVer), manifest )
+
+            uploading = False
+            holder = None
+            if manifest is not None:
+                built = manifest[ "scene" ][ "size" ] is not None
+                uploading = CGAssetUpload.isUploading( versionDir+"/"+str(curVer) )
             else:
+                #versions published before manifests existed, one stat for the scene file
+                currentJob = os.path.basename( versionDir )
+                built = os.path.isfile( versionDir+"/"+str(curVer)+"/maya_files/"+currentJob+"_"+str(curVer)+".mb" )
+
+                #reserved by another session, it is building or about to
+                if not built and CGAssetVersions.isStaged( versionDir+"/"+str(curVer) ):
+                    holder = CGAssetVersions.reservationHolder( versionDir+"/"+str(curVer) )
+
+            if holder is not None:
                 cmds.button( self.widgets[ "buildButton" ], edit=True, enable=False )
-                cmds.button( self.widgets[ "loadButton" ], edit=True, enable=True )
+                cmds.button( self.widgets[ "loadButton" ], edit=True, enable=False )
+                cmds.text( self.widgets[ "progressBarText" ], edit=True, label=str(curVer)+" is in progress, reserved by "+holder.get( "user", "?" )+" on "+holder.get( "host", "?" )+"." )
+                self.statusShown = True
+                return
 
-         #check to see if maya file exists
-        if os.path.exists( versionDir ):
-            curVer = cmds.optionMenu( self.widgets[ "versionMenu" ], query=True, value=True )
-            mayaPath = versionDir+"/"+curVer+"/maya_files"
+            if uploading:
+                #nothing to load from the server yet
+                cmds.button( self.widgets[ "buildButton" ], edit=True, enable=False )
+                cmds.button( self.widgets[ "loadButton" ], edit=True, enable=False )
+                cmds.text( self.widgets[ "progressBarText" ], edit=True, label=str(curVer)+" is uploading to the server." )
+                self.statusShown = True
+                return
+
+            if self.statusShown:
+                cmds.text( self.widgets[ "progressBarText" ], edit=True, label="" )
+                self.statusShown = False
 
-            if len(os.listdir(mayaPath)) == 0:
+            if not built:
                 cmds.button( self.widgets[ "buildButton" ], edit=True, enable=True )
                 cmds.button( self.widgets[ "loadButton" ], edit=True, enable=False )
             else:
@@ -285,6 +377,66 @@ class CGAssets():
 
 
 
+    def uploadFinished( self, job ):
+
+        #runs on the upload thread
+        maya.utils.executeDeferred( partial( self.uploadUpdate, job ) )
+
+
+
+    def uploadUpdate( self, job ):
+
+        if job.error is not None:
+            cmds.warning( "Could not upload " + job.dst + ", it is kept in " + job.localFile + " and retried next session: " + job.error )
+
+        #window closed in the meantime
+        if not cmds.optionMenu( self.widgets[ "versionMenu" ], exists=True ):
+            CGAssetUpload.uploader.removeListener( self.uploadFinished )
+            return
+
+        if cmds.optionMenu( self.widgets[ "versionMenu" ], query=True, value=True ):
+            self.versionUpdate()
+
+
+
+    def showThumbnail( self, versionDir, manifest ):
+
+        self.thumbnailVersion = versionDir
+
+        #only built versions have one, nothing to ask the server for otherwise
+        if manifest is None or not manifest.get( "thumbnail" ):
+            cmds.image( self.widgets[ "thumbnail" ], edit=True, visible=False )
+            return
+
+        path = self.thumbnails.cache.get( versionDir )
+        if path is not None:
+            self.setThumbnail( versionDir, path )
+            return
+
+        cmds.image( self.widgets[ "thumbnail" ], edit=True, visible=False )
+        self.thumbnails.request( versionDir, self.thumbnailFetched )
+
+
+
+    def thumbnailFetched( self, versionDir, path ):
+
+        #runs on the loader thread
+        maya.utils.executeDeferred( partial( self.setThumbnail, versionDir, path ) )
+
+
+
+    def setThumbnail( self, versionDir, path ):
+
+        #the artist may have moved on to another version in the meantime
+        if versionDir != self.thumbnailVersion or not cmds.image( self.widgets[ "thumbnail" ], exists=True ):
+            return
+
+        if path is None:
+            cmds.image( self.widgets[ "thumbnail" ], edit=True, visible=False )
+        else:
+            cmds.image( self.widgets[ "thumbnail" ], edit=True, image=path, visible=True )
+
+
 
     def populateJobs( self, *args ):
 
@@ -306,10 +458,10 @@ class CGAssets():
         #get asset path
         currentAssetDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)
 
-        if os.path.exists( currentAssetDir ):
+        if self.index.exists( currentAssetDir ):
 
             #populate Jobs
-            files = os.listdir( currentAssetDir )
+            files = self.index.listdir( currentAssetDir )
             for file in files:
                 jobs.append( file )
 
@@ -358,7 +510,7 @@ class CGAssets():
 
         #path to current assets
         currentAssetsDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"
-        if os.path.exists( currentAssetsDir ):
+        if self.index.exists( currentAssetsDir ):
 
             cmds.optionMenu( self.widgets[ "AssetOptionWidget" ], edit=True, enable=True )
             cmds.optionMenu( self.widgets[ "assetJobMenu" ], edit=True, enable=True )
@@ -366,7 +518,7 @@ class CGAssets():
             cmds.text( self.widgets[ "artistText" ], edit=True, enable=True )
             cmds.textField( self.widgets[ "artistTextField" ], edit=True, enable=True )
             cmds.button( self.widgets[ "addVersionButton" ], edit=True, enable=True )
-            files = os.listdir(currentAssetsDir)
+            files = self.index.listdir(currentAssetsDir)
             for file in files:
                 assets.append(file)
 
@@ -399,24 +551,183 @@ class CGAssets():
 
     def populateProjects( self, *args ):
 
-        #create a list of projects on server
-        serverList = os.listdir(ripleyPath)
+        #scan the server in the background so the window opens straight away
+        self.projectScanId += 1
+        scanId = self.projectScanId
+
+        cmds.text( self.widgets[ "progressBarText" ], edit=True, label="Searching for projects on the server." )
+
+        scanThread = threading.Thread( target=self.scanProjects, args=( scanId, ) )
+        scanThread.daemon = True
+        scanThread.start()
+
+
+
+    def scanProjects( self, scanId ):
+
+        #runs off the main thread, never touch the UI from here
+        def checkProject( path ):
+            if path in hiddenProjects:
+                return None
+            if self.index.exists( ripleyPath+path+"/09_CG_RnD" ):
+                return path
+            return None
+
+        projects = []
+        try:
+            #create a list of projects on server
+            serverList = self.index.listdir( ripleyPath )
+
+            pool = ThreadPool( max( 1, min( projectScanThreads, len(serverList) ) ) )
+            try:
+                for project in pool.imap_unordered( checkProject, serverList ):
+                    if project is not None:
+                        projects.append( project )
+                        maya.utils.executeDeferred( partial( self.addProject, scanId, project ) )
+            finally:
+                pool.close()
+                pool.join()
+
+        except Exception as e:
+            maya.utils.executeDeferred( partial( cmds.warning, "Could not read projects from " + ripleyPath + ": " + str(e) ) )
+
+        maya.utils.executeDeferred( partial( self.projectScanFinished, scanId ) )
+
+        #the menus are usable now, load the search index behind them
+        self.searchProjects = sorted( projects )
+        self.refreshSearch()
+
+
+
+    def projectMenuAlive( self, scanId ):
+
+        #window was closed or a newer scan took over
+        if scanId != self.projectScanId:
+            return False
+        return cmds.optionMenu( self.widgets[ "ProjectOptionWidget" ], exists=True )
+
+
+
+    def addProject( self, scanId, project ):
+
+        if not self.projectMenuAlive( scanId ):
+            return
+
+        #add menu item for the project as soon as it is found
+        cmds.menuItem( label=project, parent=self.widgets[ "ProjectOptionWidget" ] )
+
+        #the first project found drives the rest of the menus
+        projectsList = cmds.optionMenu( self.widgets[ "ProjectOptionWidget" ], query=True, itemListLong=True )
+        if projectsList != None and len(projectsList) == 1:
+            self.populateAssets()
+
+
+
+    def projectScanFinished( self, scanId ):
+
+        if not self.projectMenuAlive( scanId ):
+            return
+
+        cmds.text( self.widgets[ "progressBarText" ], edit=True, label="" )
+
+        #projects arrive in any order, sort them once everything is in
+        menuItems = cmds.optionMenu( self.widgets[ "ProjectOptionWidget" ], query=True, itemListLong=True )
+        if menuItems == None:
+            cmds.warning( "No projects found. There should be a directory path of //core/ripley/<Project Name>/09_CG_RnD" )
+            return
+
+        labels = [ cmds.menuItem( item, query=True, label=True ) for item in menuItems ]
+        if labels == sorted( labels ):
+            return
+
+        currentProject = cmds.optionMenu( self.widgets[ "ProjectOptionWidget" ], query=True, value=True )
+        for item in menuItems:
+            cmds.deleteUI( item )
+        for label in sorted( labels ):
+            cmds.menuItem( label=label, parent=self.widgets[ "ProjectOptionWidget" ] )
+        cmds.optionMenu( self.widgets[ "ProjectOptionWidget" ], edit=True, value=currentProject )
+
+
+
+    def refreshSearch( self ):
+
+        #runs off the main thread, reads only what was appended since last time
+        self.searchRefreshing = True
+        try:
+            changed = self.search.refresh( self.searchProjects )
+        except Exception as e:
+            changed = False
+            maya.utils.executeDeferred( partial( cmds.warning, "Could not load the asset search: " + str(e) ) )
+        finally:
+            self.searchRefreshed = time.time()
+            self.searchRefreshing = False
 
-        projectDir = []
+        if changed:
+            maya.utils.executeDeferred( partial( self.searchAssets, refresh=False ) )
 
-        #list projects on server
-        for path in serverList:
-            rndPath = ripleyPath+path+"/09_CG_RnD"
 
-            if os.path.exists(rndPath) == True:
-                projectDir.append(path)
 
-        #remove template folder from project list
-        projectDir.remove("rev_template")
+    def searchAssets( self, *args, **kwargs ):
 
-        #add menu item for each project in list
-        for i in projectDir:
-            cmds.menuItem( label=i, parent=self.widgets[ "ProjectOptionWidget" ] )
+        if not cmds.textScrollList( self.widgets[ "searchResults" ], exists=True ):
+            return
+
+        #answered from memory, new builds are picked up in the background
+        query = cmds.textField( self.widgets[ "searchField" ], query=True, text=True )
+        self.searchResults = self.search.search( query )
+
+        cmds.textScrollList( self.widgets[ "searchResults" ], edit=True, removeAll=True )
+        for doc in self.searchResults:
+            label = doc[ "project" ]+" / "+doc[ "asset" ]+" / "+doc[ "job" ]+" / "+doc[ "version" ]
+            if doc.get( "artist" ):
+                label += "  ("+doc[ "artist" ]+")"
+            cmds.textScrollList( self.widgets[ "searchResults" ], edit=True, append=label )
+
+        stale = time.time() - self.searchRefreshed > searchRefreshInterval
+        if kwargs.get( "refresh", True ) and stale and self.searchProjects and not self.searchRefreshing:
+            self.searchRefreshing = True
+            refreshThread = threading.Thread( target=self.refreshSearch )
+            refreshThread.daemon = True
+            refreshThread.start()
+
+
+
+    def selectMenuValue( self, widget, value ):
+
+        #only values that are in the menu can be selected
+        menuItems = cmds.optionMenu( self.widgets[ widget ], query=True, itemListLong=True ) or []
+        if value not in [ cmds.menuItem( item, query=True, label=True ) for item in menuItems ]:
+            return False
+        cmds.optionMenu( self.widgets[ widget ], edit=True, value=value )
+        return True
+
+
+
+    def searchSelect( self, *args ):
+
+        #walk the menus down to the version picked in the results
+        selected = cmds.textScrollList( self.widgets[ "searchResults" ], query=True, selectIndexedItem=True )
+        if not selected or selected[0] > len(self.searchResults):
+            return
+        doc = self.searchResults[ selected[0]-1 ]
+
+        if not self.selectMenuValue( "ProjectOptionWidget", doc[ "project" ] ):
+            cmds.warning( "Project " + doc[ "project" ] + " is not in the project list." )
+            return
+        self.populateAssets()
+
+        if not self.selectMenuValue( "AssetOptionWidget", doc[ "asset" ] ):
+            cmds.warning( "Asset " + doc[ "asset" ] + " no longer exists." )
+            return
+        self.populateJobs()
+
+        if not self.selectMenuValue( "assetJobMenu", doc[ "job" ] ):
+            cmds.warning( "Job " + doc[ "job" ] + " no longer exists." )
+            return
+        self.populateVersions()
+
+        if self.selectMenuValue( "versionMenu", doc[ "version" ] ):
+            self.versionUpdate()
 
 
 
@@ -486,17 +797,6 @@ class CGAssets():
     def confirmJobCreate( self, *args ):
 
 
-        #sub directories
-        subDirs = [
-            'maya_files',
-            'textures',
-            'mari_archives',
-            'exports',
-            'scripts',
-            'notes'
-        ]
-
-
         #get text from job textfield
         newJobTitle = cmds.textField( self.widgets[ "newJobTextField" ], q=True, text=True )
 
@@ -515,10 +815,12 @@ class CGAssets():
         #create new job directory
         os.makedirs(newJobDir)
 
-        #create v001 directory with sub directories inside
-        os.makedirs(newJobDir+"/v001")
-        for sub in subDirs:
-            os.makedirs( newJobDir+"/v001/"+sub )
+        #reserve v001, it is filled in staging and published by BUILD
+        CGAssetVersions.allocateVersion( newJobDir )
+
+        #the new job is on the share now, drop what the index remembers
+        self.index.refresh( currentAssetDir )
+        self.index.refresh( newJobDir, recursive=True )
 
         #clear and reload menu items in job list
         menuItems = cmds.optionMenu( self.widgets[ "assetJobMenu" ], q=True, itemListLong=True )
@@ -528,9 +830,9 @@ class CGAssets():
 
         jobs = []
 
-        if os.path.exists(newJobDir):
+        if self.index.exists(newJobDir):
             cmds.optionMenu( self.widgets[ "assetJobMenu" ], edit=True, enable=True )
-            files = os.listdir(currentAssetDir)
+            files = self.index.listdir(currentAssetDir)
             for file in files:
                 jobs.append(file)
             jobs.append( "Create New Job" )
@@ -552,17 +854,6 @@ class CGAssets():
 
     def addVersionButton( self, *args ):
 
-        #sub directories
-        subDirs = [
-            'maya_files',
-            'textures',
-            'mari_archives',
-            'exports',
-            'scripts',
-            'notes'
-        ]
-
-
         #get current project
         currentProject = cmds.optionMenu( self.widgets[ "ProjectOptionWidget" ], q=True, v=True )
 
@@ -573,26 +864,11 @@ class CGAssets():
         currentJob = cmds.optionMenu( self.widgets[ "assetJobMenu" ], q=True, v=True  )
 
         #version directory
-        versionDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"
+        versionDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)
 
-        #empty version list
-        versionList = []
-
-        #scan versions
-        jobList = os.listdir( versionDir )
-        for d in jobList:
-            versionList.append(d)
-
-        #new version folder
-        newVer = len(versionList)+1
-        paddedNumber = '%03d' % newVer
-        newVerFolder = "v"+str(paddedNumber)
-
-        #create version directory with sub directories inside
-        newDir = versionDir+"/"+newVerFolder
-        os.makedirs( str(newDir) )
-        for sub in subDirs:
-            os.makedirs( newDir+"/"+sub )
+        #reserve the next version in staging, safe against other artists doing the same.
+        #its folders are made by BUILD and the job folder only sees it once it is built
+        newVerFolder = CGAssetVersions.allocateVersion( versionDir )
 
 
         #clear and reload menu items in job list
@@ -606,9 +882,11 @@ class CGAssets():
         #make recently created the selected job
         cmds.optionMenu( self.widgets[ "versionMenu" ], edit=True, value=newVerFolder )
 
+        return newVerFolder
 
 
-    def buildButton( self, *args ):
+
+    def buildButton( self, *args, **kwargs ):
 
         #get artist name
         artistName = cmds.textField( self.widgets[ "artistTextField" ], query=True, text=True )
@@ -625,178 +903,36 @@ class CGAssets():
         #get curent version
         currentVersion = cmds.optionMenu( self.widgets[ "versionMenu" ], q=True, v=True  )
 
-        #export Directory
-        exportDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+str(currentVersion)+"/exports"
-
-        #texture directory
-        textureDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+str(currentVersion)+"/textures"
-
-        #mayaPath directory
-        mayaDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+str(currentVersion)+"/maya_files"
-
-        #notes directory
-        notesDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+str(currentVersion)+"/notes"
-
-
-
-        #get list of all geometry in scene
-        geoList = cmds.ls( type='mesh')
-        geoLength = len( geoList )
-
-        #get list of all textures in scene
-        textureList = cmds.ls( type='file' )
-        textureLength = len( textureList )
-
-        #full length of export list
-        exportLength = textureLength + geoLength
+        #version directory
+        versionDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+str(currentVersion)
 
+        #project directory
+        rndDir = ripleyPath+currentProject+"/09_CG_RnD"
 
 
 
         #export all and save scene
-        artist = cmds.textField( self.widgets[ "artistTextField" ], query=True, text=True )
-        if artist != "":
-
-            #-----------------------------------------------#
-            #                   SCENE SAVE                  #
-            #-----------------------------------------------#
-            i=1
-            cmds.progressBar( self.widgets[ "progressBar" ], edit=True, maxValue=10000 )
-
-            for i in range(1, 10000):
-                cmds.text( self.widgets[ "progressBarText" ], edit=True, label="Saving Scene File." )
-                cmds.progressBar( self.widgets[ "progressBar" ], edit=True, progress=i )
-                i=i+1
-            cmds.file( rename=mayaDir+"/"+currentJob+"_"+currentVersion+".mb" )
-            cmds.file( save=True, type='mayaBinary' )
-
-            cmds.text( self.widgets[ "progressBarText" ], edit=True, label="" )
-            cmds.progressBar( self.widgets[ "progressBar" ], edit=True, progress=0 )
-
-
-
-
-
-            #-----------------------------------------------#
-            #                   GEO EXPORT                  #
-            #-----------------------------------------------#
-            g=1
-
-            if geoLength > 0:
-
-                try:
-                    cmds.progressBar( self.widgets[ "progressBar" ], edit=True, maxValue=geoLength )
-                    cmds.select( geoList )
-                    for geo in geoList:
-                        if cmds.file( exportDir+"/"+geo+'.obj', query=True, exists=True ):
-                            pass
-                        else:
-                            cmds.text( self.widgets[ "progressBarText" ], edit=True, label="Exporting Geo " + str(g) + " of " + str(geoLength) + "." )
-                            g= g+1
-                            cmds.progressBar( self.widgets[ "progressBar" ], edit=True, progress=g )
-                            cmds.file( exportDir+"/"+geo+'.obj', exportSelected=True, type='OBJexport', force=True )
-
-                    cmds.progressBar( self.widgets[ "progressBar" ], edit=True, progress=0 )
-                    cmds.text( self.widgets[ "progressBarText" ], edit=True, label="" )
-
-                    #kill all .mtl files
-                    OBJList = os.listdir( exportDir )
-                    for mtl in OBJList:
-                        if mtl.endswith( ".mtl" ):
-                            os.remove( exportDir+"/"+mtl )
-                except:
-                    raise
-
-
-            else:
-                cmds.warning( "There is no geometry in the scene." )
-
-
-
-
-
-
-            #-----------------------------------------------#
-            #               TEXTURE EXPORT                  #
-            #-----------------------------------------------#
-
-            t=1
-            tFiles = []
-
-            cmds.filePathEditor( refresh=True )
-
-            if textureLength > 0:
-
-                try:
-                    cmds.select( textureList )
-                    cmds.progressBar( self.widgets[ "progressBar" ], edit=True, maxValue=textureLength )
-
-                    directories = cmds.filePathEditor( query=True, listDirectories="" )
-                    for d in directories:
-                        fileName = cmds.filePathEditor( query=True, listFiles=d )
-                        for f in fileName:
-                            fullTexturePath = str(d+"/"+f)
-                            tFiles.append(fullTexturePath)
-
-
-                    #copy files from previous folder to correct destination
-                    for tex in tFiles:
-                        cmds.text( self.widgets[ "progressBarText" ], edit=True, label="Exporting Texture " + str(t) + " of " + str(textureLength) + "." )
-                        cmds.progressBar( self.widgets[ "progressBar" ], edit=True, progress=t )
-                        if os.path.exists(tex):
-                            shutil.copy( tex,  textureDir+"/")
-                        t=t+1
-
-                    #reload textures from current assset folder
-                    for t in textureList:
-                        cmds.filePathEditor( t+".fileTextureName", repath=textureDir+"/", force=True )
-
-                except:
-                    raise
-
-            else:
-                cmds.warning("Therer are no textures in your scene.")
-
-
-            cmds.progressBar( self.widgets[ "progressBar" ], edit=True, progress=0 )
-            cmds.text( self.widgets[ "progressBarText" ], edit=True, label="" )
-
-
-
-
-
-            #-----------------------------------------------#
-            #                     NOTES                     #
-            #-----------------------------------------------#
-            textureExport = os.listdir( textureDir )
-            textureExportLength = len(textureExport)
-
-
-            notesFile = open( notesDir+"/"+currentJob+"_"+currentVersion+".rtf", 'w' )
-
-            notes = []
-            notes.append( "Date: "+str(datetime.date.today())+"\n" )
-            notes.append( "\n" )
-            notes.append( "Time: "+str(datetime.datetime.now().time())+"\n" )
-            notes.append( "\n" )
-            notes.append( "Artist: "+artistName+"\n" )
-            notes.append( "\n" )
-            notes.append( "Number of meshes exported to OBJ format = "+ str(geoLength)+":\n" )
-            for geo in geoList:
-                notes.append( geo+"\n" )
-            notes.append( "\n" )
-            notes.append( "\n" )
-            notes.append( "\n" )
-            notes.append( "Number of textures exported from scene = "+str(textureExportLength)+":\n" )
-            for t in textureExport:
-                notes.append( t+"\n" )
-            notes.append( "\n" )
-
-            notesFile.writelines( notes )
-
-            notesFile.close();
-
+        if artistName != "":
 
+            #a version up already traces the load before it
+            trace = CGAssetTrace.begin( "build" )
+            try:
+                publisher = CGAssetPublish.Publisher( rndDir, versionDir, currentJob, currentVersion, artistName, progress=self.publishProgress(), previousDir=kwargs.get( "previousDir" ) )
+                result = publisher.run()
+            except CGAssetVersions.ReservedError as e:
+                cmds.warning( str(e) )
+                self.versionUpdate()
+                return
+            finally:
+                CGAssetTrace.finish( trace, versionDir+"/notes" )
+
+            #report every texture that did not make it in one go
+            if result.failedTextures:
+                cmds.confirmDialog( title='Texture Export', message=str(len(result.failedTextures)) + " textures could not be copied.\nSee the script editor for details.", button=['OK'] )
+
+            #the version folder has been published, forget the old listings
+            self.index.invalidate( os.path.dirname( versionDir ) )
+            self.index.invalidate( versionDir, recursive=True )
 
             #update version list
             self.populateVersions()
@@ -807,6 +943,16 @@ class CGAssets():
 
 
 
+    def publishProgress( self ):
+
+        #progress bar in the window plus the script editor log
+        return CGAssetProgress.Progress( [
+            CGAssetProgress.ProgressBarSink( self.widgets[ "progressBar" ], self.widgets[ "progressBarText" ] ),
+            CGAssetProgress.LogSink()
+        ] )
+
+
+
     def loadButton( self, *args ):
 
         #get artist name
@@ -838,12 +984,9 @@ class CGAssets():
 
         #versions list
         versionFolders = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)
-        versionList = os.listdir(versionFolders)
 
-        #new version folder
-        newVer = len(versionList)+1
-        paddedNumber = '%03d' % newVer
-        newVerFolder = "v"+str(paddedNumber)
+        #new version folder, only reserved once the artist says so
+        newVerFolder = CGAssetVersions.peekVersion( versionFolders )
 
         if artistName != "":
             try:
@@ -905,7 +1048,23 @@ class CGAssets():
         existingFile = cmds.file( query=True, sceneName=True )
 
         if mayaFile != existingFile:
-            cmds.file( mayaFile, open=True, force=True )
+            #the proxy level the artist picked, when the version has proxies
+            proxyDivisor = None
+            level = dict( textureChoices )[ cmds.optionMenu( self.widgets[ "proxyMenu" ], query=True, value=True ) ]
+            if level is not None:
+                proxyDivisor = ( CGAssetProxy.proxyLevels( textureDir ) or [ None ] )[ level ]
+                if proxyDivisor is None:
+                    cmds.warning( currentVersion + " has no texture proxies, loading full resolution textures." )
+
+            trace = CGAssetTrace.begin( "load" )
+            try:
+                self.openVersion( mayaFile, proxyDivisor=proxyDivisor )
+                if proxyDivisor is not None:
+                    with CGAssetTrace.span( "switch to proxies", divisor=proxyDivisor ):
+                        CGAssetProxy.switchTextures( textureDir, proxyDivisor )
+            finally:
+                #reading a version leaves it as it was published, load traces stay on this workstation
+                CGAssetTrace.finish( trace )
 
         else:
             cmds.warning( "The file is already loaded." )
@@ -940,31 +1099,86 @@ class CGAssets():
         #mayaPath directory
         mayaDir = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+str(currentVersion)+"/maya_files/"
 
-        #versions list
-        versionFolders = ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)
-        versionList = os.listdir(versionFolders)
-
-        #new version folder
-        newVer = len(versionList)+1
-        paddedNumber = '%03d' % newVer
-        newVerFolder = "v"+str(paddedNumber)
-
         #current maya file
         mayaFile = mayaDir+currentJob+"_"+currentVersion+".mb"
-        newMayaFile = mayaDir+currentJob+"_"+newVerFolder+".mb"
 
         #kill the UI window
         cmds.deleteUI( self.widgets[ "versionUpWindow" ] )
 
-        #version Up
-        self.addVersionButton()
+        #version Up, the number actually reserved may be past the one offered
+        newVerFolder = self.addVersionButton()
+        newMayaFile = mayaDir+currentJob+"_"+newVerFolder+".mb"
 
-        #load and rename previous version to new version
-        cmds.file( mayaFile, open=True, force=True )
-        cmds.file( rename=newMayaFile )
+        #one trace for the load and the build, kept with the new version
+        trace = CGAssetTrace.begin( "versionUp" )
+        try:
+            #load and rename previous version to new version
+            with CGAssetTrace.span( "load", "stage" ):
+                self.openVersion( mayaFile )
+            cmds.file( rename=newMayaFile )
+
+            #whatever did not change is linked from the previous version
+            with CGAssetTrace.span( "build", "stage" ):
+                self.buildButton( previousDir=os.path.dirname( os.path.dirname( mayaFile ) ) )
+        finally:
+            CGAssetTrace.finish( trace, ripleyPath+currentProject+"/09_CG_RnD/CG_Assets/"+str(currentAsset)+"/"+str(currentJob)+"/"+newVerFolder+"/notes" )
+
+
+
+    def openVersion( self, mayaFile, proxyDivisor=None ):
+
+        #open a published scene, through the workstation cache when the project uses it
+        versionDir = os.path.dirname( os.path.dirname( mayaFile ) )
+        rndDir = versionDir[ :versionDir.index( "/09_CG_RnD/" ) ]+"/09_CG_RnD"
+
+        #the scene may have been published compressed
+        storedFile = CGAssetCompress.findPublished( mayaFile ) or mayaFile
+
+        if not CGAssetSettings.loadSettings( rndDir )[ "loadCache" ]:
+            with CGAssetTrace.span( "open from server", file=storedFile ):
+                self.openFromServer( storedFile, mayaFile )
+            return
+
+        progress = self.publishProgress()
+        progress.stage( "Caching " + os.path.basename( mayaFile ), total=0, unit="bytes" )
+        try:
+            localFile, localTextureDir = CGAssetLocalCache.VersionCache().fetch( versionDir, os.path.basename( storedFile ), progress=lambda status: progress.update( status[ "bytesDone" ], total=status[ "bytesTotal" ] ), proxyDivisor=proxyDivisor )
+        except ( IOError, OSError ) as e:
+            progress.end()
+            cmds.warning( "Could not cache " + mayaFile + ", loading it from the server: " + str(e) )
+            with CGAssetTrace.span( "open from server", file=storedFile ):
+                self.openFromServer( storedFile, mayaFile )
+            return
+        progress.end()
+
+        #textures keep their server paths in the scene and are read from the local copies
+        if localTextureDir is not None:
+            cmds.dirmap( enable=True )
+            cmds.dirmap( mapDirectory=( versionDir+"/textures", localTextureDir.replace( "\\", "/" ) ) )
+        else:
+            cmds.warning( "Not every texture of " + os.path.basename( versionDir ) + " could be cached, they are read from the server." )
+
+        with CGAssetTrace.span( "open", file=localFile ):
+            cmds.file( localFile, open=True, force=True )
+
+        #saving goes back to the server, like a scene opened from there
+        cmds.file( rename=mayaFile )
+        CGAssetDirty.tracker.openedVersion( versionDir )
 
-        self.buildButton()
 
 
+    def openFromServer( self, storedFile, mayaFile ):
 
+        if storedFile == mayaFile:
+            cmds.file( mayaFile, open=True, force=True )
+        else:
+            #maya cannot read a compressed scene, it is unpacked locally on the way in
+            scratchDir = tempfile.mkdtemp( dir=CGAssetSettings.localDir( "opened" ) )
+            try:
+                cmds.file( CGAssetCompress.decompressFile( storedFile, os.path.join( scratchDir, os.path.basename( mayaFile ) ) ), open=True, force=True )
+                cmds.file( rename=mayaFile )
+            finally:
+                shutil.rmtree( scratchDir, ignore_errors=True )
 
+        #the scene is the published one, whatever the tracker saw saved with it holds
+        CGAssetDirty.tracker.openedVersion( os.path.dirname( os.path.dirname( mayaFile ) ) )
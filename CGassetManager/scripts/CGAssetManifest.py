@@ -0,0 +1,83 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Publish manifest of a version. One JSON file in notes/ holds    #
+#   who built the version and when, how long every stage took and   #
+#   every exported mesh and texture with its size and hash. It is   #
+#   written last, so a version with a manifest is a finished one.   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import json
+import CGAssetCopy
+
+
+
+
+#manifest file inside every version's notes folder
+manifestFileName = "manifest.json"
+
+#bumped when the layout of the manifest changes
+manifestFormat = 1
+
+
+
+
+def manifestPath( versionDir ):
+
+    return versionDir+"/notes/"+manifestFileName
+
+
+
+def fileEntry( path, digest=None, **extra ):
+
+    #name, size and hash of one published file
+    entry = { "file": os.path.basename( path ), "size": None, "hash": digest }
+    try:
+        entry[ "size" ] = os.path.getsize( path )
+    except OSError:
+        pass
+    entry.update( extra )
+    return entry
+
+
+
+def writeManifest( versionDir, manifest ):
+
+    #written next to the target and renamed over it, readers never see half a file
+    path = manifestPath( versionDir )
+    partFile = path+"."+str(os.getpid())+".part"
+
+    manifest = dict( manifest )
+    manifest[ "format" ] = manifestFormat
+
+    try:
+        with open( partFile, 'w' ) as f:
+            json.dump( manifest, f, indent=1, sort_keys=True )
+        CGAssetCopy.replaceFile( partFile, path )
+    finally:
+        if os.path.exists( partFile ):
+            os.remove( partFile )
+
+    return path
+
+
+
+def readManifest( versionDir ):
+
+    #manifest of a built version, None for an empty or unreadable one
+    try:
+        with open( manifestPath( versionDir ), 'r' ) as f:
+            manifest = json.load( f )
+    except ( IOError, OSError, ValueError ):
+        return None
+
+    if not isinstance( manifest, dict ) or manifest.get( "format", 0 ) > manifestFormat:
+        return None
+    return manifest
@@ -0,0 +1,260 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Compact binary mesh cache. Mesh arrays are pulled out of Maya   #
+#   in bulk through MFnMesh and written as raw little endian        #
+#   buffers behind a small header, so other tools can mmap them     #
+#   back without parsing any text.                                  #
+#                                                                   #
+#   Only extractMesh needs Maya, reading and writing do not.        #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import itertools
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import CGAssetCopy
+import CGAssetFingerprint
+
+
+
+
+#file extension of a mesh cache
+meshCacheExt = ".cgmesh"
+
+#first bytes of every mesh cache
+magic = b"CGMESH\0\0"
+formatVersion = 1
+
+#array data starts on this boundary
+alignment = 64
+
+#magic, version, array count, meta length
+headerStruct = struct.Struct( "<8sIII" )
+
+#name, typecode, count, offset
+entryStruct = struct.Struct( "<16sc7xQQ" )
+
+#typecode -> numpy dtype, both 4 bytes wide
+dtypes = { "f": "<f4", "i": "<i4" }
+
+
+#arrays written for every mesh, in file order
+#  positions    x y z per vertex
+#  normals      x y z per normal
+#  normalIds    normal index per face vertex
+#  uvs          u v per uv
+#  uvCounts     uvs per face, 0 for faces without uvs
+#  uvIds        uv index per face vertex that has one
+#  faceCounts   vertices per face
+#  faceIndices  vertex index per face vertex
+arrayNames = [ "positions", "normals", "normalIds", "uvs", "uvCounts", "uvIds", "faceCounts", "faceIndices" ]
+
+
+
+
+def extractMesh( shape, worldSpace=True ):
+
+    #all the arrays of one mesh shape, read in bulk through the API
+    import maya.api.OpenMaya as om2
+
+    selection = om2.MSelectionList()
+    selection.add( shape )
+    fnMesh = om2.MFnMesh( selection.getDagPath( 0 ) )
+
+    space = om2.MSpace.kWorld if worldSpace else om2.MSpace.kObject
+
+    #filled in one go, points drop their w and normals are sequences of three already
+    positions = array( "f", itertools.chain.from_iterable( ( p.x, p.y, p.z ) for p in fnMesh.getPoints( space ) ) )
+    normals = array( "f", itertools.chain.from_iterable( fnMesh.getNormals( space ) ) )
+
+    normalCounts, normalIds = fnMesh.getNormalIds()
+
+    us, vs = fnMesh.getUVs()
+    uvs = array( "f", [ 0.0 ] ) * ( 2*len(us) )
+    uvs[0::2] = array( "f", us )
+    uvs[1::2] = array( "f", vs )
+
+    uvCounts, uvIds = fnMesh.getAssignedUVs()
+    faceCounts, faceIndices = fnMesh.getVertices()
+
+    return {
+        "positions": positions,
+        "normals": normals,
+        "normalIds": array( "i", normalIds ),
+        "uvs": uvs,
+        "uvCounts": array( "i", uvCounts ),
+        "uvIds": array( "i", uvIds ),
+        "faceCounts": array( "i", faceCounts ),
+        "faceIndices": array( "i", faceIndices )
+    }
+
+
+
+def meshDigest( arrays ):
+
+    #content hash of extracted mesh arrays, equal for meshes that export the same
+    digest = hashlib.new( CGAssetFingerprint.hashName )
+    for name in sorted( arrays ):
+        data = arrays[ name ]
+        if sys.byteorder != "little":
+            data = array( data.typecode, data )
+            data.byteswap()
+        digest.update( ( name+":"+data.typecode+":"+str(len(data))+";" ).encode( "ascii" ) )
+        digest.update( data.tostring() if sys.version_info[0] < 3 else data.tobytes() )
+    return digest.hexdigest()
+
+
+
+def padding( offset ):
+
+    return ( alignment - offset % alignment ) % alignment
+
+
+
+def writeMeshCache( path, arrays, meta=None ):
+
+    #arrays is name -> array.array of typecode f or i
+    names = [ name for name in arrayNames if name in arrays ]
+    names += sorted( name for name in arrays if name not in arrayNames )
+
+    metaBytes = json.dumps( meta or {}, sort_keys=True ).encode( "utf-8" )
+
+    offset = headerStruct.size + entryStruct.size*len(names) + len(metaBytes)
+    offset += padding( offset )
+
+    entries = []
+    for name in names:
+        data = arrays[ name ]
+        if data.typecode not in dtypes or data.itemsize != 4:
+            raise ValueError( "Mesh cache array " + name + " must be 4 byte float or int, not " + data.typecode )
+
+        entries.append( entryStruct.pack( name.encode( "ascii" ), data.typecode.encode( "ascii" ), len(data), offset ) )
+        offset += len(data)*4
+        offset += padding( offset )
+
+    partFile = path + ".part"
+    with open( partFile, 'wb' ) as f:
+        f.write( headerStruct.pack( magic, formatVersion, len(names), len(metaBytes) ) )
+        for entry in entries:
+            f.write( entry )
+        f.write( metaBytes )
+        f.write( b"\0"*padding( f.tell() ) )
+
+        for name in names:
+            data = arrays[ name ]
+            if sys.byteorder != "little":
+                data = array( data.typecode, data )
+                data.byteswap()
+            data.tofile( f )
+            f.write( b"\0"*padding( f.tell() ) )
+
+    CGAssetCopy.replaceFile( partFile, path )
+
+    return path
+
+
+
+def readHeader( buf ):
+
+    fileMagic, version, count, metaLength = headerStruct.unpack_from( buf, 0 )
+    if fileMagic != magic:
+        raise ValueError( "Not a mesh cache" )
+    if version != formatVersion:
+        raise ValueError( "Unsupported mesh cache version " + str(version) )
+
+    table = {}
+    pos = headerStruct.size
+    for i in range( count ):
+        name, typecode, length, offset = entryStruct.unpack_from( buf, pos )
+        table[ name.rstrip( b"\0" ).decode( "ascii" ) ] = ( typecode.decode( "ascii" ), length, offset )
+        pos += entryStruct.size
+
+    meta = json.loads( bytes( buf[ pos:pos+metaLength ] ).decode( "utf-8" ) )
+
+    return table, meta
+
+
+
+
+class MeshCache():
+
+    #read only view of a mesh cache, arrays point straight into the mmap
+    def __init__( self, path ):
+
+        self.path = path
+        self.file = open( path, 'rb' )
+        self.map = mmap.mmap( self.file.fileno(), 0, access=mmap.ACCESS_READ )
+        self.table, self.meta = readHeader( self.map )
+        self.arrays = {}
+
+
+
+    def names( self ):
+
+        return [ name for name in arrayNames if name in self.table ] + sorted( name for name in self.table if name not in arrayNames )
+
+
+
+    def __getitem__( self, name ):
+
+        if name not in self.arrays:
+            typecode, length, offset = self.table[ name ]
+
+            if numpy is not None:
+                data = numpy.frombuffer( self.map, dtype=dtypes[ typecode ], count=length, offset=offset )
+            elif sys.version_info[0] >= 3 and sys.byteorder == "little":
+                data = memoryview( self.map )[ offset:offset+length*4 ].cast( typecode )
+            else:
+                #python 2 without numpy has to copy
+                data = array( typecode )
+                data.fromstring( self.map[ offset:offset+length*4 ] )
+                if sys.byteorder != "little":
+                    data.byteswap()
+
+            self.arrays[ name ] = data
+
+        return self.arrays[ name ]
+
+
+
+    def close( self ):
+
+        #views have to go before the map can be closed
+        self.arrays = {}
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+
+
+    def __enter__( self ):
+
+        return self
+
+
+
+    def __exit__( self, *args ):
+
+        self.close()
+
+
+
+def loadMeshCache( path ):
+
+    return MeshCache( path )
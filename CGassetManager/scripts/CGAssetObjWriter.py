@@ -0,0 +1,555 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Pure python OBJ writer. Mesh arrays are extracted once inside   #
+#   Maya (see CGAssetMeshCache.extractMesh) and handed to a pool    #
+#   of worker processes that stream them to disk in chunks. No      #
+#   Maya is needed here, and no .mtl files are written.             #
+#                                                                   #
+#   The worker pools here are shared with the texture proxies.      #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import itertools
+import threading
+import subprocess
+import multiprocessing
+import CGAssetCopy
+import CGAssetCompress
+import CGAssetSettings
+import CGAssetTrace
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+
+
+#vertices, normals, uvs or faces formatted per write
+chunkItems = 65536
+
+#bytes buffered by the file object on top of the chunks
+writeBuffer = 1024*1024
+
+#worker processes, None is one per core
+defaultProcesses = None
+
+
+
+
+def pythonExecutable():
+
+    #inside maya sys.executable is the GUI, workers have to run mayapy
+    exe = sys.executable or ""
+    folder, name = os.path.split( exe )
+    if name.lower().startswith( "maya" ) and not name.lower().startswith( "mayapy" ):
+        #maya.exe next to mayapy.exe on windows, maya.bin next to mayapy elsewhere
+        for mayapy in ( "mayapy" + os.path.splitext( name )[1], "mayapy" ):
+            if os.path.isfile( os.path.join( folder, mayapy ) ):
+                return os.path.join( folder, mayapy )
+    return None
+
+
+
+def workerExecutable():
+
+    #interpreter subprocess workers run, None inside a maya GUI without a mayapy next to it
+    mayapy = pythonExecutable()
+    if mayapy is not None:
+        return mayapy
+    name = os.path.basename( sys.executable or "" ).lower()
+    if not sys.executable or ( name.startswith( "maya" ) and not name.startswith( "mayapy" ) ):
+        return None
+    return sys.executable
+
+
+
+def workerContext():
+
+    #multiprocessing context that starts fresh mayapy workers, None where this process cannot start them safely:
+    #inside a daemonic pool worker, and on python 2 outside windows, where the only way is to fork all of maya
+    if multiprocessing.current_process().daemon:
+        return None
+    if hasattr( multiprocessing, "get_context" ):
+        context = multiprocessing.get_context( "spawn" )
+    elif os.name == 'nt':
+        #windows always spawns
+        context = multiprocessing
+    else:
+        return None
+
+    mayapy = pythonExecutable()
+    if mayapy is not None:
+        context.set_executable( mayapy )
+    return context
+
+
+
+def workerPool( processes=defaultProcesses ):
+
+    #pool of fresh worker processes with apply_async and imap_unordered, None when the work has to be done here:
+    #a batch publish worker already has its core and cannot start children of its own
+    if multiprocessing.current_process().daemon:
+        return None
+
+    context = workerContext()
+    if context is not None:
+        return context.Pool( processes )
+
+    #python 2 outside windows, mayapy is started by hand instead of forking maya
+    if workerExecutable() is None:
+        sys.stderr.write( "No mayapy found next to " + str(sys.executable) + ", working in this process one job at a time.\n" )
+        return None
+    return SubprocessPool( processes )
+
+
+
+def workerMain():
+
+    #a SubprocessPool worker, reads the path of a pickled job per line and answers
+    #with the same path once the result is next to it. anything the jobs print goes to stderr
+    answers = sys.stdout
+    sys.stdout = sys.stderr
+
+    for line in iter( sys.stdin.readline, "" ):
+        jobFile = line.strip()
+        if not jobFile:
+            continue
+
+        try:
+            with open( jobFile, 'rb' ) as f:
+                function, args = pickle.load( f )
+            answer = ( True, function( *args ) )
+        except Exception as e:
+            answer = ( False, type(e).__name__ + ": " + str(e) )
+
+        with open( jobFile+".out", 'wb' ) as f:
+            pickle.dump( answer, f, 2 )
+        answers.write( jobFile+"\n" )
+        answers.flush()
+
+
+
+
+class WorkerError( RuntimeError ):
+
+    #a job failed in a SubprocessPool worker, or the worker went away
+    pass
+
+
+
+
+class SubprocessResult():
+
+    #constructor
+    def __init__( self, finished=None ):
+
+        self.event = threading.Event()
+        self.finished = finished
+        self.value = None
+        self.error = None
+
+
+
+    def set( self, value, error=None ):
+
+        self.value = value
+        self.error = error
+        self.event.set()
+        if self.finished is not None:
+            self.finished.put( self )
+
+
+
+    def get( self ):
+
+        self.event.wait()
+        if self.error is not None:
+            raise WorkerError( self.error )
+        return self.value
+
+
+
+
+class SubprocessPool():
+
+    #the calls of multiprocessing.Pool used here, over mayapy processes started with subprocess.
+    #the arguments and results go through pickle files in a local temp folder, one feeder thread per worker
+    def __init__( self, processes=defaultProcesses ):
+
+        self.processes = processes or multiprocessing.cpu_count()
+        self.jobs = queue.Queue()
+        self.jobNumbers = itertools.count()
+        self.tempDir = tempfile.mkdtemp( dir=CGAssetSettings.localDir( "workers" ) ).replace( "\\", "/" )
+        self.lock = threading.Lock()
+        self.workers = []
+        self.terminated = False
+
+        self.threads = []
+        for i in range( self.processes ):
+            thread = threading.Thread( target=self.feed )
+            thread.daemon = True
+            thread.start()
+            self.threads.append( thread )
+
+
+
+    def startWorker( self ):
+
+        env = dict( os.environ )
+        env[ "PYTHONPATH" ] = os.path.dirname( os.path.abspath( __file__ ) ) + os.pathsep + env.get( "PYTHONPATH", "" )
+
+        kwargs = {}
+        if os.name == 'nt':
+            #CREATE_NO_WINDOW
+            kwargs[ "creationflags" ] = 0x08000000
+
+        command = [ workerExecutable(), "-c", "import CGAssetObjWriter; CGAssetObjWriter.workerMain()" ]
+        worker = subprocess.Popen( command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, close_fds=( os.name != 'nt' ), **kwargs )
+        with self.lock:
+            self.workers.append( worker )
+        return worker
+
+
+
+    def stopWorker( self, worker, kill=False ):
+
+        try:
+            if kill:
+                worker.kill()
+            else:
+                worker.stdin.close()
+            worker.wait()
+        except ( IOError, OSError ):
+            pass
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove( worker )
+
+
+
+    def run( self, worker, function, args ):
+
+        jobFile = self.tempDir+"/job"+str( next( self.jobNumbers ) )
+        with open( jobFile, 'wb' ) as f:
+            pickle.dump( ( function, args ), f, 2 )
+
+        try:
+            worker.stdin.write( ( jobFile+"\n" ).encode( "utf-8" ) )
+            worker.stdin.flush()
+            if not worker.stdout.readline():
+                raise WorkerError( "the worker process exited with " + str( worker.wait() ) )
+            with open( jobFile+".out", 'rb' ) as f:
+                ok, value = pickle.load( f )
+        finally:
+            for path in ( jobFile, jobFile+".out" ):
+                if os.path.exists( path ):
+                    os.remove( path )
+
+        if not ok:
+            raise WorkerError( value )
+        return value
+
+
+
+    def feed( self ):
+
+        #each thread keeps one worker busy, the worker is started with the first job
+        worker = None
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            function, args, result = job
+            if self.terminated:
+                result.set( None, "the pool was terminated" )
+                continue
+
+            try:
+                if worker is None:
+                    worker = self.startWorker()
+                result.set( self.run( worker, function, args ) )
+            except Exception as e:
+                result.set( None, str(e) )
+                if worker is not None:
+                    self.stopWorker( worker, kill=True )
+                    worker = None
+
+        if worker is not None:
+            self.stopWorker( worker )
+
+
+
+    def apply_async( self, function, args=() ):
+
+        result = SubprocessResult()
+        self.jobs.put( ( function, tuple( args ), result ) )
+        return result
+
+
+
+    def imap_unordered( self, function, iterable ):
+
+        finished = queue.Queue()
+        count = 0
+        for item in iterable:
+            self.jobs.put( ( function, ( item, ), SubprocessResult( finished ) ) )
+            count += 1
+        for i in range( count ):
+            yield finished.get().get()
+
+
+
+    def close( self ):
+
+        for thread in self.threads:
+            self.jobs.put( None )
+
+
+
+    def join( self ):
+
+        for thread in self.threads:
+            thread.join()
+        shutil.rmtree( self.tempDir, ignore_errors=True )
+
+
+
+    def terminate( self ):
+
+        self.terminated = True
+        with self.lock:
+            workers = list( self.workers )
+        for worker in workers:
+            self.stopWorker( worker, kill=True )
+        self.close()
+
+
+
+
+def getArray( arrays, name ):
+
+    values = arrays.get( name )
+    if values is None:
+        return []
+    return values
+
+
+
+def writeVectors( f, prefix, values, width ):
+
+    fmt = prefix + " %.6f"*width + "\n"
+    step = chunkItems*width
+    for start in range( 0, len(values), step ):
+        chunk = values[ start:start+step ]
+        f.write( "".join( fmt % tuple( chunk[ i:i+width ] ) for i in range( 0, len(chunk), width ) ) )
+
+
+
+def writeFaces( f, arrays, vOffset, vtOffset, vnOffset ):
+
+    faceCounts = arrays[ "faceCounts" ]
+    faceIndices = arrays[ "faceIndices" ]
+    normalIds = getArray( arrays, "normalIds" )
+    uvCounts = getArray( arrays, "uvCounts" )
+    uvIds = getArray( arrays, "uvIds" )
+
+    hasNormals = len(normalIds) == len(faceIndices)
+    hasUVs = len(uvCounts) == len(faceCounts)
+
+    lines = []
+    fv = 0
+    uv = 0
+    for face, count in enumerate( faceCounts ):
+        faceUVs = hasUVs and uvCounts[ face ] == count
+
+        corners = []
+        for corner in range( fv, fv+count ):
+            v = str( faceIndices[ corner ]+vOffset )
+            vt = str( uvIds[ uv+corner-fv ]+vtOffset ) if faceUVs else ""
+            vn = str( normalIds[ corner ]+vnOffset ) if hasNormals else ""
+
+            if vn:
+                corners.append( v+"/"+vt+"/"+vn )
+            elif vt:
+                corners.append( v+"/"+vt )
+            else:
+                corners.append( v )
+
+        lines.append( "f " + " ".join( corners ) + "\n" )
+
+        fv += count
+        if hasUVs:
+            uv += uvCounts[ face ]
+
+        if len(lines) >= chunkItems:
+            f.write( "".join( lines ) )
+            lines = []
+
+    if lines:
+        f.write( "".join( lines ) )
+
+
+
+def writeObj( path, meshes ):
+
+    #meshes is a list of ( name, arrays ), every mesh gets its own group
+    partFile = path + ".part"
+    vOffset = vtOffset = vnOffset = 1
+
+    #.obj.gz files are compressed on the way out
+    if path.endswith( CGAssetCompress.gzipExt ):
+        output = CGAssetCompress.openWrite( partFile, path, text=True )
+    else:
+        output = open( partFile, 'w', writeBuffer )
+
+    with output as f:
+        f.write( "# CG Asset Manager OBJ export\n" )
+
+        for name, arrays in meshes:
+            positions = arrays[ "positions" ]
+            normals = getArray( arrays, "normals" )
+            uvs = getArray( arrays, "uvs" )
+
+            f.write( "g " + name + "\n" )
+            writeVectors( f, "v", positions, 3 )
+            writeVectors( f, "vt", uvs, 2 )
+            writeVectors( f, "vn", normals, 3 )
+            writeFaces( f, arrays, vOffset, vtOffset, vnOffset )
+
+            vOffset += len(positions)//3
+            vtOffset += len(uvs)//2
+            vnOffset += len(normals)//3
+
+    CGAssetCopy.replaceFile( partFile, path )
+
+    return path
+
+
+
+def writeObjJob( job ):
+
+    #runs in a worker process, errors come back as text, with when and where it ran for the trace
+    path, meshes = job
+    start = time.time()
+    try:
+        writeObj( path, meshes )
+    except Exception as e:
+        if os.path.exists( path + ".part" ):
+            try:
+                os.remove( path + ".part" )
+            except OSError:
+                pass
+        return path, str(e), ( start, time.time(), os.getpid(), len(meshes), 0 )
+    return path, None, ( start, time.time(), os.getpid(), len(meshes), os.path.getsize( path ) )
+
+
+
+
+class InlineResult():
+
+    #a job written in this process, answers like the pool's results
+    def __init__( self, value ):
+
+        self.value = value
+
+
+
+    def get( self ):
+
+        return self.value
+
+
+
+
+class ObjWriterPool():
+
+    #constructor
+    def __init__( self, processes=defaultProcesses ):
+
+        self.processes = processes
+        self.pool = None
+        self.inline = False
+        self.pending = []
+
+
+
+    def start( self ):
+
+        if self.pool is not None or self.inline:
+            return
+
+        #never fork a running maya session, without any pool the files are written here one by one
+        self.pool = workerPool( self.processes )
+        if self.pool is None:
+            self.inline = True
+
+
+
+    def submit( self, path, meshes ):
+
+        #returns straight away, the worker writes while the next mesh is extracted
+        self.start()
+        if self.inline:
+            self.pending.append( InlineResult( writeObjJob( ( path, meshes ) ) ) )
+            return
+        self.pending.append( self.pool.apply_async( writeObjJob, ( ( path, meshes ), ) ) )
+
+
+
+    def wait( self, progress=None ):
+
+        #list of ( path, error ) that failed, progress gets ( done, total )
+        failed = []
+        total = len(self.pending)
+
+        for done, result in enumerate( self.pending ):
+            path, error, ( start, end, pid, meshCount, size ) = result.get()
+            CGAssetTrace.record( os.path.basename( path ), "obj", start, end, { "meshes": meshCount, "bytes": size }, pid=pid, tid=pid )
+            if error is not None:
+                failed.append( ( path, error ) )
+            if progress is not None:
+                progress( done+1, total )
+
+        self.pending = []
+        return failed
+
+
+
+    def close( self ):
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+
+    def __enter__( self ):
+
+        return self
+
+
+
+    def __exit__( self, *args ):
+
+        if self.pool is not None and self.pending:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.close()
@@ -0,0 +1,235 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Progress reporting for publishes. Stages count real work        #
+#   (meshes exported, bytes copied, scene saved) and updates are    #
+#   handed to the sinks at most a few times a second, whether the   #
+#   sink is the progress bar in the window or a headless logger.    #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import sys
+import time
+import logging
+import CGAssetTrace
+
+
+
+
+#seconds between updates handed to the sinks
+defaultInterval = 0.25
+
+#seconds between lines written by a log sink
+logInterval = 2.0
+
+#progress bar resolution
+barSteps = 1000
+
+#logger the log sinks write to
+loggerName = "CGAssetManager"
+
+
+
+
+def formatStatus( status ):
+
+    #"Exporting Geo 3 of 12." or "Exporting Textures (120 of 800 MB)."
+    if status[ "unit" ] == "bytes":
+        mb = 1024*1024
+        return status[ "label" ] + " (" + str(status[ "done" ]//mb) + " of " + str(status[ "total" ]//mb) + " MB)."
+    if status[ "total" ] > 1:
+        return status[ "label" ] + " " + str(status[ "done" ]) + " of " + str(status[ "total" ]) + "."
+    return status[ "label" ] + "."
+
+
+
+
+def progressLogger():
+
+    #INFO is below python's default WARNING and maya configures nothing for it, so the
+    #lines would never show. left alone where logging is set up already, batch publishes do
+    logger = logging.getLogger( loggerName )
+    if logger.getEffectiveLevel() > logging.INFO:
+        logger.setLevel( logging.INFO )
+
+    handled = logger
+    while handled is not None and not handled.handlers:
+        handled = handled.parent if handled.propagate else None
+    if handled is None:
+        handler = logging.StreamHandler( sys.stdout )
+        handler.setFormatter( logging.Formatter( "%(message)s" ) )
+        logger.addHandler( handler )
+
+    return logger
+
+
+
+
+class ProgressBarSink():
+
+    #feeds the progressBar and text widgets of the CGAssets window
+    def __init__( self, progressBar, textWidget ):
+
+        import maya.cmds
+        self.cmds = maya.cmds
+        self.progressBar = progressBar
+        self.textWidget = textWidget
+
+
+
+    def update( self, status ):
+
+        if status[ "final" ]:
+            self.cmds.progressBar( self.progressBar, edit=True, maxValue=barSteps, progress=0 )
+            self.cmds.text( self.textWidget, edit=True, label="" )
+            return
+
+        self.cmds.progressBar( self.progressBar, edit=True, maxValue=barSteps, progress=int( barSteps*status[ "fraction" ] ) )
+        self.cmds.text( self.textWidget, edit=True, label=formatStatus( status ) )
+
+        #let the window redraw while the main thread is busy
+        self.cmds.refresh()
+
+
+
+
+class LogSink():
+
+    #headless progress, a line per stage and every few seconds in between
+    def __init__( self, logger=None, interval=logInterval ):
+
+        self.logger = logger or progressLogger()
+        self.interval = interval
+        self.lastLog = 0.0
+        self.lastStage = None
+
+
+
+    def update( self, status ):
+
+        now = time.time()
+
+        if status[ "final" ]:
+            self.logger.info( "%s done in %.2fs.", status[ "stageLabel" ], status[ "seconds" ] )
+            self.lastStage = None
+            return
+
+        if status[ "stage" ] != self.lastStage or now - self.lastLog >= self.interval:
+            self.logger.info( formatStatus( status ) )
+            self.lastStage = status[ "stage" ]
+            self.lastLog = now
+
+
+
+
+class Progress():
+
+    #constructor
+    def __init__( self, sinks=None, interval=defaultInterval ):
+
+        self.sinks = list( sinks or [] )
+        self.interval = interval
+        self.stageId = 0
+        self.reset()
+
+
+
+    def reset( self ):
+
+        self.label = ""
+        self.stageLabel = ""
+        self.unit = ""
+        self.done = 0
+        self.total = 0
+        self.started = None
+        self.lastEmit = 0.0
+
+        #every stage is a span of the running trace
+        self.span = CGAssetTrace.nullSpan
+
+
+
+    def status( self, final=False ):
+
+        if self.total > 0:
+            fraction = min( 1.0, float(self.done) / self.total )
+        else:
+            fraction = 1.0 if final else 0.0
+
+        return {
+            "stage": self.stageId,
+            "label": self.label,
+            "stageLabel": self.stageLabel,
+            "unit": self.unit,
+            "done": self.done,
+            "total": self.total,
+            "fraction": fraction,
+            "seconds": time.time() - ( self.started or time.time() ),
+            "final": final
+        }
+
+
+
+    def emit( self, force=False, final=False ):
+
+        now = time.time()
+        if not force and now - self.lastEmit < self.interval:
+            return
+
+        self.lastEmit = now
+        status = self.status( final=final )
+        for sink in self.sinks:
+            sink.update( status )
+
+
+
+    def stage( self, label, total=1, unit="" ):
+
+        #start a new block of work, closing the one before it
+        if self.started is not None:
+            self.end()
+
+        self.stageId += 1
+        self.label = label
+        self.stageLabel = label
+        self.unit = unit
+        self.done = 0
+        self.total = total
+        self.started = time.time()
+        self.span = CGAssetTrace.span( label, "progress" )
+        self.emit( force=True )
+
+
+
+    def update( self, done, total=None, label=None ):
+
+        self.done = done
+        if total is not None:
+            self.total = total
+        if label is not None:
+            self.label = label
+        self.emit()
+
+
+
+    def advance( self, amount=1, label=None ):
+
+        self.update( self.done + amount, label=label )
+
+
+
+    def end( self ):
+
+        if self.started is None:
+            return
+
+        self.done = self.total
+        self.emit( force=True, final=True )
+        self.span.set( total=self.total, unit=self.unit )
+        self.span.close()
+        self.reset()
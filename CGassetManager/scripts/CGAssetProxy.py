@@ -0,0 +1,244 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Reduced resolution texture proxies. At publish time every       #
+#   texture in textures/ gets half, quarter (and optionally a full  #
+#   mip chain) copies in textures/proxy_<n>/, made by a process     #
+#   pool with Pillow, and a loaded scene can be switched to them.   #
+#                                                                   #
+#   Only the switch needs Maya, the proxies themselves do not.      #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import time
+import errno
+import CGAssetCopy
+import CGAssetObjWriter
+import CGAssetTextures
+import CGAssetTrace
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+
+
+#proxies of textures/<name> are textures/proxy_<divisor>/<name>
+proxyDirPrefix = "proxy_"
+
+#a mip chain stops once the longest side is this small
+mipMinSize = 64
+
+#formats pillow can write back under the same name
+proxyFormats = {
+    ".png": "PNG",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".tif": "TIFF",
+    ".tiff": "TIFF",
+    ".tga": "TGA",
+    ".bmp": "BMP"
+}
+
+#worker processes, None is one per core
+defaultProcesses = None
+
+
+
+
+def available():
+
+    return Image is not None
+
+
+
+def supported( name ):
+
+    return os.path.splitext( name )[1].lower() in proxyFormats
+
+
+
+def proxyDir( textureDir, divisor ):
+
+    return textureDir+"/"+proxyDirPrefix+str(divisor)
+
+
+
+def proxyDivisor( directory ):
+
+    #divisor of a proxy folder, None for any other folder
+    name = os.path.basename( directory.rstrip( "/" ) )
+    if not name.startswith( proxyDirPrefix ):
+        return None
+    try:
+        return int( name[ len(proxyDirPrefix): ] )
+    except ValueError:
+        return None
+
+
+
+def proxyLevels( textureDir ):
+
+    #divisors of the proxy folders a textures folder has, smallest divisor (largest proxy) first
+    try:
+        names = os.listdir( textureDir )
+    except OSError:
+        return []
+    return sorted( divisor for divisor in ( proxyDivisor( name ) for name in names ) if divisor is not None )
+
+
+
+def samePath( a, b ):
+
+    return os.path.normcase( os.path.normpath( a ) ) == os.path.normcase( os.path.normpath( b ) )
+
+
+
+def makeDir( path ):
+
+    #workers make the same folders at the same time
+    try:
+        os.mkdir( path )
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+
+def saveImage( image, path ):
+
+    fmt = proxyFormats[ os.path.splitext( path )[1].lower() ]
+    if fmt == "JPEG" and image.mode not in ( "RGB", "L" ):
+        image = image.convert( "RGB" )
+
+    partFile = path+".part"
+    try:
+        image.save( partFile, format=fmt )
+        CGAssetCopy.replaceFile( partFile, path )
+    finally:
+        if os.path.exists( partFile ):
+            os.remove( partFile )
+
+
+
+def makeProxies( src, textureDir, divisors, mips=False ):
+
+    #write the proxies of one texture, returns the divisors written
+    image = Image.open( src )
+    width, height = image.size
+
+    levels = sorted( set( divisors ) )
+    if mips:
+        divisor = max( levels or [ 1 ] )
+        while max( width, height )//divisor > mipMinSize:
+            divisor *= 2
+            levels.append( divisor )
+        levels = sorted( set( levels ) )
+
+    #every level is made from the one before it, only the first reads the full image
+    resample = getattr( Image, "BOX", Image.LANCZOS )
+    written = []
+    current = image
+    for divisor in levels:
+        size = ( max( 1, width//divisor ), max( 1, height//divisor ) )
+        if size == current.size:
+            continue
+        current = current.resize( size, resample )
+        makeDir( proxyDir( textureDir, divisor ) )
+        saveImage( current, proxyDir( textureDir, divisor )+"/"+os.path.basename( src ) )
+        written.append( divisor )
+    return written
+
+
+
+def makeProxiesJob( job ):
+
+    #runs in a worker process, errors come back as text, with when and where it ran for the trace
+    src, textureDir, divisors, mips = job
+    start = time.time()
+    try:
+        written, error = makeProxies( src, textureDir, divisors, mips ), None
+    except Exception as e:
+        written, error = [], str(e)
+    return src, written, error, ( start, time.time(), os.getpid() )
+
+
+
+def generateProxies( sources, textureDir, divisors, mips=False, processes=defaultProcesses, progress=None ):
+
+    #proxies of every source in a process pool, returns ( divisor -> count, [ ( src, error ) ] )
+    counts = {}
+    failed = []
+    if not sources:
+        return counts, failed
+
+    jobs = [ ( src, textureDir, list( divisors ), mips ) for src in sources ]
+    pool = CGAssetObjWriter.workerPool( processes )
+    if pool is None:
+        #batch publish workers cannot start a pool of their own, the proxies are made one by one
+        results = ( makeProxiesJob( job ) for job in jobs )
+    else:
+        results = pool.imap_unordered( makeProxiesJob, jobs )
+
+    try:
+        for done, ( src, written, error, ( start, end, pid ) ) in enumerate( results ):
+            CGAssetTrace.record( os.path.basename( src ), "proxy", start, end, { "divisors": written, "error": error }, pid=pid, tid=pid )
+            if error is not None:
+                failed.append( ( src, error ) )
+            for divisor in written:
+                counts[ divisor ] = counts.get( divisor, 0 ) + 1
+            if progress is not None:
+                progress( done+1, len(jobs) )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return counts, failed
+
+
+
+def switchTextures( textureDir, divisor=None, nodes=None ):
+
+    #point the file nodes reading textureDir at its proxies, None goes back to full resolution.
+    #a node only switches if every file it reads is there, returns how many switched
+    import maya.cmds as cmds
+
+    textureDir = textureDir.rstrip( "/" )
+    target = proxyDir( textureDir, divisor ) if divisor else textureDir
+    available = set( os.listdir( target ) ) if os.path.isdir( target ) else set()
+
+    textures = CGAssetTextures.resolveTextures( nodes )
+    switch = []
+    for node, paths in textures.nodes.items():
+        if not paths:
+            continue
+        folder = os.path.dirname( paths[0] )
+        if not samePath( folder, textureDir ) and not samePath( os.path.dirname( folder ), textureDir ):
+            continue
+        if samePath( folder, target ) or not all( os.path.basename( path ) in available for path in paths ):
+            continue
+        switch.append( node )
+
+    #one repath for every node, tiled nodes keep their tokens
+    if switch:
+        cmds.filePathEditor( [ node+".fileTextureName" for node in switch ], repath=target+"/", force=True )
+    return len(switch)
+
+
+
+def fullResolution( nodes=None ):
+
+    #put every node reading a proxy back on its full resolution texture
+    textures = CGAssetTextures.resolveTextures( nodes )
+    textureDirs = set()
+    for node, paths in textures.nodes.items():
+        if paths and proxyDivisor( os.path.dirname( paths[0] ) ) is not None:
+            textureDirs.add( os.path.dirname( os.path.dirname( paths[0] ) ) )
+    return sum( switchTextures( textureDir, None, nodes ) for textureDir in sorted( textureDirs ) )
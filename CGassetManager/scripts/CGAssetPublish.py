@@ -0,0 +1,917 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Publish stages of a version: scene save, geo export, texture    #
+#   export and manifest. Nothing in here touches the CGAssets       #
+#   window, so the same code runs behind the BUILD button and in    #
+#   a batch mayapy worker. A version is built in its staging        #
+#   folder and renamed into place once every stage is done.         #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import maya.cmds as cmds
+import os
+import errno
+import time
+import stat
+import shutil
+import tempfile
+import socket
+import datetime
+from multiprocessing.pool import ThreadPool
+import CGAssetCopy
+import CGAssetSettings
+import CGAssetStore
+import CGAssetFingerprint
+import CGAssetMeshCache
+import CGAssetObjWriter
+import CGAssetProgress
+import CGAssetVersions
+import CGAssetManifest
+import CGAssetSearch
+import CGAssetThumbnail
+import CGAssetUpload
+import CGAssetCompress
+import CGAssetDirty
+import CGAssetTextures
+import CGAssetProxy
+import CGAssetTrace
+
+
+
+
+#sub directories of every version folder
+versionSubDirs = [
+    'maya_files',
+    'textures',
+    'mari_archives',
+    'exports',
+    'scripts',
+    'notes'
+]
+
+#number of textures copied to the server at the same time
+textureCopyThreads = 8
+
+#OBJexport translator options, one file per mesh or one with a group per mesh
+objOptionsPerMesh = "groups=0;ptgroups=0;materials=0;smoothing=1;normals=1"
+objOptionsCombined = "groups=1;ptgroups=1;materials=0;smoothing=1;normals=1"
+
+
+
+
+def createVersionDirs( versionDir ):
+
+    #version directory with sub directories inside, the folder itself
+    #may already be there when it was reserved by CGAssetVersions.
+    #mkdir answers whether it exists, asking first is a second round trip to the share
+    try:
+        os.makedirs( versionDir )
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    for sub in versionSubDirs:
+        CGAssetProxy.makeDir( versionDir+"/"+sub )
+
+
+
+def removeFile( path ):
+
+    #links to the store or the previous version are read only, windows will not delete them as they are
+    try:
+        os.remove( path )
+    except OSError:
+        if os.name != 'nt' or not os.path.isfile( path ):
+            raise
+        os.chmod( path, stat.S_IREAD | stat.S_IWRITE )
+        os.remove( path )
+
+
+
+def clearDir( path ):
+
+    #empty a staging folder a crashed build left half filled
+    for name in os.listdir( path ):
+        if os.path.isdir( path+"/"+name ) and not os.path.islink( path+"/"+name ):
+            shutil.rmtree( path+"/"+name, onerror=lambda function, failed, excInfo: removeFile( failed ) )
+        else:
+            removeFile( path+"/"+name )
+
+
+
+def geoFileName( geo ):
+
+    #non unique and namespaced names cannot be used as file names as is
+    return geo.lstrip( "|" ).replace( "|", "_" ).replace( ":", "_" )
+
+
+
+
+class PublishResult():
+
+    #constructor
+    def __init__( self ):
+
+        #mesh shapes and texture names that went out
+        self.geoList = []
+        self.textures = []
+
+        #list of ( src, dst, error message )
+        self.failedTextures = []
+
+        #list of ( export file, error message )
+        self.failedExports = []
+
+        #texture and export name -> content hash, mesh shape -> hash of its arrays
+        self.textureDigests = {}
+        self.exportDigests = {}
+        self.meshDigests = {}
+
+        #files linked from the previous version instead of written again
+        self.carried = []
+
+        #mesh and file nodes changed since the previous version, None when that was not tracked
+        self.dirty = None
+
+        #proxy divisor -> textures that have one, list of ( texture, error message )
+        self.proxies = {}
+        self.failedProxies = []
+
+        #stage name -> seconds it took
+        self.stageSeconds = {}
+
+        self.sceneFile = None
+        self.storedSceneFile = None
+        self.sceneUpload = None
+        self.thumbnailFile = None
+        self.manifestFile = None
+
+
+
+
+class Publisher():
+
+    #constructor
+    def __init__( self, rndDir, versionDir, job, version, artist, settings=None, progress=None, previousDir=None ):
+
+        self.rndDir = rndDir
+        self.versionDir = versionDir
+        self.job = job
+        self.version = version
+        self.artist = artist
+
+        self.settings = settings or CGAssetSettings.loadSettings( rndDir )
+        self.progress = progress or CGAssetProgress.Progress( [ CGAssetProgress.LogSink() ] )
+        self.fingerprints = CGAssetFingerprint.fingerprints
+
+        #version this one was versioned up from, whatever did not change is linked from it
+        self.previousDir = previousDir
+        self.previous = CGAssetManifest.readManifest( previousDir ) if previousDir else None
+        if self.previous is not None and self.previous.get( "hashName" ) != CGAssetFingerprint.hashName:
+            self.previous = None
+        self.previousMeshes = dict( ( mesh[ "name" ], mesh ) for mesh in self.previous.get( "meshes", [] ) ) if self.previous else {}
+        self.previousExports = self.previousEntries( "exports" )
+        self.previousTextures = self.previousEntries( "textures" )
+
+        #everything is written here, the staging folder until the version is published
+        self.workDir = CGAssetVersions.workDir( versionDir )
+        self.staged = self.workDir != versionDir.rstrip( "/" )
+
+        #export Directory
+        self.exportDir = self.workDir+"/exports"
+
+        #texture directory
+        self.textureDir = self.workDir+"/textures"
+
+        #mayaPath directory
+        self.mayaDir = self.workDir+"/maya_files"
+
+        #notes directory
+        self.notesDir = self.workDir+"/notes"
+
+        self.result = PublishResult()
+
+
+
+    def run( self ):
+
+        #get list of all geometry in scene, without deformer history shapes
+        self.result.geoList = cmds.ls( type='mesh', noIntermediate=True ) or []
+
+        #a staged build starts from an empty folder, whatever a crashed one of this session left is dropped.
+        #a version another session is still building is left alone
+        if self.staged:
+            CGAssetVersions.claimVersion( self.versionDir )
+            clearDir( self.workDir )
+        createVersionDirs( self.workDir )
+
+        #what changed since the previous version, taken before the tracker starts over for this one
+        tracker = CGAssetDirty.tracker
+        self.sceneModified = cmds.file( query=True, modified=True )
+        self.cleanMeshes = tracker.cleanNames( "mesh", self.previousDir ) if self.previous is not None else None
+        if self.cleanMeshes is not None:
+            self.result.dirty = { "meshes": sorted( tracker.dirtyNames( "mesh" ) ), "files": sorted( tracker.dirtyNames( "file" ) ) }
+        tracker.markPublished( self.versionDir.rstrip( "/" ) )
+
+        self.started = datetime.datetime.now()
+        try:
+            for name, stage in ( ( "scene", self.saveScene ), ( "thumbnail", self.saveThumbnail ), ( "geo", self.exportGeo ), ( "textures", self.exportTextures ), ( "proxies", self.makeProxies ) ):
+                stageStart = time.time()
+                with CGAssetTrace.span( name, "stage" ):
+                    stage()
+                self.result.stageSeconds[ name ] = round( time.time() - stageStart, 3 )
+        except Exception:
+            tracker.forget()
+            raise
+
+        #written last, its presence marks the version as built
+        with CGAssetTrace.span( "manifest", "stage" ):
+            manifest = self.writeManifest()
+
+        #one rename, the version shows up whole or not at all
+        with CGAssetTrace.span( "publish", "stage" ):
+            self.publish()
+
+        #searchable from every window without a rescan
+        with CGAssetTrace.span( "search", "stage" ):
+            self.addToSearch( manifest )
+
+        #the window selects this version first from now on
+        CGAssetVersions.writeLatest( os.path.dirname( self.versionDir ), self.version )
+
+        #keep the hashes for the next publish on this workstation
+        with CGAssetTrace.span( "fingerprints", "stage" ):
+            self.fingerprints.save()
+
+        return self.result
+
+
+
+    def previousEntries( self, key ):
+
+        #file name -> manifest entry in the previous version
+        if self.previous is None:
+            return {}
+        return dict( ( entry[ "file" ], entry ) for entry in self.previous.get( key ) or [] )
+
+
+
+    def carryFile( self, sub, name, digest, newName=None ):
+
+        #hardlink an unchanged file of the previous version into this one,
+        #False if it has to be written again
+        if self.previous is None or digest is None:
+            return False
+        src = self.previousDir+"/"+sub+"/"+name
+        dst = self.workDir+"/"+sub+"/"+( newName or name )
+        if not os.path.isfile( src ) or not CGAssetStore.makeLink( src, dst ):
+            return False
+
+        #both versions share the file now, like store objects it is never written in place
+        try:
+            CGAssetStore.protect( dst )
+        except OSError:
+            os.remove( dst )
+            return False
+        self.fingerprints.remember( dst, digest )
+        self.result.carried.append( dst )
+        return True
+
+
+
+    def carryScene( self ):
+
+        #a version up nobody touched yet has the previous scene as its scene
+        if self.previous is None or self.sceneModified:
+            return False
+        scene = self.previous.get( "scene" ) or {}
+        if scene.get( "hash" ) is None or scene.get( "uploading" ):
+            return False
+        if scene[ "file" ].endswith( CGAssetCompress.gzipExt ) != CGAssetCompress.compressed( self.settings ):
+            return False
+        return self.carryFile( "maya_files", scene[ "file" ], scene[ "hash" ], os.path.basename( self.result.storedSceneFile ) )
+
+
+
+    def meshArrays( self, geo ):
+
+        with CGAssetTrace.span( "extract", "mesh", mesh=geo ):
+            arrays = CGAssetMeshCache.extractMesh( geo )
+            self.result.meshDigests[ geo ] = CGAssetMeshCache.meshDigest( arrays )
+        return arrays
+
+
+
+    def carryClean( self, geo ):
+
+        #a mesh the tracker saw untouched since the previous version is linked without reading it
+        previous = self.previousMeshes.get( geo )
+        if not self.cleanMeshes or geo not in self.cleanMeshes or previous is None or previous.get( "hash" ) is None:
+            return False
+        self.result.meshDigests[ geo ] = previous[ "hash" ]
+        if self.carryMesh( geo ):
+            return True
+        del self.result.meshDigests[ geo ]
+        return False
+
+
+
+    def carryMesh( self, geo ):
+
+        #link the export and cache of a mesh that did not change since the previous version
+        previous = self.previousMeshes.get( geo )
+        digest = self.result.meshDigests.get( geo )
+        if previous is None or digest is None or previous.get( "hash" ) != digest:
+            return False
+
+        names = []
+        if self.settings[ "geoExport" ] != "combined":
+            if previous[ "file" ] != self.meshFile( geo ):
+                return False
+            names.append( previous[ "file" ] )
+        if self.settings[ "meshCache" ]:
+            if previous.get( "cache" ) is None:
+                return False
+            names.append( previous[ "cache" ] )
+
+        linked = []
+        for name in names:
+            if not self.carryFile( "exports", name, ( self.previousExports.get( name ) or {} ).get( "hash" ) ):
+                #the exporters could write through a half carried link into the previous version
+                for dst in linked:
+                    os.remove( dst )
+                    self.result.carried.remove( dst )
+                return False
+            linked.append( self.exportDir+"/"+name )
+        return True
+
+
+
+    def carryCombined( self, carriedMeshes ):
+
+        #the combined OBJ is linked when every mesh in it is unchanged
+        previous = self.previous.get( "meshes" ) if self.previous else None
+        geoList = self.result.geoList
+        if not previous or set( mesh[ "name" ] for mesh in previous ) != set( geoList ) or not carriedMeshes.issuperset( geoList ):
+            return False
+        if self.previous[ "settings" ].get( "geoExport" ) != "combined":
+            return False
+        name = previous[0][ "file" ]
+        newName = self.meshFile( geoList[0] )
+        if name.endswith( CGAssetCompress.gzipExt ) != newName.endswith( CGAssetCompress.gzipExt ):
+            return False
+        return self.carryFile( "exports", name, ( self.previousExports.get( name ) or {} ).get( "hash" ), newName )
+
+
+
+    def published( self, path ):
+
+        #where a file written into the work folder is once the version is published
+        if path is None or not path.startswith( self.workDir+"/" ):
+            return path
+        return self.versionDir.rstrip( "/" )+path[ len(self.workDir): ]
+
+
+
+    def publish( self ):
+
+        result = self.result
+        CGAssetVersions.publishVersion( self.versionDir )
+
+        #the session and the result point at the published version
+        result.sceneFile = self.published( result.sceneFile )
+        result.storedSceneFile = self.published( result.storedSceneFile )
+        result.thumbnailFile = self.published( result.thumbnailFile )
+        result.manifestFile = self.published( result.manifestFile )
+        cmds.file( rename=result.sceneFile )
+
+        #the upload needs its destination folder, so it only starts now
+        if result.sceneUpload is not None:
+            CGAssetUpload.uploader.enqueue( result.sceneUpload )
+
+
+
+    def saveScene( self ):
+
+        #-----------------------------------------------#
+        #                   SCENE SAVE                  #
+        #-----------------------------------------------#
+        progress = self.progress
+
+        self.result.sceneFile = self.mayaDir+"/"+self.job+"_"+self.version+".mb"
+        self.result.storedSceneFile = CGAssetCompress.publishedName( self.result.sceneFile, self.settings )
+        compress = CGAssetCompress.compressed( self.settings )
+
+        if self.carryScene():
+            progress.stage( "Linking Unchanged Scene File" )
+            cmds.file( rename=self.result.sceneFile )
+            progress.end()
+            return
+
+        writeBehind = self.settings[ "sceneSave" ] == "writeBehind" and not cmds.about( batch=True )
+
+        if writeBehind or compress:
+            #local disk first, the server only ever sees the finished (compressed) stream
+            progress.stage( "Saving Scene File Locally" )
+            localFile = CGAssetUpload.stagingFile( os.path.basename( self.result.sceneFile ) )
+            cmds.file( rename=localFile )
+            cmds.file( save=True, type='mayaBinary' )
+
+            #the session keeps pointing at the server copy
+            cmds.file( rename=self.result.sceneFile )
+
+            if writeBehind:
+                #the server copy is made while the artist works on, the marker is published with the version
+                dst = self.published( self.result.storedSceneFile )
+                job = CGAssetUpload.UploadJob( localFile, dst, self.versionDir.rstrip( "/" ), compress=compress, dstMtime=CGAssetUpload.fileMtime( dst ) )
+                job.save()
+                job.writeMarker( self.workDir )
+                self.result.sceneUpload = job
+            else:
+                progress.stage( "Compressing Scene File To The Server" )
+                try:
+                    CGAssetUpload.uploadFile( localFile, self.result.storedSceneFile, compress=True )
+                finally:
+                    shutil.rmtree( os.path.dirname( localFile ), ignore_errors=True )
+        else:
+            progress.stage( "Saving Scene File" )
+            cmds.file( rename=self.result.sceneFile )
+            cmds.file( save=True, type='mayaBinary' )
+
+        progress.end()
+
+
+
+    def saveThumbnail( self ):
+
+        #-----------------------------------------------#
+        #                   THUMBNAIL                   #
+        #-----------------------------------------------#
+        self.progress.stage( "Capturing Thumbnail" )
+        self.result.thumbnailFile = CGAssetThumbnail.captureThumbnail( CGAssetThumbnail.thumbnailPath( self.workDir ) )
+        self.progress.end()
+
+
+
+    def exportGeo( self ):
+
+        #-----------------------------------------------#
+        #                   GEO EXPORT                  #
+        #-----------------------------------------------#
+        progress = self.progress
+        settings = self.settings
+        exportDir = self.exportDir
+        geoList = self.result.geoList
+        geoLength = len( geoList )
+        compress = CGAssetCompress.compressed( settings )
+        combinedName = self.job+"_"+self.version+'.obj'
+
+        if geoLength == 0:
+            cmds.warning( "There is no geometry in the scene." )
+            return
+
+        #the translator can only write plain files, compressed exports are written locally first
+        translatorDir = exportDir
+        if compress and settings[ "objWriter" ] != "python":
+            translatorDir = tempfile.mkdtemp( dir=CGAssetSettings.localDir( "exports" ) ).replace( "\\", "/" )
+        combinedFile = translatorDir+"/"+combinedName
+
+        previousSelection = cmds.ls( selection=True, long=True ) or []
+
+        if settings[ "objWriter" ] == "python":
+            #meshes are read once here and written by worker processes
+            self.result.failedExports = self.exportGeoPython( exportDir+"/"+CGAssetCompress.publishedName( combinedName, settings ) )
+            for objFile, error in self.result.failedExports:
+                cmds.warning( "Could not export " + objFile + ": " + error )
+
+        elif settings[ "geoExport" ] == "combined":
+            #every mesh is hashed, the file is only exported again if one of them changed
+            progress.stage( "Hashing Geo", total=geoLength )
+            carried = set()
+            for geo in geoList:
+                with CGAssetTrace.span( geo, "mesh" ) as span:
+                    if self.carryClean( geo ):
+                        span.set( carried=True )
+                        carried.add( geo )
+                        progress.advance()
+                        continue
+                    arrays = self.meshArrays( geo )
+                    if self.carryMesh( geo ):
+                        span.set( carried=True )
+                        carried.add( geo )
+                    elif settings[ "meshCache" ]:
+                        CGAssetMeshCache.writeMeshCache( exportDir+"/"+geoFileName( geo )+CGAssetMeshCache.meshCacheExt, arrays, meta={ "name": geo, "space": "world" } )
+                progress.advance()
+
+            #one file, every mesh in its own group
+            if not self.carryCombined( carried ):
+                progress.stage( "Exporting " + str(geoLength) + " meshes to one OBJ" )
+                #the shapes themselves, a transform would bring every mesh parented under it along again
+                cmds.select( geoList, replace=True )
+                cmds.file( combinedFile, exportSelected=True, type='OBJexport', options=objOptionsCombined, force=True )
+
+        else:
+            #only the current mesh shape is selected, not its transform and whatever is
+            #parented under that, so each file holds exactly one mesh
+            progress.stage( "Exporting Geo", total=geoLength )
+            for geo in geoList:
+                objFile = translatorDir+"/"+geoFileName( geo )+'.obj'
+                with CGAssetTrace.span( geo, "mesh" ) as span:
+                    if self.carryClean( geo ):
+                        span.set( carried=True )
+                        progress.advance()
+                        continue
+                    arrays = self.meshArrays( geo )
+                    if self.carryMesh( geo ):
+                        span.set( carried=True )
+                        progress.advance()
+                        continue
+
+                    #binary mesh caches for tools that do not want to parse OBJ
+                    if settings[ "meshCache" ]:
+                        CGAssetMeshCache.writeMeshCache( exportDir+"/"+geoFileName( geo )+CGAssetMeshCache.meshCacheExt, arrays, meta={ "name": geo, "space": "world" } )
+
+                    if not CGAssetCompress.findPublished( exportDir+"/"+geoFileName( geo )+'.obj' ):
+                        cmds.select( geo, replace=True )
+                        cmds.file( objFile, exportSelected=True, type='OBJexport', options=objOptionsPerMesh, force=True )
+                        span.set( bytes=os.path.getsize( objFile ) )
+                progress.advance()
+
+        if previousSelection:
+            cmds.select( previousSelection, replace=True )
+        else:
+            cmds.select( clear=True )
+
+        progress.end()
+
+        #kill all .mtl files, only the maya translator writes them
+        if settings[ "objWriter" ] != "python":
+            OBJList = os.listdir( translatorDir )
+            for mtl in OBJList:
+                if mtl.endswith( ".mtl" ):
+                    os.remove( translatorDir+"/"+mtl )
+
+        #stream the local exports to the server compressed, a few at a time
+        if translatorDir != exportDir:
+            self.compressExports( translatorDir )
+
+        #fingerprint the exports, unchanged ones are not read again
+        for name, digest in self.fingerprints.digests( [ exportDir+"/"+obj for obj in os.listdir( exportDir ) ] ).items():
+            self.result.exportDigests[ os.path.basename( name ) ] = digest
+
+
+
+    def compressExports( self, localDir ):
+
+        progress = self.progress
+        names = sorted( os.listdir( localDir ) )
+
+        def compressOne( name ):
+            try:
+                CGAssetCompress.compressFile( localDir+"/"+name, self.exportDir+"/"+name+CGAssetCompress.gzipExt )
+            except ( IOError, OSError ) as e:
+                return self.exportDir+"/"+name+CGAssetCompress.gzipExt, str(e)
+            return None
+
+        progress.stage( "Compressing Exports", total=len(names) )
+        if names:
+            pool = ThreadPool( min( textureCopyThreads, len(names) ) )
+            try:
+                for failed in pool.imap_unordered( compressOne, names ):
+                    if failed is not None:
+                        self.result.failedExports.append( failed )
+                        cmds.warning( "Could not export " + failed[0] + ": " + failed[1] )
+                    progress.advance()
+            finally:
+                pool.close()
+                pool.join()
+        progress.end()
+
+        shutil.rmtree( localDir, ignore_errors=True )
+
+
+
+    def exportGeoPython( self, combinedFile ):
+
+        #extract every mesh once through the API, the OBJ text is written
+        #by a process pool while maya moves on to the next mesh
+        progress = self.progress
+        settings = self.settings
+        exportDir = self.exportDir
+        geoList = self.result.geoList
+        combined = []
+        carried = set()
+
+        with CGAssetObjWriter.ObjWriterPool() as writerPool:
+            progress.stage( "Extracting Geo", total=len(geoList) )
+            for geo in geoList:
+                objFile = exportDir+"/"+CGAssetCompress.publishedName( geoFileName( geo )+'.obj', settings )
+
+                #the combined file needs the arrays of every mesh unless it is linked whole
+                if settings[ "geoExport" ] != "combined" and self.carryClean( geo ):
+                    progress.advance()
+                    continue
+                arrays = self.meshArrays( geo )
+
+                #unchanged since the previous version, its files are linked
+                if self.carryMesh( geo ):
+                    carried.add( geo )
+                    if settings[ "geoExport" ] == "combined":
+                        combined.append( ( geo, arrays ) )
+                    progress.advance()
+                    continue
+
+                if settings[ "meshCache" ]:
+                    CGAssetMeshCache.writeMeshCache( exportDir+"/"+geoFileName( geo )+CGAssetMeshCache.meshCacheExt, arrays, meta={ "name": geo, "space": "world" } )
+
+                if settings[ "geoExport" ] == "combined":
+                    combined.append( ( geo, arrays ) )
+                elif not os.path.exists( objFile ):
+                    writerPool.submit( objFile, [ ( geo, arrays ) ] )
+
+                progress.advance()
+
+            if combined and not self.carryCombined( carried ):
+                writerPool.submit( combinedFile, combined )
+
+            progress.stage( "Writing OBJ", total=len(writerPool.pending) )
+            failed = writerPool.wait( progress=progress.update )
+
+        return failed
+
+
+
+    def textureCopyProgress( self, status ):
+
+        #called on the main thread while the copy engine works
+        label = "Exporting Texture " + str(status[ "filesDone" ]) + " of " + str(status[ "filesTotal" ])
+        self.progress.update( status[ "bytesDone" ], total=status[ "bytesTotal" ], label=label )
+
+
+
+    def exportTextures( self ):
+
+        #-----------------------------------------------#
+        #               TEXTURE EXPORT                  #
+        #-----------------------------------------------#
+        progress = self.progress
+        textureDir = self.textureDir
+        fingerprints = self.fingerprints
+
+        #get list of all textures in scene
+        textureList = cmds.ls( type='file' ) or []
+
+        if len(textureList) == 0:
+            cmds.warning("Therer are no textures in your scene.")
+            return
+
+        #every file node read once, udim tiles and frames expanded to the files on disk
+        textures = CGAssetTextures.resolveTextures( textureList )
+
+        #a scene loaded with proxies publishes its full resolution textures
+        proxyNodes = [ t for t in textureList if textures.nodes[ t ] and CGAssetProxy.proxyDivisor( os.path.dirname( textures.nodes[ t ][0] ) ) is not None ]
+        if proxyNodes:
+            CGAssetProxy.fullResolution( proxyNodes )
+            textures = CGAssetTextures.resolveTextures( textureList )
+
+        for node, path in textures.missing:
+            cmds.warning( "Texture of " + node + " not found: " + path )
+
+        #one copy per destination, the last texture with a name wins
+        copyJobs = textures.copyJobs( textureDir )
+        progress.stage( "Exporting Textures", total=sum( textures.files[ src ] for src in copyJobs.values() ), unit="bytes" )
+
+        #textures the scene still reads from the previous version are linked, not copied
+        carried = {}
+        for dst, src in sorted( copyJobs.items() ):
+            digest = self.carriedTexture( src )
+            if digest is None:
+                continue
+            with CGAssetTrace.span( os.path.basename( dst ), "link", src=src, bytes=textures.files[ src ] ):
+                if not self.carryFile( "textures", os.path.basename( src ), digest, os.path.basename( dst ) ):
+                    continue
+            carried[ dst ] = digest
+            self.result.textureDigests[ os.path.basename( dst ) ] = digest
+            del copyJobs[ dst ]
+
+        #copy files from previous folder to correct destination
+        engine = CGAssetCopy.CopyEngine( threads=textureCopyThreads )
+        storePointers = {}
+
+        if self.settings[ "textureStore" ]:
+            #unchanged textures are already in the store and only get linked
+            store = CGAssetStore.TextureStore( self.rndDir )
+            storeResult = store.publish( [ ( src, dst ) for dst, src in sorted( copyJobs.items() ) ], engine=engine, progress=self.textureCopyProgress )
+
+            #carried textures are links to the same store objects
+            for dst, digest in carried.items():
+                storeResult.digests[ dst ] = digest
+                storeResult.linked.append( dst )
+            store.writePointers( self.notesDir, storeResult )
+            storePointers = storeResult.pointers
+            self.result.failedTextures = storeResult.failed
+            for dst, digest in storeResult.digests.items():
+                self.result.textureDigests[ os.path.basename( dst ) ] = digest
+        else:
+            copyResult = engine.copyFiles( [ ( src, dst ) for dst, src in sorted( copyJobs.items() ) ], progress=self.textureCopyProgress )
+            self.result.failedTextures = copyResult.failed
+
+            #a copy has the hash of its source, no need to read it back
+            for src, dst in copyResult.copied:
+                try:
+                    digest = fingerprints.digest( src )
+                except ( IOError, OSError ):
+                    continue
+                fingerprints.remember( dst, digest )
+                self.result.textureDigests[ os.path.basename( dst ) ] = digest
+
+        #report everything that did not make it in one go
+        for src, dst, error in self.result.failedTextures:
+            cmds.warning( "Could not copy texture " + src + ": " + error )
+
+        #textures that could not be linked are read straight from the store
+        pointerNames = dict( ( os.path.basename( dst ), obj ) for dst, obj in storePointers.items() )
+        repathNodes = []
+        for t in textureList:
+            names = [ os.path.basename( path ) for path in textures.nodes.get( t, [] ) ]
+            if t in textures.patterns and any( name in pointerNames for name in names ):
+                #store objects have no tile numbers in their names, the node keeps its sources
+                cmds.warning( "Tiles of " + t + " could not be linked from the texture store, it still reads " + textures.patterns[ t ] )
+            elif names and names[0] in pointerNames:
+                cmds.setAttr( t+".fileTextureName", pointerNames[ names[0] ], type="string" )
+            elif names:
+                repathNodes.append( t )
+
+        #reload textures from current assset folder, where they will be once the version is published.
+        #one repath for every node, tiled nodes keep their tokens
+        if repathNodes:
+            cmds.filePathEditor( [ t+".fileTextureName" for t in repathNodes ], repath=self.published( textureDir )+"/", force=True )
+
+        progress.end()
+
+
+
+    def makeProxies( self ):
+
+        #-----------------------------------------------#
+        #               TEXTURE PROXIES                 #
+        #-----------------------------------------------#
+        settings = self.settings
+        divisors = settings[ "textureProxies" ] or []
+        if not divisors and not settings[ "textureMips" ]:
+            return
+        if not CGAssetProxy.available():
+            cmds.warning( "Pillow is not installed, no texture proxies are made." )
+            return
+
+        progress = self.progress
+        textureDir = self.textureDir
+        names = [ name for name in sorted( os.listdir( textureDir ) ) if CGAssetProxy.supported( name ) ]
+
+        #proxies of textures carried from the previous version come along with them
+        carried = set( self.result.carried )
+        sources = []
+        for name in names:
+            if textureDir+"/"+name in carried and self.carryProxies( name ):
+                continue
+            sources.append( textureDir+"/"+name )
+
+        progress.stage( "Making Texture Proxies", total=len(sources) )
+        counts, failed = CGAssetProxy.generateProxies( sources, textureDir, divisors, settings[ "textureMips" ], progress=progress.update )
+        for divisor, count in counts.items():
+            self.result.proxies[ divisor ] = self.result.proxies.get( divisor, 0 ) + count
+        self.result.failedProxies = failed
+        for src, error in failed:
+            cmds.warning( "Could not make proxies of " + src + ": " + error )
+        progress.end()
+
+
+
+    def carryProxies( self, name ):
+
+        #link the proxies of an unchanged texture, made with the same settings
+        previous = self.previous
+        if previous is None or not previous.get( "proxies" ):
+            return False
+        for key in ( "textureProxies", "textureMips" ):
+            if previous[ "settings" ].get( key ) != self.settings[ key ]:
+                return False
+
+        linked = []
+        for divisor in sorted( int( key ) for key in previous[ "proxies" ] ):
+            src = CGAssetProxy.proxyDir( self.previousDir+"/textures", divisor )+"/"+name
+            dst = CGAssetProxy.proxyDir( self.textureDir, divisor )+"/"+name
+            if not os.path.isfile( src ):
+                continue
+            CGAssetProxy.makeDir( os.path.dirname( dst ) )
+            if not CGAssetStore.makeLink( src, dst ):
+                return False
+            CGAssetStore.protect( dst )
+            linked.append( divisor )
+
+        for divisor in linked:
+            self.result.proxies[ divisor ] = self.result.proxies.get( divisor, 0 ) + 1
+        return bool( linked )
+
+
+
+    def carriedTexture( self, src ):
+
+        #hash of a texture read straight from the previous version's textures, None for any other source
+        #or for one edited in place since it was published. the fingerprint cache only reads files that changed
+        if self.previous is None:
+            return None
+        previousDir = os.path.normcase( os.path.abspath( self.previousDir+"/textures" ) )
+        if os.path.normcase( os.path.abspath( os.path.dirname( src ) ) ) != previousDir:
+            return None
+        entry = self.previousTextures.get( os.path.basename( src ) )
+        if entry is None or entry[ "hash" ] is None:
+            return None
+        try:
+            digest = self.fingerprints.digest( src )
+        except ( IOError, OSError ):
+            return None
+        return digest if digest == entry[ "hash" ] else None
+
+
+
+    def meshFile( self, geo ):
+
+        #export the mesh ended up in
+        if self.settings[ "geoExport" ] == "combined":
+            return CGAssetCompress.publishedName( self.job+"_"+self.version+'.obj', self.settings )
+        return CGAssetCompress.publishedName( geoFileName( geo )+'.obj', self.settings )
+
+
+
+    def writeManifest( self ):
+
+        #-----------------------------------------------#
+        #                   MANIFEST                    #
+        #-----------------------------------------------#
+        self.progress.stage( "Writing Manifest" )
+        result = self.result
+        exportDigests = result.exportDigests
+        textureDigests = result.textureDigests
+
+        #textures only in the store have a hash but no file in textures/, proxy folders are not textures
+        onDisk = [ name for name in os.listdir( self.textureDir ) if CGAssetProxy.proxyDivisor( name ) is None ]
+        result.textures = sorted( set( onDisk ) | set( textureDigests ) )
+
+        meshes = []
+        for geo in result.geoList:
+            mesh = { "name": geo, "file": self.meshFile( geo ), "hash": result.meshDigests.get( geo ) }
+            cacheFile = geoFileName( geo )+CGAssetMeshCache.meshCacheExt
+            if cacheFile in exportDigests:
+                mesh[ "cache" ] = cacheFile
+            meshes.append( mesh )
+
+        manifest = {
+            "job": self.job,
+            "version": self.version,
+            "artist": self.artist,
+            "host": socket.gethostname(),
+            "started": self.started.isoformat(),
+            "finished": datetime.datetime.now().isoformat(),
+            "stageSeconds": result.stageSeconds,
+            "settings": self.settings,
+            "hashName": CGAssetFingerprint.hashName,
+            "carriedFrom": os.path.basename( self.previousDir.rstrip( "/" ) ) if self.previous is not None else None,
+            "carriedFiles": len(result.carried),
+            "dirty": result.dirty,
+            "scene": result.sceneUpload.sceneEntry() if result.sceneUpload else CGAssetManifest.fileEntry( result.storedSceneFile, self.fingerprints.cached( result.storedSceneFile ) ),
+            "thumbnail": CGAssetManifest.fileEntry( result.thumbnailFile ) if result.thumbnailFile else None,
+            "meshes": meshes,
+            "exports": [ CGAssetManifest.fileEntry( self.exportDir+"/"+name, exportDigests[ name ] ) for name in sorted( exportDigests ) ],
+            "textures": [ CGAssetManifest.fileEntry( self.textureDir+"/"+name, textureDigests.get( name ) ) for name in result.textures ],
+            "failedTextures": [ { "source": src, "error": error } for src, dst, error in result.failedTextures ],
+            "failedExports": [ { "file": os.path.basename( path ), "error": error } for path, error in result.failedExports ],
+            "proxies": dict( ( str(divisor), count ) for divisor, count in result.proxies.items() ),
+            "failedProxies": [ { "file": os.path.basename( src ), "error": error } for src, error in result.failedProxies ]
+        }
+
+        result.manifestFile = CGAssetManifest.writeManifest( self.workDir, manifest )
+        self.progress.end()
+
+        return manifest
+
+
+
+    def addToSearch( self, manifest ):
+
+        jobDir = os.path.dirname( self.versionDir )
+        asset = os.path.basename( os.path.dirname( jobDir ) )
+        project = os.path.basename( os.path.dirname( self.rndDir.rstrip( "/" ) ) )
+
+        try:
+            #the first log of a project starts with every version built so far, this one included
+            if not CGAssetSearch.searchFiles( self.rndDir ):
+                CGAssetSearch.rebuildProject( self.rndDir, project )
+            else:
+                CGAssetSearch.appendDocument( self.rndDir, CGAssetSearch.versionDocument( project, asset, self.job, self.version, manifest ) )
+        except ( IOError, OSError ) as e:
+            cmds.warning( "Could not add " + self.version + " to the asset search: " + str(e) )
@@ -0,0 +1,363 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Asset search across every project. Each workstation keeps an    #
+#   append only log per project in 09_CG_RnD with one line per      #
+#   version it built, and the window folds all of them into an      #
+#   inverted index whose sorted token list answers prefix queries.  #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import re
+import json
+import socket
+import heapq
+import bisect
+import threading
+import CGAssetCopy
+import CGAssetManifest
+import CGAssetVersions
+
+
+
+
+#search logs inside every project's 09_CG_RnD folder, CG_Search.<host>.jsonl.
+#appends from several machines to one file on the share are not atomic, so every host writes its own
+searchFilePrefix = "CG_Search"
+searchFileExt = ".jsonl"
+
+#results handed back for one query
+maxResults = 200
+
+#camelCase, runs of capitals and numbers are tokens of their own
+wordPattern = re.compile( r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+" )
+
+#characters that split a query into terms
+separatorPattern = re.compile( r"[^A-Za-z0-9]+" )
+
+
+
+
+def searchFile( rndDir ):
+
+    #the log this workstation appends to
+    host = re.sub( r"[^A-Za-z0-9_-]+", "_", socket.gethostname() ) or "unknown"
+    return rndDir+"/"+searchFilePrefix+"."+host+searchFileExt
+
+
+
+def searchFiles( rndDir ):
+
+    #every host's log of a project, and the shared one older windows wrote
+    try:
+        names = os.listdir( rndDir )
+    except OSError:
+        return []
+    return [ rndDir+"/"+name for name in sorted( names ) if name.startswith( searchFilePrefix ) and name.endswith( searchFileExt ) ]
+
+
+
+def tokenize( text ):
+
+    #whole name plus every word in it, all lower case
+    text = str(text)
+    found = set()
+    for part in separatorPattern.split( text ):
+        if not part:
+            continue
+        found.add( part.lower() )
+        for word in wordPattern.findall( part ):
+            found.add( word.lower() )
+    whole = text.lower()
+    if whole:
+        found.add( whole )
+    return found
+
+
+
+def documentKey( doc ):
+
+    return doc[ "project" ]+"/"+doc[ "asset" ]+"/"+doc[ "job" ]+"/"+doc[ "version" ]
+
+
+
+def validDocument( doc ):
+
+    #a log line is only trusted once it has the shape versionDocument gives it
+    if not isinstance( doc, dict ):
+        return False
+    textTypes = ( type(u""), type("") )
+    for field in ( "project", "asset", "job", "version" ):
+        if not isinstance( doc.get( field ), textTypes ):
+            return False
+    if not isinstance( doc.get( "artist", "" ), textTypes ):
+        return False
+    for field in ( "meshes", "textures" ):
+        names = doc.get( field, [] )
+        if not isinstance( names, list ) or not all( isinstance( name, textTypes ) for name in names ):
+            return False
+    return True
+
+
+
+def versionDocument( project, asset, job, version, manifest=None ):
+
+    #what one version is searchable by
+    doc = { "project": project, "asset": asset, "job": job, "version": version, "artist": "", "meshes": [], "textures": [] }
+    if manifest:
+        doc[ "artist" ] = manifest.get( "artist" ) or ""
+        doc[ "finished" ] = manifest.get( "finished" )
+        doc[ "meshes" ] = [ mesh[ "name" ] for mesh in manifest.get( "meshes", [] ) ]
+        doc[ "textures" ] = [ texture[ "file" ] for texture in manifest.get( "textures", [] ) ]
+    return doc
+
+
+
+def appendDocument( rndDir, doc ):
+
+    #one short line per build, later lines win over earlier ones for the same version
+    with open( searchFile( rndDir ), 'a' ) as f:
+        f.write( json.dumps( doc, sort_keys=True ) + "\n" )
+
+
+
+def projectDocuments( rndDir, project ):
+
+    #walk one project and return a document per finished build, nothing is written
+    assetsDir = rndDir+"/CG_Assets"
+    docs = []
+
+    for asset in sorted( os.listdir( assetsDir ) ) if os.path.isdir( assetsDir ) else []:
+        if not os.path.isdir( assetsDir+"/"+asset ):
+            continue
+        for job in sorted( os.listdir( assetsDir+"/"+asset ) ):
+            jobDir = assetsDir+"/"+asset+"/"+job
+            if not os.path.isdir( jobDir ):
+                continue
+            #read only, the job folders belong to the artists and a log line only follows a finished build
+            for version in CGAssetVersions.publishedVersions( jobDir ):
+                manifest = CGAssetManifest.readManifest( jobDir+"/"+version )
+                if manifest is None:
+                    continue
+                docs.append( versionDocument( project, asset, job, version, manifest ) )
+    return docs
+
+
+
+def rebuildProject( rndDir, project ):
+
+    #write this host's log of a project from scratch, only a publish does, reading never writes.
+    #written under a name of its own and renamed into place, readers see all of it or nothing
+    lines = [ json.dumps( doc, sort_keys=True ) + "\n" for doc in projectDocuments( rndDir, project ) ]
+
+    path = searchFile( rndDir )
+    partFile = path+"."+str(os.getpid())+".part"
+    try:
+        with open( partFile, 'w' ) as f:
+            f.writelines( lines )
+        CGAssetCopy.replaceFile( partFile, path )
+    finally:
+        if os.path.exists( partFile ):
+            os.remove( partFile )
+
+    return len(lines)
+
+
+
+
+class SearchIndex():
+
+    #constructor
+    def __init__( self, root ):
+
+        self.root = root
+        self.lock = threading.Lock()
+
+        #document key -> document, token -> document keys
+        self.docs = {}
+        self.postings = {}
+        self.docTokens = {}
+
+        #sorted tokens for prefix lookups, rebuilt after changes
+        self.tokens = []
+        self.tokensDirty = False
+
+        #log file -> ( bytes read, inode when read )
+        self.offsets = {}
+
+        #projects without any log, walked once in memory
+        self.scanned = set()
+
+
+
+    def documentTokens( self, doc ):
+
+        found = set()
+        for field in ( "project", "asset", "job", "version", "artist" ):
+            found |= tokenize( doc.get( field ) or "" )
+        for name in doc.get( "meshes", [] ) + doc.get( "textures", [] ):
+            found |= tokenize( name.split( "|" )[-1] )
+        return found
+
+
+
+    def add( self, doc ):
+
+        key = documentKey( doc )
+        with self.lock:
+            self.removeKey( key )
+            found = self.documentTokens( doc )
+            self.docs[ key ] = doc
+            self.docTokens[ key ] = found
+            for token in found:
+                self.postings.setdefault( token, set() ).add( key )
+            self.tokensDirty = True
+
+
+
+    def removeKey( self, key ):
+
+        #caller holds the lock
+        for token in self.docTokens.pop( key, () ):
+            keys = self.postings.get( token )
+            if keys is None:
+                continue
+            keys.discard( key )
+            if not keys:
+                del self.postings[ token ]
+        self.docs.pop( key, None )
+
+
+
+    def dropProject( self, project ):
+
+        with self.lock:
+            for key in [ key for key, doc in self.docs.items() if doc[ "project" ] == project ]:
+                self.removeKey( key )
+            self.tokensDirty = True
+
+
+
+    def loadLog( self, path, stat ):
+
+        #read whatever was appended to one log since last time, True if anything changed
+        size = stat.st_size
+        offset = self.offsets.get( path, ( 0, stat.st_ino ) )[0]
+        if size == offset:
+            self.offsets[ path ] = ( offset, stat.st_ino )
+            return False
+
+        with open( path, 'rb' ) as f:
+            f.seek( offset )
+            data = f.read( size - offset )
+
+        #a line still being written is picked up next time, a broken one is skipped
+        end = data.rfind( b"\n" ) + 1
+        for line in data[ :end ].splitlines():
+            try:
+                doc = json.loads( line.decode( "utf-8" ) )
+            except ValueError:
+                continue
+            if validDocument( doc ):
+                self.add( doc )
+
+        self.offsets[ path ] = ( offset+end, stat.st_ino )
+        return end > 0
+
+
+
+    def loadProject( self, project ):
+
+        #read every host's log of a project, True if anything changed
+        rndDir = self.root+project+"/09_CG_RnD"
+        logs = []
+        for path in searchFiles( rndDir ):
+            try:
+                logs.append( ( path, os.stat( path ) ) )
+            except OSError:
+                continue
+
+        #a log rewritten by a rebuild may have dropped versions, the project is read again from the start
+        rewritten = False
+        for path, stat in logs:
+            offset, inode = self.offsets.get( path, ( 0, stat.st_ino ) )
+            if stat.st_size < offset or inode != stat.st_ino:
+                rewritten = True
+        if rewritten:
+            self.dropProject( project )
+            for path, stat in logs:
+                self.offsets.pop( path, None )
+
+        changed = rewritten
+        for path, stat in logs:
+            changed = self.loadLog( path, stat ) or changed
+        return changed
+
+
+
+    def refresh( self, projects, scanMissing=True ):
+
+        #pick up new builds in every project, True if the index changed.
+        #a project nobody logged yet is walked once in memory, the next publish there writes its log
+        changed = False
+        for project in projects:
+            rndDir = self.root+project+"/09_CG_RnD"
+            if scanMissing and project not in self.scanned and not searchFiles( rndDir ):
+                self.scanned.add( project )
+                try:
+                    docs = projectDocuments( rndDir, project )
+                except ( IOError, OSError ):
+                    continue
+                for doc in docs:
+                    self.add( doc )
+                changed = changed or bool( docs )
+                continue
+            changed = self.loadProject( project ) or changed
+        return changed
+
+
+
+    def matchPrefix( self, term ):
+
+        #posting sets of every token starting with term, caller holds the lock
+        if self.tokensDirty:
+            self.tokens = sorted( self.postings )
+            self.tokensDirty = False
+
+        postings = []
+        for i in range( bisect.bisect_left( self.tokens, term ), len(self.tokens) ):
+            token = self.tokens[ i ]
+            if not token.startswith( term ):
+                break
+            postings.append( self.postings[ token ] )
+        return postings
+
+
+
+    def search( self, query, limit=maxResults ):
+
+        #documents matching every term of the query, newest version first
+        terms = [ term.lower() for term in separatorPattern.split( query ) if term ]
+        if not terms:
+            return []
+
+        with self.lock:
+            #the rarest term picks the candidates, the others only filter them
+            matches = sorted( ( self.matchPrefix( term ) for term in terms ), key=lambda postings: sum( len(p) for p in postings ) )
+
+            keys = set()
+            for postings in matches[ 0 ]:
+                keys |= postings
+            for postings in matches[ 1: ]:
+                keys = set( key for key in keys if any( key in p for p in postings ) )
+                if not keys:
+                    return []
+            docs = [ self.docs[ key ] for key in keys ]
+
+        return heapq.nsmallest( limit, docs, key=lambda doc: ( doc[ "project" ], doc[ "asset" ], doc[ "job" ], -( CGAssetVersions.parseVersion( doc[ "version" ] ) or 0 ) ) )
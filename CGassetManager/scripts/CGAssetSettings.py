@@ -0,0 +1,102 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Per project settings for the asset manager. Each project can    #
+#   keep a CGAM_settings.json in its 09_CG_RnD folder to switch     #
+#   optional publish features on. Anything not in the file falls    #
+#   back to the defaults below.                                     #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import sys
+import json
+
+
+
+
+#name of the settings file inside <project>/09_CG_RnD
+settingsFileName = "CGAM_settings.json"
+
+#environment variable that moves the per workstation folder
+localDirEnv = "CGAM_LOCAL_DIR"
+
+#root of the project folders on the server, CGAM_SERVER_ROOT points it at a stand in
+serverRoot = os.environ.get( "CGAM_SERVER_ROOT" ) or "//core/ripley/"
+
+
+#defaults for every project
+defaultSettings = {
+
+    #store textures once per project and hardlink them into versions
+    "textureStore": False,
+
+    #"perMesh" writes one OBJ per mesh, "combined" one OBJ with a group per mesh
+    "geoExport": "perMesh",
+
+    #also write a binary .cgmesh next to the OBJs for fast loading
+    "meshCache": False,
+
+    #"maya" uses the OBJexport translator, "python" writes OBJs in a process pool
+    "objWriter": "maya",
+
+    #"direct" saves the scene on the server, "writeBehind" saves locally and uploads in the background
+    "sceneSave": "direct",
+
+    #copy loaded versions to this workstation and open them from there
+    "loadCache": False,
+
+    #"gzip" compresses exports and scene files on their way to the server
+    "compression": "none",
+
+    #divisors of the texture proxies made at publish time, [ 2, 4 ] is half and quarter
+    "textureProxies": [],
+
+    #also make every further halving down to a small mip
+    "textureMips": False
+}
+
+
+
+
+def loadSettings( rndDir ):
+
+    settings = dict( defaultSettings )
+
+    settingsFile = os.path.join( rndDir, settingsFileName )
+    if not os.path.isfile( settingsFile ):
+        return settings
+
+    try:
+        with open( settingsFile, 'r' ) as f:
+            projectSettings = json.load( f )
+    except ( IOError, OSError, ValueError ) as e:
+        sys.stderr.write( "Could not read " + settingsFile + ", using defaults: " + str(e) + "\n" )
+        return settings
+
+    if isinstance( projectSettings, dict ):
+        settings.update( projectSettings )
+
+    return settings
+
+
+
+def localDir( *parts ):
+
+    #folder on this workstation for caches that never go to the server
+    root = os.environ.get( localDirEnv ) or os.path.join( os.path.expanduser( "~" ), ".cgam" )
+    path = os.path.join( root, *parts )
+
+    if not os.path.isdir( path ):
+        try:
+            os.makedirs( path )
+        except OSError:
+            if not os.path.isdir( path ):
+                raise
+
+    return path
@@ -0,0 +1,264 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Content addressed texture store. Each project keeps one copy    #
+#   of every texture under 09_CG_RnD/CG_Store, named by the hash    #
+#   of its contents. Version folders get hardlinks to those files,  #
+#   or a pointer manifest in notes/ where links are not supported.  #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import json
+import stat
+import shutil
+import CGAssetCopy
+import CGAssetManifest
+import CGAssetFingerprint
+
+
+
+
+#store folder inside <project>/09_CG_RnD
+storeFolderName = "CG_Store"
+
+#pointer manifest written into a version's notes folder
+pointerFileName = "texture_store.json"
+
+#store objects and files linked between versions, every link sees the same bytes so none may write them
+readOnlyMode = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+#kBeforeSave callback that gives a linked scene a file of its own
+saveCallbackId = None
+
+
+
+
+def makeLink( src, dst ):
+
+    #hardlink src to dst, False if the filesystem will not do it
+    try:
+        if os.path.exists( dst ):
+            os.remove( dst )
+    except OSError:
+        return False
+
+    if hasattr( os, "link" ):
+        try:
+            os.link( src, dst )
+            return True
+        except OSError:
+            return False
+
+    #python 2 on windows has no os.link
+    if os.name == 'nt':
+        import ctypes
+        try:
+            return bool( ctypes.windll.kernel32.CreateHardLinkW( ctypes.c_wchar_p(dst), ctypes.c_wchar_p(src), None ) )
+        except Exception:
+            return False
+
+    return False
+
+
+
+
+def protect( path ):
+
+    os.chmod( path, readOnlyMode )
+
+
+
+def breakLink( path, others=() ):
+
+    #give a linked file a copy of its own before it is written, the other links keep their bytes.
+    #others are re-protected, windows keeps the read only flag once for all links
+    info = os.stat( path )
+    if info.st_nlink < 2:
+        return False
+
+    partFile = path+".part"
+    try:
+        shutil.copyfile( path, partFile )
+        os.chmod( partFile, stat.S_IMODE( info.st_mode ) | stat.S_IRUSR | stat.S_IWUSR )
+        if os.name == 'nt':
+            os.chmod( path, stat.S_IREAD | stat.S_IWRITE )
+        CGAssetCopy.replaceFile( partFile, path )
+    finally:
+        if os.path.exists( partFile ):
+            os.remove( partFile )
+
+    for other in others:
+        try:
+            protect( other )
+        except OSError:
+            pass
+    return True
+
+
+
+def unshareScene( clientData=None ):
+
+    #a version up saved again before anything changed still has the previous version's scene linked
+    import maya.cmds as cmds
+
+    sceneName = cmds.file( query=True, sceneName=True )
+    if not sceneName or not os.path.isfile( sceneName ):
+        return
+
+    #the scene it was linked from, named by the manifests
+    others = []
+    versionDir = os.path.dirname( os.path.dirname( sceneName ) )
+    manifest = CGAssetManifest.readManifest( versionDir )
+    if manifest is not None and manifest.get( "carriedFrom" ):
+        previousDir = os.path.dirname( versionDir )+"/"+manifest[ "carriedFrom" ]
+        previous = CGAssetManifest.readManifest( previousDir )
+        if previous is not None:
+            others.append( previousDir+"/maya_files/"+previous[ "scene" ][ "file" ] )
+
+    try:
+        breakLink( sceneName, others )
+    except ( IOError, OSError ) as e:
+        cmds.warning( "Could not unlink " + sceneName + " from the previous version, save it under another name: " + str(e) )
+
+
+
+def installSaveCallback():
+
+    global saveCallbackId
+    if saveCallbackId is not None:
+        return
+    import maya.api.OpenMaya as om2
+    saveCallbackId = om2.MSceneMessage.addCallback( om2.MSceneMessage.kBeforeSave, unshareScene )
+
+
+
+
+class StoreResult():
+
+    #constructor
+    def __init__( self ):
+
+        #dst -> digest for every texture now in the version
+        self.digests = {}
+
+        #dst that are hardlinks into the store
+        self.linked = []
+
+        #dst -> store object, where a link could not be made
+        self.pointers = {}
+
+        #list of ( src, dst, error message )
+        self.failed = []
+
+        #bytes that really had to be copied into the store
+        self.newBytes = 0
+
+
+
+
+class TextureStore():
+
+    #constructor
+    def __init__( self, rndDir ):
+
+        self.storeDir = os.path.join( rndDir, storeFolderName ).replace( "\\", "/" )
+        self.objectsDir = self.storeDir + "/objects"
+
+
+
+    def objectPath( self, digest, ext ):
+
+        #two level fan out keeps every folder small on the share
+        return self.objectsDir + "/" + digest[:2] + "/" + digest + ext.lower()
+
+
+
+    def hashSource( self, src ):
+
+        #unchanged sources come straight out of the fingerprint cache
+        return CGAssetFingerprint.fingerprints.digest( src )
+
+
+
+    def publish( self, copyJobs, engine=None, progress=None ):
+
+        #copyJobs is a list of ( src, dst ). new content is copied into
+        #the store once, then every dst is linked to its store object
+        result = StoreResult()
+        engine = engine or CGAssetCopy.CopyEngine()
+
+        objects = {}
+        for src, dst in copyJobs:
+            try:
+                digest = self.hashSource( src )
+            except ( IOError, OSError ) as e:
+                result.failed.append( ( src, dst, str(e) ) )
+                continue
+
+            objects[ dst ] = ( src, digest, self.objectPath( digest, os.path.splitext( src )[1] ) )
+
+        #only content the store has never seen goes over the wire
+        newObjects = {}
+        for dst, ( src, digest, obj ) in objects.items():
+            if not os.path.exists( obj ) and obj not in newObjects:
+                newObjects[ obj ] = src
+
+        for obj in newObjects:
+            objDir = os.path.dirname( obj )
+            if not os.path.isdir( objDir ):
+                try:
+                    os.makedirs( objDir )
+                except OSError:
+                    if not os.path.isdir( objDir ):
+                        raise
+
+        copyResult = engine.copyFiles( [ ( src, obj ) for obj, src in sorted( newObjects.items() ) ], progress=progress )
+        result.newBytes = copyResult.copiedBytes
+
+        badObjects = {}
+        for src, obj, error in copyResult.failed:
+            badObjects[ obj ] = error
+
+        #store objects are shared by every version, keep them read only
+        for src, obj in copyResult.copied:
+            protect( obj )
+
+        for dst, ( src, digest, obj ) in sorted( objects.items() ):
+            if obj in badObjects:
+                result.failed.append( ( src, dst, badObjects[ obj ] ) )
+                continue
+
+            result.digests[ dst ] = digest
+            if makeLink( obj, dst ):
+                result.linked.append( dst )
+                CGAssetFingerprint.fingerprints.remember( dst, digest )
+            else:
+                result.pointers[ dst ] = obj
+
+        return result
+
+
+
+    def writePointers( self, notesDir, result ):
+
+        #small manifest so tools can find the real bytes of every texture
+        pointers = {}
+        for dst, digest in result.digests.items():
+            pointers[ os.path.basename( dst ) ] = {
+                "digest": digest,
+                "object": result.pointers.get( dst, self.objectPath( digest, os.path.splitext( dst )[1] ) ),
+                "linked": dst in result.linked
+            }
+
+        pointerFile = notesDir + "/" + pointerFileName
+        with open( pointerFile + ".part", 'w' ) as f:
+            json.dump( { "store": self.storeDir, "textures": pointers }, f, indent=2, sort_keys=True )
+        CGAssetCopy.replaceFile( pointerFile + ".part", pointerFile )
+
+        return pointerFile
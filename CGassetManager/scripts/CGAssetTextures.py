@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Texture dependencies of a scene. Every file node is read once,  #
+#   <UDIM>, <f> and the other tile and frame tokens are expanded    #
+#   against one listing per folder, and every file on disk comes    #
+#   back once with its size, so copies can be weighed in bytes.     #
+#                                                                   #
+#   Only resolveTextures needs Maya, the expansion does not.        #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import re
+import collections
+
+
+
+
+#file name tokens maya expands, with what they stand for on disk
+tokenPatterns = [
+    ( "<UDIM>", r"\d{4}" ),
+    ( "<udim>", r"\d{4}" ),
+    ( "<u>", r"\d+" ),
+    ( "<v>", r"\d+" ),
+    ( "<U>", r"\d+" ),
+    ( "<V>", r"\d+" ),
+    ( "<tile>", r"_u\d+_v\d+" ),
+    ( "<f>", r"\d+" )
+]
+
+#one token or a run of frame padding hashes
+tokenSplit = re.compile( "(" + "|".join( re.escape( token ) for token, regex in tokenPatterns ) + r"|#+)" )
+
+
+
+
+def hasTokens( path ):
+
+    return bool( path ) and tokenSplit.search( os.path.basename( path ) ) is not None
+
+
+
+def patternRegex( fileName ):
+
+    #regex for the names a tokenized file name stands for
+    parts = []
+    tokens = dict( tokenPatterns )
+    for part in tokenSplit.split( fileName ):
+        if part in tokens:
+            parts.append( tokens[ part ] )
+        elif part.startswith( "#" ):
+            parts.append( r"\d{" + str(len(part)) + ",}" )
+        else:
+            parts.append( re.escape( part ) )
+    return re.compile( "^" + "".join( parts ) + "$", re.IGNORECASE if os.name == 'nt' else 0 )
+
+
+
+def listDir( directory, listings ):
+
+    #file name -> size for one folder, listed once per resolve
+    if directory in listings:
+        return listings[ directory ]
+
+    entries = {}
+    try:
+        if hasattr( os, "scandir" ):
+            #sizes come with the listing on windows, no extra round trip per tile
+            for entry in os.scandir( directory ):
+                if entry.is_file():
+                    entries[ entry.name ] = entry.stat().st_size
+        else:
+            for name in os.listdir( directory ):
+                path = os.path.join( directory, name )
+                if os.path.isfile( path ):
+                    entries[ name ] = os.path.getsize( path )
+    except OSError:
+        pass
+
+    listings[ directory ] = entries
+    return entries
+
+
+
+def expandPattern( path, listings ):
+
+    #( path, size ) of every file a tokenized path stands for, sorted by name
+    directory, fileName = os.path.split( path )
+    regex = patternRegex( fileName )
+    entries = listDir( directory, listings )
+    return [ ( directory+"/"+name, entries[ name ] ) for name in sorted( entries ) if regex.match( name ) ]
+
+
+
+
+class TextureSet():
+
+    #constructor
+    def __init__( self ):
+
+        #source path -> size in bytes, every file once, found by normalized path
+        self.files = collections.OrderedDict()
+        self.fileKeys = {}
+
+        #file node -> source paths it reads, and the tokenized path of tiled or sequence nodes
+        self.nodes = collections.OrderedDict()
+        self.patterns = {}
+
+        #( node, path ) that matched nothing on disk
+        self.missing = []
+
+
+
+    def add( self, node, path, size ):
+
+        #nodes sharing a file share one entry
+        key = os.path.normcase( os.path.normpath( path ) )
+        if key not in self.fileKeys:
+            self.files[ path ] = size
+            self.fileKeys[ key ] = path
+        self.nodes[ node ].append( self.fileKeys[ key ] )
+
+
+
+    def totalBytes( self ):
+
+        return sum( self.files.values() )
+
+
+
+    def copyJobs( self, textureDir ):
+
+        #destination -> source, the last texture with a name wins
+        jobs = {}
+        for path in self.files:
+            jobs[ textureDir+"/"+os.path.basename( path ) ] = path
+        return jobs
+
+
+
+
+def nodePath( node ):
+
+    import maya.cmds as cmds
+
+    #the tokenized name of tiled and sequence nodes, the plain file name of the rest
+    path = cmds.getAttr( node+".fileTextureName" ) or ""
+    try:
+        pattern = cmds.getAttr( node+".computedFileTextureNamePattern" ) or ""
+    except ValueError:
+        pattern = ""
+    if hasTokens( pattern ):
+        path = pattern
+
+    if path and not os.path.isabs( path ):
+        path = cmds.workspace( expandName=path )
+    return path.replace( "\\", "/" )
+
+
+
+def resolveTextures( nodes=None ):
+
+    #every file the file nodes read, tiles and frames included
+    import maya.cmds as cmds
+
+    if nodes is None:
+        nodes = cmds.ls( type='file' ) or []
+
+    textures = TextureSet()
+    listings = {}
+
+    for node in nodes:
+        textures.nodes[ node ] = []
+        path = nodePath( node )
+        if not path:
+            continue
+
+        if hasTokens( path ):
+            textures.patterns[ node ] = path
+            found = expandPattern( path, listings )
+        else:
+            try:
+                found = [ ( path, os.path.getsize( path ) ) ]
+            except OSError:
+                found = []
+
+        if not found:
+            textures.missing.append( ( node, path ) )
+        for filePath, size in found:
+            textures.add( node, filePath, size )
+
+    return textures
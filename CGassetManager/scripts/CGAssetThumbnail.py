@@ -0,0 +1,209 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Version thumbnails. A small viewport grab is saved into notes/  #
+#   at publish time, and the window shows it from a size bounded    #
+#   least recently used cache on this workstation, filled by one    #
+#   background thread so the UI never waits on the server.          #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import shutil
+import hashlib
+import threading
+import collections
+import CGAssetCopy
+import CGAssetSettings
+
+
+
+
+#thumbnail inside every version's notes folder
+thumbnailFileName = "thumbnail.jpg"
+
+#pixels, the size the window shows it at
+thumbnailSize = ( 160, 90 )
+
+#bytes of thumbnails kept on this workstation
+cacheBytes = 64*1024*1024
+
+
+
+
+def thumbnailPath( versionDir ):
+
+    return versionDir+"/notes/"+thumbnailFileName
+
+
+
+def captureThumbnail( path, size=thumbnailSize ):
+
+    #grab the current frame of the active viewport, None without one
+    import maya.cmds as cmds
+
+    if cmds.about( batch=True ):
+        return None
+
+    frame = cmds.currentTime( query=True )
+    try:
+        cmds.playblast( frame=[ frame ], format="image", compression="jpg", completeFilename=path, widthHeight=size, percent=100, quality=80, viewer=False, showOrnaments=False, offScreen=True, forceOverwrite=True )
+    except RuntimeError as e:
+        cmds.warning( "Could not capture a thumbnail: " + str(e) )
+        return None
+
+    return path if os.path.isfile( path ) else None
+
+
+
+
+class ThumbnailCache():
+
+    #constructor
+    def __init__( self, cacheDir=None, maxBytes=cacheBytes ):
+
+        self.cacheDir = cacheDir or CGAssetSettings.localDir( "thumbnails" )
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+
+        #cache file name -> size, least recently used first
+        self.entries = collections.OrderedDict()
+        self.totalBytes = 0
+
+        #files left by earlier sessions, oldest first
+        existing = []
+        for name in os.listdir( self.cacheDir ):
+            if name.endswith( ".part" ):
+                continue
+            stat = os.stat( os.path.join( self.cacheDir, name ) )
+            existing.append( ( stat.st_mtime, name, stat.st_size ) )
+        for mtime, name, size in sorted( existing ):
+            self.entries[ name ] = size
+            self.totalBytes += size
+        self.evict()
+
+
+
+    def cacheName( self, versionDir ):
+
+        return hashlib.sha1( versionDir.encode( "utf-8" ) ).hexdigest() + os.path.splitext( thumbnailFileName )[1]
+
+
+
+    def get( self, versionDir ):
+
+        #local copy if it is cached, nothing touches the server
+        name = self.cacheName( versionDir )
+        with self.lock:
+            size = self.entries.pop( name, None )
+            if size is None:
+                return None
+            self.entries[ name ] = size
+
+        #the mtime is the use order the next session starts from
+        path = os.path.join( self.cacheDir, name )
+        try:
+            os.utime( path, None )
+        except OSError:
+            pass
+        return path
+
+
+
+    def fetch( self, versionDir ):
+
+        #copy the thumbnail from the server into the cache, None if the version has none
+        cached = self.get( versionDir )
+        if cached is not None:
+            return cached
+
+        source = thumbnailPath( versionDir )
+        if not os.path.isfile( source ):
+            return None
+
+        name = self.cacheName( versionDir )
+        path = os.path.join( self.cacheDir, name )
+        partFile = path+"."+str(threading.current_thread().ident)+".part"
+        try:
+            shutil.copyfile( source, partFile )
+            CGAssetCopy.replaceFile( partFile, path )
+        finally:
+            if os.path.exists( partFile ):
+                os.remove( partFile )
+
+        with self.lock:
+            self.totalBytes -= self.entries.pop( name, 0 )
+            self.entries[ name ] = os.path.getsize( path )
+            self.totalBytes += self.entries[ name ]
+        self.evict()
+
+        return path
+
+
+
+    def evict( self ):
+
+        #drop least recently used thumbnails until the cache fits
+        removed = []
+        with self.lock:
+            while self.totalBytes > self.maxBytes and len(self.entries) > 1:
+                name, size = self.entries.popitem( last=False )
+                self.totalBytes -= size
+                removed.append( name )
+
+        for name in removed:
+            try:
+                os.remove( os.path.join( self.cacheDir, name ) )
+            except OSError:
+                pass
+
+
+
+
+class ThumbnailLoader():
+
+    #one background thread, only the newest request is worth loading
+    def __init__( self, cache=None ):
+
+        self.cache = cache or ThumbnailCache()
+        self.pending = None
+        self.wake = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+
+
+    def request( self, versionDir, callback ):
+
+        #callback( versionDir, path ) runs on the loader thread, path is None without a thumbnail
+        with self.lock:
+            self.pending = ( versionDir, callback )
+            if self.thread is None:
+                self.thread = threading.Thread( target=self.work )
+                self.thread.daemon = True
+                self.thread.start()
+        self.wake.set()
+
+
+
+    def work( self ):
+
+        while True:
+            self.wake.wait()
+            with self.lock:
+                self.wake.clear()
+                pending, self.pending = self.pending, None
+            if pending is None:
+                continue
+
+            versionDir, callback = pending
+            try:
+                path = self.cache.fetch( versionDir )
+            except ( IOError, OSError ):
+                path = None
+            callback( versionDir, path )
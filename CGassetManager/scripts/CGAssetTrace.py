@@ -0,0 +1,228 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Timing spans of a BUILD or LOAD, written as a Chrome trace      #
+#   (chrome://tracing, ui.perfetto.dev) into the version's notes.   #
+#   Stages, progress steps and every mesh and texture get a span.   #
+#                                                                   #
+#   CGAM_TRACE=0 turns it off, spans are then one shared no-op.     #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import sys
+import json
+import time
+import socket
+import datetime
+import threading
+import CGAssetSettings
+
+
+
+
+#environment variable, 0 turns tracing off
+traceEnv = "CGAM_TRACE"
+
+#trace files start with this, followed by the kind of trace and the time
+traceFilePrefix = "trace_"
+
+
+
+
+def enabled():
+
+    return os.environ.get( traceEnv, "1" ).strip().lower() not in ( "0", "off", "false", "no" )
+
+
+
+
+class Span():
+
+    #constructor
+    def __init__( self, trace, name, cat, args ):
+
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = time.time()
+        self.closed = False
+
+
+
+    def set( self, **args ):
+
+        #arguments only known once the work is done, bytes written and such
+        self.args.update( args )
+
+
+
+    def close( self ):
+
+        if self.closed:
+            return
+        self.closed = True
+        self.trace.record( self.name, self.cat, self.start, time.time(), self.args )
+
+
+
+    def __enter__( self ):
+
+        return self
+
+
+
+    def __exit__( self, excType, excValue, tb ):
+
+        if excType is not None:
+            self.args[ "error" ] = str(excValue)
+        self.close()
+        return False
+
+
+
+
+class NullSpan():
+
+    #what every span is while nothing is traced
+
+    def set( self, **args ):
+
+        pass
+
+
+
+    def close( self ):
+
+        pass
+
+
+
+    def __enter__( self ):
+
+        return self
+
+
+
+    def __exit__( self, excType, excValue, tb ):
+
+        return False
+
+
+
+
+class Trace():
+
+    #constructor
+    def __init__( self, kind ):
+
+        self.kind = kind
+        self.started = time.time()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.events = []
+
+        #( pid, tid ) already named in the trace
+        self.named = set()
+
+
+
+    def record( self, name, cat, start, end, args=None, pid=None, tid=None, threadName=None ):
+
+        #one complete event, times in seconds since the epoch so worker processes line up
+        if tid is None:
+            thread = threading.current_thread()
+            tid = thread.ident
+            threadName = thread.name
+        pid = pid or self.pid
+
+        event = { "name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                  "ts": int( ( start - self.started )*1000000 ), "dur": max( 0, int( ( end - start )*1000000 ) ) }
+        if args:
+            event[ "args" ] = args
+
+        with self.lock:
+            if ( pid, tid ) not in self.named:
+                self.named.add( ( pid, tid ) )
+                self.events.append( { "name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": { "name": threadName or "worker " + str(pid) } } )
+            self.events.append( event )
+
+
+
+    def write( self, path ):
+
+        with self.lock:
+            events = list( self.events )
+        data = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": { "kind": self.kind, "host": socket.gethostname(), "started": datetime.datetime.fromtimestamp( self.started ).isoformat() }
+        }
+
+        #the name is new every time, nothing to replace
+        with open( path+".part", 'w' ) as f:
+            json.dump( data, f )
+        os.rename( path+".part", path )
+        return path
+
+
+
+
+#trace of the BUILD or LOAD running now, None when nothing is traced
+current = None
+nullSpan = NullSpan()
+
+
+
+
+def begin( kind ):
+
+    #start tracing, None when tracing is off or a trace is already running.
+    #whoever got the trace hands it to finish, nested calls get None and add to the outer one
+    global current
+    if current is not None or not enabled():
+        return None
+    current = Trace( kind )
+    return current
+
+
+
+def finish( trace, notesDir=None ):
+
+    #write the trace into notesDir, or ~/.cgam/traces when the version never made it
+    global current
+    if trace is None:
+        return None
+    if current is trace:
+        current = None
+
+    fileName = traceFilePrefix + trace.kind + "_" + datetime.datetime.fromtimestamp( trace.started ).strftime( "%Y%m%d_%H%M%S" ) + "_" + socket.gethostname() + ".json"
+    traceDir = notesDir if notesDir and os.path.isdir( notesDir ) else CGAssetSettings.localDir( "traces" )
+    try:
+        return trace.write( os.path.join( traceDir, fileName ) )
+    except ( IOError, OSError ) as e:
+        sys.stderr.write( "Could not write the trace " + fileName + ": " + str(e) + "\n" )
+        return None
+
+
+
+def span( name, cat="step", **args ):
+
+    #with span( "name" ) as s: ... s.set( bytes=n ), a no-op while nothing is traced
+    trace = current
+    if trace is None:
+        return nullSpan
+    return Span( trace, name, cat, args )
+
+
+
+def record( name, cat, start, end, args=None, pid=None, tid=None ):
+
+    #a span timed somewhere else, a worker process for example
+    trace = current
+    if trace is not None:
+        trace.record( name, cat, start, end, args, pid=pid, tid=tid )
@@ -0,0 +1,450 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Write-behind scene upload. The scene is saved to a local        #
+#   scratch folder and streamed to the server by a background       #
+#   thread, checked against its hash and retried on failure. A      #
+#   marker in the version's notes folder says it is uploading.      #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#-------------------------------------------------------------------#
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import datetime
+import threading
+import CGAssetCopy
+import CGAssetSettings
+import CGAssetManifest
+import CGAssetCompress
+import CGAssetFingerprint
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+
+
+#marker inside the version's notes folder while the scene is on its way
+markerFileName = "uploading.json"
+
+#description of a pending upload, next to the local scene file
+jobFileName = "upload.json"
+
+#tries per upload before it is left for the next session
+maxAttempts = 5
+
+#seconds before the first retry, doubled after every failure
+retryDelay = 10.0
+
+#seconds between touches of a job file, so other sessions leave it alone
+heartbeatInterval = 30.0
+
+#a job file untouched for this long belongs to a session that is gone
+staleAfter = 4*heartbeatInterval
+
+
+
+
+def markerPath( versionDir ):
+
+    return versionDir+"/notes/"+markerFileName
+
+
+
+def isUploading( versionDir ):
+
+    return os.path.exists( markerPath( versionDir ) )
+
+
+
+def readMarker( versionDir ):
+
+    try:
+        with open( markerPath( versionDir ), 'r' ) as f:
+            return json.load( f )
+    except ( IOError, OSError, ValueError ):
+        return None
+
+
+
+def fileMtime( path ):
+
+    #None when the file is not there
+    try:
+        return os.path.getmtime( path )
+    except OSError:
+        return None
+
+
+
+def samePath( a, b ):
+
+    return os.path.normcase( os.path.normpath( a ) ) == os.path.normcase( os.path.normpath( b ) )
+
+
+
+
+class SupersededError( IOError ):
+
+    #the destination was written by someone else after the upload started, theirs is newer
+    pass
+
+
+
+
+def uploadRoot():
+
+    return CGAssetSettings.localDir( "uploads" )
+
+
+
+def stagingFile( fileName ):
+
+    #fresh local folder for one scene, the file keeps its server name
+    jobDir = os.path.join( uploadRoot(), datetime.datetime.now().strftime( "%Y%m%d_%H%M%S_" ) + uuid.uuid4().hex[:8] )
+    os.makedirs( jobDir )
+    return os.path.join( jobDir, fileName )
+
+
+
+def writeJson( path, data ):
+
+    partFile = path+".part"
+    with open( partFile, 'w' ) as f:
+        json.dump( data, f, indent=1, sort_keys=True )
+    CGAssetCopy.replaceFile( partFile, path )
+
+
+
+def uploadFile( src, dst, heartbeat=None, compress=False, guard=False, dstMtime=None ):
+
+    #stream src to dst, read back what landed and only then put it in place.
+    #with guard a dst that changed from dstMtime is newer than src and is never replaced
+    partFile = dst+".part"
+    try:
+        digest, size = CGAssetCompress.streamFile( src, dst, compress=compress, heartbeat=heartbeat )
+        uploaded = CGAssetFingerprint.hashFile( partFile )
+        if uploaded != digest:
+            raise IOError( "checksum mismatch after upload, " + uploaded + " instead of " + digest )
+
+        if guard and fileMtime( dst ) != dstMtime:
+            raise SupersededError( dst + " was saved while it was uploading, the saved file is kept" )
+        CGAssetCopy.replaceFile( partFile, dst )
+    finally:
+        if os.path.exists( partFile ):
+            try:
+                os.remove( partFile )
+            except OSError:
+                pass
+
+    CGAssetFingerprint.fingerprints.remember( dst, digest )
+    return digest
+
+
+
+
+class UploadJob():
+
+    #constructor
+    def __init__( self, localFile, dst, versionDir, compress=False, dstMtime=None ):
+
+        self.localFile = localFile
+        self.dst = dst
+        self.versionDir = versionDir
+        self.compress = compress
+
+        #what dst looked like when the job was made, None if it was not there
+        self.dstMtime = dstMtime
+        self.attempts = 0
+        self.error = None
+        self.digest = None
+
+        #held while the manifest scene entry is written, by the publish or the upload
+        self.lock = threading.Lock()
+        self.done = False
+
+
+
+    def sceneEntry( self ):
+
+        #manifest entry for the scene, final once the upload is done
+        with self.lock:
+            if self.done:
+                return CGAssetManifest.fileEntry( self.dst, self.digest )
+            return CGAssetManifest.fileEntry( self.dst, None, size=os.path.getsize( self.localFile ), uploading=True )
+
+
+
+    def finish( self ):
+
+        #the upload is confirmed, a manifest written before that gets the real size and hash
+        with self.lock:
+            self.done = True
+            manifest = CGAssetManifest.readManifest( self.versionDir )
+            if manifest is not None:
+                manifest[ "scene" ] = CGAssetManifest.fileEntry( self.dst, self.digest )
+                CGAssetManifest.writeManifest( self.versionDir, manifest )
+
+
+
+    def jobName( self ):
+
+        #scratch folder of the job, unique per save
+        return os.path.basename( os.path.dirname( self.localFile ) )
+
+
+
+    def writeMarker( self, markerDir=None ):
+
+        #markerDir is the staging folder when the version is not published yet
+        writeJson( markerPath( markerDir or self.versionDir ), { "file": os.path.basename( self.dst ), "job": self.jobName(), "host": socket.gethostname(), "started": datetime.datetime.now().isoformat() } )
+
+
+
+    def jobFile( self ):
+
+        return os.path.join( os.path.dirname( self.localFile ), jobFileName )
+
+
+
+    def save( self ):
+
+        writeJson( self.jobFile(), { "localFile": self.localFile, "dst": self.dst, "versionDir": self.versionDir, "compress": self.compress, "dstMtime": self.dstMtime, "attempts": self.attempts, "error": self.error } )
+
+
+
+    @classmethod
+    def load( cls, jobFile ):
+
+        with open( jobFile, 'r' ) as f:
+            data = json.load( f )
+        job = cls( data[ "localFile" ], data[ "dst" ], data[ "versionDir" ], compress=data.get( "compress", False ), dstMtime=data.get( "dstMtime" ) )
+        job.attempts = data.get( "attempts", 0 )
+        job.error = data.get( "error" )
+        return job
+
+
+
+
+class Uploader():
+
+    #constructor
+    def __init__( self ):
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.listeners = []
+
+        #job file -> job, everything this session is responsible for
+        self.owned = {}
+        self.lastHeartbeat = 0.0
+
+        #maya callback that holds back saves over a scene still uploading
+        self.saveCheckId = None
+
+
+
+    def addListener( self, callback ):
+
+        #callback( job ) runs on the upload thread once a job is done or has given up
+        if callback not in self.listeners:
+            self.listeners.append( callback )
+
+
+
+    def removeListener( self, callback ):
+
+        if callback in self.listeners:
+            self.listeners.remove( callback )
+
+
+
+    def start( self ):
+
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread( target=self.work )
+                self.thread.daemon = True
+                self.thread.start()
+
+
+
+    def submit( self, localFile, dst, versionDir, compress=False ):
+
+        #the version shows as uploading from here on
+        job = UploadJob( localFile, dst, versionDir, compress=compress, dstMtime=fileMtime( dst ) )
+        job.save()
+        job.writeMarker()
+        return self.enqueue( job )
+
+
+
+    def enqueue( self, job ):
+
+        #a saved job whose version folder is in place, the marker is already written
+        with self.lock:
+            self.owned[ job.jobFile() ] = job
+        self.queue.put( job )
+        self.start()
+        return job
+
+
+
+    def resume( self ):
+
+        #uploads a closed or crashed session did not finish, returns how many were picked up
+        resumed = 0
+        root = uploadRoot()
+        for name in sorted( os.listdir( root ) ):
+            jobFile = os.path.join( root, name, jobFileName )
+            with self.lock:
+                if jobFile in self.owned:
+                    continue
+            try:
+                if time.time() - os.path.getmtime( jobFile ) < staleAfter:
+                    continue
+                job = UploadJob.load( jobFile )
+            except ( IOError, OSError, ValueError, KeyError ):
+                continue
+
+            #no marker while the version is still in staging, another job's marker after a rebuild
+            marker = readMarker( job.versionDir )
+            if marker is None or marker.get( "job", job.jobName() ) != job.jobName():
+                continue
+
+            job.attempts = 0
+            job.save()
+            with self.lock:
+                self.owned[ jobFile ] = job
+            self.queue.put( job )
+            resumed += 1
+
+        if resumed:
+            self.start()
+        return resumed
+
+
+
+    def pending( self ):
+
+        with self.lock:
+            return list( self.owned.values() )
+
+
+
+    def installSaveCheck( self ):
+
+        #a save over a scene that is still uploading would be replaced by the older upload
+        if self.saveCheckId is not None:
+            return
+        import maya.api.OpenMaya as om2
+        self.saveCheckId = om2.MSceneMessage.addCheckCallback( om2.MSceneMessage.kBeforeSaveCheck, self.saveCheck )
+
+
+
+    def saveCheck( self, clientData=None ):
+
+        import maya.cmds as cmds
+
+        sceneName = cmds.file( query=True, sceneName=True )
+        for job in self.pending():
+            if sceneName and samePath( job.dst, sceneName ) and not job.done:
+                cmds.warning( "The scene is still uploading to " + job.dst + ", save it under another name or wait until it is done." )
+                return False
+        return True
+
+
+
+    def heartbeat( self, force=False ):
+
+        #touch every job file this session owns
+        now = time.time()
+        if not force and now - self.lastHeartbeat < heartbeatInterval:
+            return
+        self.lastHeartbeat = now
+        for jobFile in list( self.owned ):
+            try:
+                os.utime( jobFile, None )
+            except OSError:
+                pass
+
+
+
+    def work( self ):
+
+        while True:
+            job = self.queue.get()
+            self.heartbeat( force=True )
+
+            try:
+                job.digest = uploadFile( job.localFile, job.dst, heartbeat=self.heartbeat, compress=job.compress, guard=True, dstMtime=job.dstMtime )
+            except SupersededError as e:
+                #the newer file on the server stays, the manifest describes it instead
+                sys.stderr.write( str(e) + "\n" )
+                try:
+                    job.digest = CGAssetFingerprint.hashFile( job.dst )
+                except ( IOError, OSError ):
+                    job.digest = None
+            except Exception as e:
+                job.attempts += 1
+                job.error = str(e)
+                job.save()
+
+                if job.attempts < maxAttempts:
+                    sys.stderr.write( "Upload of " + job.dst + " failed, retrying: " + job.error + "\n" )
+                    retry = threading.Timer( retryDelay * 2**( job.attempts-1 ), self.queue.put, args=( job, ) )
+                    retry.daemon = True
+                    retry.start()
+                    continue
+
+                #left on disk, the next session picks it up again
+                sys.stderr.write( "Giving up on uploading " + job.dst + ", the scene stays in " + job.localFile + ": " + job.error + "\n" )
+                with self.lock:
+                    self.owned.pop( job.jobFile(), None )
+                self.notify( job )
+                continue
+
+            job.error = None
+            try:
+                job.finish()
+            except ( IOError, OSError, ValueError ) as e:
+                sys.stderr.write( "Could not update the manifest of " + job.versionDir + ": " + str(e) + "\n" )
+
+            try:
+                os.remove( markerPath( job.versionDir ) )
+            except OSError:
+                pass
+            shutil.rmtree( os.path.dirname( job.localFile ), ignore_errors=True )
+
+            with self.lock:
+                self.owned.pop( job.jobFile(), None )
+            self.notify( job )
+
+
+
+    def notify( self, job ):
+
+        for callback in list( self.listeners ):
+            try:
+                callback( job )
+            except Exception as e:
+                sys.stderr.write( "Upload listener failed: " + str(e) + "\n" )
+
+
+
+
+#one upload thread per maya session
+uploader = Uploader()
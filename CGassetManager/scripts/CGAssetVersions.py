@@ -0,0 +1,424 @@
+#-------------------------------------------------------------------#
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#                                                                   #
+#   Version numbers of a job. The next vNNN is reserved with an     #
+#   exclusive mkdir, and a small counter file in the job folder     #
+#   remembers where to start, so allocating v500 costs the same     #
+#   as allocating v005 and two artists never get the same number.   #
+#   The sorted list of versions and the latest built one are kept   #
+#   in two more small files, so the window never has to scan. A     #
+#   version is reserved and built in a hidden staging folder of     #
+#   the job and only renamed into place once its build is done.     #
+#   An owner file next to it says which session may build it.       #
+#-------------------------------------------------------------------#
+
+import os
+import re
+import json
+import time
+import uuid
+import errno
+import socket
+import getpass
+import datetime
+import CGAssetCopy
+
+
+
+
+#counter file inside every job folder
+counterFileName = ".cgam_version"
+
+#sorted version list and latest build pointer inside every job folder
+indexFileName = ".cgam_versions.json"
+latestFileName = ".cgam_latest"
+
+#reserved and half built versions, on the same volume as the job so publishing is one rename
+stagingDirName = ".cgam_staging"
+
+#vNNN, at least three digits
+versionPattern = re.compile( r"^v(\d{3,})$" )
+
+#numbers tried before giving up, only stray folders can use these up
+maxAttempts = 1000
+
+#owner of a staged version, .cgam_staging/vNNN.owner
+ownerExt = ".owner"
+
+#environment variable with the id of this session, batch workers inherit their parent's
+sessionEnv = "CGAM_SESSION"
+
+#seconds after which a reservation is taken to belong to a session that is gone
+staleReservation = 24*60*60
+
+
+
+
+class ReservedError( OSError ):
+
+    #the version is reserved and being built by another session
+    pass
+
+
+
+
+def versionName( number ):
+
+    paddedNumber = '%03d' % number
+    return "v"+str(paddedNumber)
+
+
+
+def parseVersion( name ):
+
+    #number of a vNNN folder, None for anything else
+    match = versionPattern.match( name )
+    if match is None:
+        return None
+    return int( match.group( 1 ) )
+
+
+
+def sortVersions( names ):
+
+    #vNNN names in number order, anything else dropped
+    numbered = [ ( parseVersion( name ), name ) for name in names ]
+    return [ name for number, name in sorted( n for n in numbered if n[0] is not None ) ]
+
+
+
+def readText( path ):
+
+    try:
+        with open( path, 'r' ) as f:
+            return f.read().strip()
+    except ( IOError, OSError ):
+        return None
+
+
+
+def writeText( path, text ):
+
+    #written next to the target and renamed over it, readers never see half a file
+    partFile = path+"."+uuid.uuid4().hex+".part"
+    try:
+        with open( partFile, 'w' ) as f:
+            f.write( text )
+        CGAssetCopy.replaceFile( partFile, path )
+    except ( IOError, OSError ):
+        #these files are only hints, the version folders are the truth
+        if os.path.exists( partFile ):
+            try:
+                os.remove( partFile )
+            except OSError:
+                pass
+        return False
+    return True
+
+
+
+def readCounter( jobDir ):
+
+    text = readText( jobDir+"/"+counterFileName )
+    if text is None:
+        return None
+    try:
+        return int( text or 0 )
+    except ValueError:
+        return None
+
+
+
+def writeCounter( jobDir, number ):
+
+    #never move the counter backwards, another session may be ahead
+    current = readCounter( jobDir )
+    if current is not None and current >= number:
+        return
+
+    #the counter is only a hint, mkdir is what reserves a number
+    writeText( jobDir+"/"+counterFileName, str(number) )
+
+
+
+def stagingPath( versionDir ):
+
+    #where a version lives until it is published
+    jobDir, version = os.path.split( versionDir.rstrip( "/" ) )
+    return jobDir+"/"+stagingDirName+"/"+version
+
+
+
+def isStaged( versionDir ):
+
+    return os.path.isdir( stagingPath( versionDir ) )
+
+
+
+def workDir( versionDir ):
+
+    #folder a build writes into, versions reserved before staging are built in place
+    staged = stagingPath( versionDir )
+    return staged if os.path.isdir( staged ) else versionDir.rstrip( "/" )
+
+
+
+def sessionId():
+
+    #made once per session and put in the environment, so worker processes share it
+    if not os.environ.get( sessionEnv ):
+        os.environ[ sessionEnv ] = uuid.uuid4().hex
+    return os.environ[ sessionEnv ]
+
+
+
+def processAlive( pid ):
+
+    #whether a process of this host is still running, True when it cannot be told
+    if os.name == 'nt':
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess( 0x1000, False, int(pid) )
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle( handle )
+        return True
+    try:
+        os.kill( int(pid), 0 )
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+
+def ownerPath( versionDir ):
+
+    return stagingPath( versionDir )+ownerExt
+
+
+
+def readOwner( versionDir ):
+
+    try:
+        with open( ownerPath( versionDir ), 'r' ) as f:
+            return json.load( f )
+    except ( IOError, OSError, ValueError ):
+        return None
+
+
+
+def writeOwner( versionDir ):
+
+    owner = { "session": sessionId(), "host": socket.gethostname(), "pid": os.getpid(), "user": getpass.getuser(), "started": datetime.datetime.now().isoformat() }
+    writeText( ownerPath( versionDir ), json.dumps( owner, sort_keys=True ) )
+    return owner
+
+
+
+def reservationHolder( versionDir ):
+
+    #owner of a staged version when that is another session still around, else None
+    owner = readOwner( versionDir )
+    if owner is not None and owner.get( "session" ) == sessionId():
+        return None
+
+    #reserved before owners were written, only its age tells
+    marker = ownerPath( versionDir ) if owner is not None else stagingPath( versionDir )
+    try:
+        age = time.time() - os.path.getmtime( marker )
+    except OSError:
+        return None
+    if age > staleReservation:
+        return None
+    if owner is None:
+        return { "user": "an unknown artist", "host": "an unknown host" }
+
+    if owner.get( "host" ) == socket.gethostname() and not processAlive( owner.get( "pid", 0 ) ):
+        return None
+    return owner
+
+
+
+def claimVersion( versionDir ):
+
+    #make this session the owner of a staged version before building it
+    if not isStaged( versionDir ):
+        return
+    holder = reservationHolder( versionDir )
+    if holder is not None:
+        raise ReservedError( os.path.basename( versionDir.rstrip( "/" ) ) + " is being built by " + holder.get( "user", "?" ) + " on " + holder.get( "host", "?" ) + "." )
+    writeOwner( versionDir )
+
+
+
+def stagedVersions( jobDir ):
+
+    stagingRoot = jobDir+"/"+stagingDirName
+    return sortVersions( os.listdir( stagingRoot ) if os.path.isdir( stagingRoot ) else [] )
+
+
+
+def publishedVersions( jobDir ):
+
+    #version folders in place in the job, reads only and leaves staged builds out
+    names = os.listdir( jobDir ) if os.path.isdir( jobDir ) else []
+    return sortVersions( name for name in names if os.path.isdir( jobDir+"/"+name ) )
+
+
+
+def scanVersions( jobDir ):
+
+    #the one full listing, for jobs without an index or with a stale one
+    return sortVersions( set( publishedVersions( jobDir ) ) | set( stagedVersions( jobDir ) ) )
+
+
+
+def readIndex( jobDir ):
+
+    text = readText( jobDir+"/"+indexFileName )
+    if text is None:
+        return None
+    try:
+        return sortVersions( json.loads( text ).get( "versions", [] ) )
+    except ( ValueError, AttributeError ):
+        return None
+
+
+
+def writeIndex( jobDir, versions ):
+
+    return writeText( jobDir+"/"+indexFileName, json.dumps( { "versions": sortVersions( versions ) } ) )
+
+
+
+def listVersions( jobDir ):
+
+    #sorted version names from the index, rebuilt when missing or behind the counter
+    versions = readIndex( jobDir )
+    if versions is not None:
+        newest = parseVersion( versions[-1] ) if versions else 0
+        if ( readCounter( jobDir ) or 0 ) <= newest:
+            return versions
+
+    versions = scanVersions( jobDir )
+    writeIndex( jobDir, versions )
+    return versions
+
+
+
+def addToIndex( jobDir, version ):
+
+    versions = readIndex( jobDir )
+    if versions is None:
+        versions = scanVersions( jobDir )
+    if version not in versions:
+        versions.append( version )
+    writeIndex( jobDir, versions )
+
+
+
+def readLatest( jobDir ):
+
+    #last built version, None before the first build
+    name = readText( jobDir+"/"+latestFileName )
+    if name is None or parseVersion( name ) is None:
+        return None
+    return name
+
+
+
+def writeLatest( jobDir, version ):
+
+    #point at the newest build, a rebuild of an old version does not move it back
+    current = readLatest( jobDir )
+    if current is not None and parseVersion( current ) > parseVersion( version ):
+        return
+    writeText( jobDir+"/"+latestFileName, version )
+
+
+
+def latestVersion( jobDir, versions=None ):
+
+    #version the window selects first, the latest build or else the highest number not being built elsewhere
+    latest = readLatest( jobDir )
+    if versions is None:
+        versions = listVersions( jobDir )
+    if latest in versions:
+        return latest
+    held = set( name for name in stagedVersions( jobDir ) if reservationHolder( jobDir+"/"+name ) is not None )
+    free = [ name for name in versions if name not in held ]
+    if free:
+        return free[-1]
+    return versions[-1] if versions else None
+
+
+
+def lastVersion( jobDir ):
+
+    #highest number handed out so far
+    number = readCounter( jobDir )
+    if number is not None:
+        return number
+
+    #jobs made before the counter existed are scanned once
+    versions = scanVersions( jobDir )
+    return parseVersion( versions[-1] ) if versions else 0
+
+
+
+def peekVersion( jobDir ):
+
+    #name the next allocation will most likely get, nothing is reserved
+    return versionName( lastVersion( jobDir )+1 )
+
+
+
+def allocateVersion( jobDir ):
+
+    #reserve the next free vNNN folder in staging and return its name.
+    #every path written below is built from jobDir, "job/" would give them all a "//"
+    jobDir = jobDir.rstrip( "/" )
+    number = lastVersion( jobDir )
+    stagingRoot = jobDir+"/"+stagingDirName
+    try:
+        os.mkdir( stagingRoot )
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    for attempt in range( maxAttempts ):
+        number += 1
+        staged = stagingRoot+"/"+versionName( number )
+        try:
+            os.mkdir( staged )
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                continue
+            raise
+
+        #a staged folder only goes away by becoming the published one, so this check is race free
+        if os.path.exists( jobDir+"/"+versionName( number ) ):
+            os.rmdir( staged )
+            continue
+
+        writeOwner( jobDir+"/"+versionName( number ) )
+        writeCounter( jobDir, number )
+        addToIndex( jobDir, versionName( number ) )
+        return versionName( number )
+
+    raise OSError( "No free version number in " + jobDir + " after " + str(maxAttempts) + " tries." )
+
+
+
+def publishVersion( versionDir ):
+
+    #move a finished build into place, readers see all of it or nothing
+    staged = stagingPath( versionDir )
+    if os.path.isdir( staged ):
+        os.rename( staged, versionDir.rstrip( "/" ) )
+        try:
+            os.remove( ownerPath( versionDir ) )
+        except OSError:
+            pass
+    return versionDir.rstrip( "/" )
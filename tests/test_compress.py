@@ -0,0 +1,146 @@
+#gzip publishing tests against a temporary folder, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import gzip
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetCopy
+import CGAssetCompress
+import CGAssetFingerprint
+
+
+
+
+class CompressTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp().replace( "\\", "/" )
+        self.fingerprints = CGAssetFingerprint.fingerprints
+        CGAssetFingerprint.fingerprints = CGAssetFingerprint.FingerprintCache( self.dir+"/fingerprints.json" )
+
+        #more than a chunk, so the stream goes through in pieces
+        self.data = b"v 0.0 1.0 2.0\n" * ( CGAssetCopy.chunkSize // 14 + 100 )
+        self.src = self.dir+"/mesh.obj"
+        with open( self.src, 'wb' ) as f:
+            f.write( self.data )
+
+
+
+    def tearDown( self ):
+
+        CGAssetFingerprint.fingerprints = self.fingerprints
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def read( self, path ):
+
+        with open( path, 'rb' ) as f:
+            return f.read()
+
+
+
+    def leftovers( self ):
+
+        return [ name for name in os.listdir( self.dir ) if name.endswith( ".part" ) ]
+
+
+
+    def test_hashing_file( self ):
+
+        with open( self.dir+"/out", 'wb' ) as f:
+            out = CGAssetCompress.HashingFile( f )
+            out.write( b"abc" )
+            out.write( b"def" )
+
+        self.assertEqual( out.size, 6 )
+        self.assertEqual( out.hexdigest(), hashlib.new( CGAssetFingerprint.hashName, b"abcdef" ).hexdigest() )
+        self.assertEqual( self.read( self.dir+"/out" ), b"abcdef" )
+
+
+
+    def test_stream_plain( self ):
+
+        beats = []
+        digest, size = CGAssetCompress.streamFile( self.src, self.dir+"/copy.obj", heartbeat=lambda: beats.append( 1 ) )
+
+        #written to the part file, renaming it is up to the caller
+        self.assertEqual( self.read( self.dir+"/copy.obj.part" ), self.data )
+        self.assertEqual( ( digest, size ), ( CGAssetFingerprint.hashFile( self.src ), len( self.data ) ) )
+        self.assertEqual( len( beats ), 2 )
+
+
+
+    def test_round_trip( self ):
+
+        dst = self.dir+"/mesh.obj"+CGAssetCompress.gzipExt
+        digest = CGAssetCompress.compressFile( self.src, dst )
+
+        #the hash is the one of the bytes on disk, and it is cached already
+        self.assertEqual( digest, CGAssetFingerprint.hashFile( dst ) )
+        self.assertEqual( CGAssetFingerprint.fingerprints.cached( dst ), digest )
+        self.assertLess( os.path.getsize( dst ), len( self.data ) )
+        self.assertEqual( self.leftovers(), [] )
+
+        #the header names the file without the extension
+        header = self.read( dst )[:64]
+        self.assertTrue( bytearray( header )[3] & 0x08 )
+        self.assertEqual( header[ 10:header.index( b"\0", 10 ) ], b"mesh.obj" )
+
+        with CGAssetCompress.openRead( dst ) as f:
+            self.assertEqual( f.read(), self.data )
+
+        CGAssetCompress.decompressFile( dst, self.dir+"/back.obj" )
+        self.assertEqual( self.read( self.dir+"/back.obj" ), self.data )
+        self.assertEqual( self.leftovers(), [] )
+
+
+
+    def test_open_write_text( self ):
+
+        partFile = self.dir+"/notes.json.gz.part"
+        with CGAssetCompress.openWrite( partFile, "notes.json.gz", text=True ) as f:
+            f.write( "{\"artist\": \"jo\"}\n" )
+
+        with gzip.open( partFile, 'rb' ) as f:
+            self.assertEqual( f.read(), b"{\"artist\": \"jo\"}\n" )
+
+
+
+    def test_open_read_plain( self ):
+
+        with CGAssetCompress.openRead( self.src ) as f:
+            self.assertEqual( f.read(), self.data )
+
+
+
+    def test_names( self ):
+
+        self.assertEqual( CGAssetCompress.publishedName( "a.obj", { "compression": "gzip" } ), "a.obj.gz" )
+        self.assertEqual( CGAssetCompress.publishedName( "a.obj", {} ), "a.obj" )
+        self.assertEqual( CGAssetCompress.stripExt( "a.obj.gz" ), "a.obj" )
+        self.assertEqual( CGAssetCompress.stripExt( "a.obj" ), "a.obj" )
+
+
+
+    def test_find_published( self ):
+
+        self.assertEqual( CGAssetCompress.findPublished( self.src ), self.src )
+        self.assertIsNone( CGAssetCompress.findPublished( self.dir+"/other.obj" ) )
+
+        CGAssetCompress.compressFile( self.src, self.dir+"/packed.obj.gz" )
+        self.assertEqual( CGAssetCompress.findPublished( self.dir+"/packed.obj" ), self.dir+"/packed.obj.gz" )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
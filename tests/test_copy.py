@@ -0,0 +1,137 @@
+#copy engine tests against a temporary folder, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetCopy
+
+
+
+
+class CopyEngineTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp().replace( "\\", "/" )
+        os.mkdir( self.dir+"/src" )
+        os.mkdir( self.dir+"/dst" )
+        self.copymode = shutil.copymode
+
+
+
+    def tearDown( self ):
+
+        shutil.copymode = self.copymode
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def source( self, name, size ):
+
+        path = self.dir+"/src/"+name
+        with open( path, 'wb' ) as f:
+            f.write( os.urandom( size ) )
+        return path
+
+
+
+    def read( self, path ):
+
+        with open( path, 'rb' ) as f:
+            return f.read()
+
+
+
+    def leftovers( self, folder ):
+
+        return [ name for name in os.listdir( folder ) if name.endswith( ".part" ) ]
+
+
+
+    def test_copy( self ):
+
+        #one file bigger than a chunk so it is written in pieces
+        sizes = { "a.png": 10, "b.png": CGAssetCopy.chunkSize+17, "c.png": 0 }
+        jobs = [ ( self.source( name, size ), self.dir+"/dst/"+name ) for name, size in sorted( sizes.items() ) ]
+        snapshots = []
+
+        result = CGAssetCopy.CopyEngine( threads=2 ).copyFiles( jobs, progress=snapshots.append )
+
+        self.assertEqual( sorted( result.copied ), sorted( jobs ) )
+        self.assertEqual( result.failed, [] )
+        self.assertEqual( result.totalBytes, sum( sizes.values() ) )
+        self.assertEqual( result.copiedBytes, sum( sizes.values() ) )
+        for src, dst in jobs:
+            self.assertEqual( self.read( dst ), self.read( src ) )
+        self.assertEqual( self.leftovers( self.dir+"/dst" ), [] )
+
+        last = snapshots[-1]
+        self.assertEqual( ( last[ "filesDone" ], last[ "filesTotal" ] ), ( 3, 3 ) )
+        self.assertEqual( last[ "bytesDone" ], last[ "bytesTotal" ] )
+        self.assertEqual( last[ "inFlight" ], {} )
+
+
+
+    def test_failures_are_collected( self ):
+
+        good = ( self.source( "good.png", 100 ), self.dir+"/dst/good.png" )
+        missing = ( self.dir+"/src/missing.png", self.dir+"/dst/missing.png" )
+        noFolder = ( self.source( "lost.png", 100 ), self.dir+"/dst/gone/lost.png" )
+
+        result = CGAssetCopy.CopyEngine().copyFiles( [ missing, good, noFolder ] )
+
+        #one bad file does not stop the others
+        self.assertEqual( result.copied, [ good ] )
+        self.assertEqual( sorted( ( src, dst ) for src, dst, error in result.failed ), sorted( [ missing, noFolder ] ) )
+        for src, dst, error in result.failed:
+            self.assertTrue( error )
+        self.assertEqual( result.copiedBytes, 100 )
+        self.assertFalse( os.path.exists( missing[1] ) )
+
+
+
+    def test_partial_copy_is_removed( self ):
+
+        #the bytes are written but finishing the file fails
+        def fail( src, dst ):
+            raise OSError( "permission denied" )
+        shutil.copymode = fail
+
+        src = self.source( "a.png", 1000 )
+        with open( self.dir+"/dst/a.png", 'wb' ) as f:
+            f.write( b"old" )
+
+        result = CGAssetCopy.CopyEngine().copyFiles( [ ( src, self.dir+"/dst/a.png" ) ] )
+
+        self.assertEqual( result.copied, [] )
+        self.assertEqual( result.failed, [ ( src, self.dir+"/dst/a.png", "permission denied" ) ] )
+        self.assertEqual( self.leftovers( self.dir+"/dst" ), [] )
+
+        #the file that was there is left as it was
+        self.assertEqual( self.read( self.dir+"/dst/a.png" ), b"old" )
+
+
+
+    def test_replace_file( self ):
+
+        with open( self.dir+"/dst/a.part", 'wb' ) as f:
+            f.write( b"new" )
+        with open( self.dir+"/dst/a", 'wb' ) as f:
+            f.write( b"old" )
+
+        CGAssetCopy.replaceFile( self.dir+"/dst/a.part", self.dir+"/dst/a" )
+
+        self.assertEqual( self.read( self.dir+"/dst/a" ), b"new" )
+        self.assertEqual( os.listdir( self.dir+"/dst" ), [ "a" ] )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+#index service tests against a temporary project tree, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetIndex
+import CGAssetDaemon
+
+
+
+
+def makeTree( root ):
+
+    #one project with one asset, one job and two versions
+    jobDir = root+"/proj/09_CG_RnD/CG_Assets/chair/model"
+    for version in ( "v001", "v002" ):
+        os.makedirs( jobDir+"/"+version+"/maya_files" )
+    os.makedirs( root+"/other" )
+    return jobDir
+
+
+
+def freePort():
+
+    sock = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+    sock.bind( ( "127.0.0.1", 0 ) )
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+
+
+class IndexServiceTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.root = CGAssetIndex.normPath( tempfile.mkdtemp() )
+        self.jobDir = makeTree( self.root )
+        self.service = CGAssetDaemon.IndexService( self.root )
+
+
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.root, ignore_errors=True )
+
+
+
+    def test_answers( self ):
+
+        self.assertTrue( self.service.answer( { "op": "ping" } )[ "ok" ] )
+        self.assertEqual( self.service.answer( { "op": "listdir", "path": self.jobDir } ), { "ok": True, "names": [ "v001", "v002" ] } )
+        self.assertEqual( self.service.answer( { "op": "exists", "path": self.jobDir+"/v002" } ), { "ok": True, "exists": True } )
+        self.assertEqual( self.service.answer( { "op": "exists", "path": self.jobDir+"/v003" } ), { "ok": True, "exists": False } )
+
+
+
+    def test_outside_root( self ):
+
+        self.assertFalse( self.service.answer( { "op": "listdir", "path": os.path.dirname( self.root ) } )[ "ok" ] )
+        self.assertFalse( self.service.answer( { "op": "listdir", "path": self.root+"_other" } )[ "ok" ] )
+        self.assertFalse( self.service.answer( { "op": "listdir" } )[ "ok" ] )
+        self.assertFalse( self.service.answer( { "op": "rmtree", "path": self.root } )[ "ok" ] )
+
+
+
+    def test_invalidate( self ):
+
+        #a new version only shows once the job folder is invalidated, the listing is still fresh
+        self.service.answer( { "op": "listdir", "path": self.jobDir } )
+        os.mkdir( self.jobDir+"/v003" )
+        self.assertEqual( self.service.answer( { "op": "listdir", "path": self.jobDir } )[ "names" ], [ "v001", "v002" ] )
+
+        self.service.answer( { "op": "invalidate", "path": self.jobDir } )
+        self.assertEqual( self.service.answer( { "op": "listdir", "path": self.jobDir } )[ "names" ], [ "v001", "v002", "v003" ] )
+
+
+
+    def test_job_tree( self ):
+
+        self.assertEqual( list( CGAssetDaemon.jobTree( self.service.index, self.root+"/" ) ), [ self.jobDir ] )
+
+
+
+    def test_warm_stops_at_jobs( self ):
+
+        scanned = []
+        scan = self.service.index.scan
+        def recordScan( path ):
+            scanned.append( path )
+            return scan( path )
+        self.service.index.scan = recordScan
+
+        self.service.warmOnce()
+        self.assertIn( self.jobDir, scanned )
+        self.assertEqual( [ path for path in scanned if path.startswith( self.jobDir+"/" ) ], [] )
+
+        #a second walk inside the cache lifetime reads nothing from the share
+        del scanned[:]
+        self.service.warmOnce()
+        self.assertEqual( scanned, [] )
+
+
+
+    def test_shutdown( self ):
+
+        self.assertTrue( self.service.answer( { "op": "shutdown" } )[ "ok" ] )
+        self.assertFalse( self.service.running )
+
+
+
+
+class DaemonIndexTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.root = CGAssetIndex.normPath( tempfile.mkdtemp() )
+        self.jobDir = makeTree( self.root )
+        self.port = freePort()
+        self.fallback = CGAssetIndex.DirIndex( ttl=60.0 )
+
+
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.root, ignore_errors=True )
+
+
+
+    def startServer( self ):
+
+        server = threading.Thread( target=CGAssetDaemon.serve, args=( self.root, self.port ) )
+        server.daemon = True
+        server.start()
+
+        index = CGAssetDaemon.DaemonIndex( self.root, self.port, fallback=self.fallback, autoStart=False )
+        for i in range( 100 ):
+            index.nextTry = 0.0
+            if index.request( op="ping" ) is not None:
+                return server, index
+            time.sleep( 0.05 )
+        self.fail( "the index service did not come up" )
+
+
+
+    def test_served( self ):
+
+        server, index = self.startServer()
+
+        self.assertEqual( index.listdir( self.jobDir ), [ "v001", "v002" ] )
+        self.assertTrue( index.exists( self.jobDir+"/v001/maya_files" ) )
+        self.assertFalse( index.exists( self.jobDir+"/v009" ) )
+
+        #answered by the service, the session cache was never filled
+        self.assertEqual( self.fallback.entries, {} )
+
+        os.mkdir( self.jobDir+"/v003" )
+        index.invalidate( self.jobDir )
+        self.assertEqual( index.listdir( self.jobDir ), [ "v001", "v002", "v003" ] )
+
+        self.assertIsNotNone( index.request( op="shutdown" ) )
+        server.join( 10.0 )
+        self.assertFalse( server.is_alive() )
+
+
+
+    def test_fallback( self ):
+
+        #nobody listening on the port, the session scans the tree itself
+        index = CGAssetDaemon.DaemonIndex( self.root, self.port, fallback=self.fallback, autoStart=False )
+
+        self.assertEqual( index.listdir( self.jobDir ), [ "v001", "v002" ] )
+        self.assertTrue( index.exists( self.jobDir+"/v002" ) )
+        self.assertFalse( index.started )
+        self.assertIn( self.jobDir, self.fallback.entries )
+
+
+
+    def test_fallback_outside_root( self ):
+
+        #the service refuses paths it does not serve, the session answers those itself
+        server, index = self.startServer()
+
+        parent = os.path.dirname( self.root )
+        self.assertEqual( index.listdir( parent ), sorted( os.listdir( parent ) ) )
+        self.assertIn( parent, self.fallback.entries )
+
+        index.request( op="shutdown" )
+        server.join( 10.0 )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+#fingerprint cache tests against a temporary folder, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetFingerprint
+
+
+
+
+class FingerprintTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp().replace( "\\", "/" )
+        self.cacheFile = self.dir+"/fingerprints.json"
+        self.hashFile = CGAssetFingerprint.hashFile
+        self.hashed = []
+
+        #count the files that are really read
+        def countingHash( path ):
+            self.hashed.append( path )
+            return self.hashFile( path )
+        CGAssetFingerprint.hashFile = countingHash
+
+
+
+    def tearDown( self ):
+
+        CGAssetFingerprint.hashFile = self.hashFile
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def write( self, name, data, mtime=None ):
+
+        path = self.dir+"/"+name
+        with open( path, 'wb' ) as f:
+            f.write( data )
+        if mtime is not None:
+            os.utime( path, ( mtime, mtime ) )
+        return path
+
+
+
+    def test_unchanged_file_is_not_read( self ):
+
+        cache = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        path = self.write( "a.png", b"pixels" )
+
+        digest = cache.digest( path )
+        self.assertEqual( cache.digest( path ), digest )
+        self.assertEqual( cache.cached( path ), digest )
+        self.assertEqual( self.hashed, [ path ] )
+        self.assertEqual( ( cache.hits, cache.misses ), ( 1, 1 ) )
+
+
+
+    def test_stat_key( self ):
+
+        cache = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        path = self.write( "a.png", b"pixels", mtime=1000000000 )
+        first = cache.digest( path )
+
+        #the same size, only the time moved
+        self.write( "a.png", b"PIXELS", mtime=1000000100 )
+        self.assertIsNone( cache.cached( path ) )
+        self.assertNotEqual( cache.digest( path ), first )
+
+        #the same size and time, but another file put in its place
+        self.write( "b.png", b"pixels", mtime=1000000100 )
+        os.remove( path )
+        os.rename( self.dir+"/b.png", path )
+        self.assertEqual( cache.digest( path ), first )
+        self.assertEqual( len( self.hashed ), 3 )
+
+
+
+    def test_remember( self ):
+
+        cache = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        path = self.write( "a.png", b"pixels" )
+
+        cache.remember( path, "known" )
+        self.assertEqual( cache.digest( path ), "known" )
+        self.assertEqual( self.hashed, [] )
+
+        cache.remember( self.dir+"/missing.png", "known" )
+        self.assertIsNone( cache.cached( self.dir+"/missing.png" ) )
+
+
+
+    def test_saved_between_sessions( self ):
+
+        path = self.write( "a.png", b"pixels" )
+        cache = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        digest = cache.digest( path )
+        cache.save()
+
+        self.assertEqual( CGAssetFingerprint.FingerprintCache( self.cacheFile ).digest( path ), digest )
+        self.assertEqual( self.hashed, [ path ] )
+        self.assertEqual( [ name for name in os.listdir( self.dir ) if name.endswith( ".part" ) ], [] )
+
+
+
+    def test_save_merges( self ):
+
+        #two sessions hash different files, neither loses the other's work
+        first = self.write( "a.png", b"pixels" )
+        second = self.write( "b.png", b"other pixels" )
+        one = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        two = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        one.digest( first )
+        two.digest( second )
+        one.save()
+        two.save()
+
+        with open( self.cacheFile, 'r' ) as f:
+            data = json.load( f )
+        self.assertEqual( data[ "hash" ], CGAssetFingerprint.hashName )
+        self.assertEqual( sorted( data[ "entries" ] ), sorted( [ two.key( first ), two.key( second ) ] ) )
+
+
+
+    def test_other_hash_is_ignored( self ):
+
+        path = self.write( "a.png", b"pixels" )
+        cache = CGAssetFingerprint.FingerprintCache( self.cacheFile )
+        key = cache.key( path )
+        with open( self.cacheFile, 'w' ) as f:
+            json.dump( { "hash": "md5", "entries": { key: CGAssetFingerprint.statKey( path ) + [ "old", 0 ] } }, f )
+
+        self.assertEqual( cache.digest( path ), self.hashFile( path ) )
+        self.assertEqual( self.hashed, [ path ] )
+
+
+
+    def test_broken_cache_file( self ):
+
+        path = self.write( "a.png", b"pixels" )
+        with open( self.cacheFile, 'w' ) as f:
+            f.write( "{ not json" )
+
+        self.assertEqual( CGAssetFingerprint.FingerprintCache( self.cacheFile ).digest( path ), self.hashFile( path ) )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
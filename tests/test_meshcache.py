@@ -0,0 +1,116 @@
+#mesh cache tests, synthetic meshes only, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from array import array
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetMeshCache
+
+
+
+
+def triangleMesh():
+
+    return {
+        "positions": array( "f", [ 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.5, -2.25 ] ),
+        "normals": array( "f", [ 0.0, 0.0, 1.0 ] ),
+        "normalIds": array( "i", [ 0, 0, 0 ] ),
+        "uvs": array( "f", [ 0.0, 0.0, 1.0, 0.0, 0.0, 1.0 ] ),
+        "uvCounts": array( "i", [ 3 ] ),
+        "uvIds": array( "i", [ 0, 1, 2 ] ),
+        "faceCounts": array( "i", [ 3 ] ),
+        "faceIndices": array( "i", [ 0, 1, 2 ] )
+    }
+
+
+
+
+class MeshCacheTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp()
+
+
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def test_round_trip( self ):
+
+        arrays = triangleMesh()
+        arrays[ "creases" ] = array( "f", [ 0.5 ] )
+        path = CGAssetMeshCache.writeMeshCache( self.dir+"/tri"+CGAssetMeshCache.meshCacheExt, arrays, meta={ "name": "tri", "space": "world" } )
+
+        with CGAssetMeshCache.loadMeshCache( path ) as cache:
+            self.assertEqual( cache.meta, { "name": "tri", "space": "world" } )
+            self.assertEqual( cache.names(), CGAssetMeshCache.arrayNames + [ "creases" ] )
+            for name, data in arrays.items():
+                self.assertEqual( list( cache[ name ] ), list( data ), name )
+
+        self.assertFalse( os.path.exists( path+".part" ) )
+
+
+
+    def test_arrays_are_aligned( self ):
+
+        path = CGAssetMeshCache.writeMeshCache( self.dir+"/tri.cgmesh", triangleMesh() )
+
+        with CGAssetMeshCache.loadMeshCache( path ) as cache:
+            for name in cache.names():
+                self.assertEqual( cache.table[ name ][2] % CGAssetMeshCache.alignment, 0 )
+
+
+
+    def test_rejects_wide_arrays( self ):
+
+        arrays = triangleMesh()
+        arrays[ "positions" ] = array( "d", arrays[ "positions" ] )
+        self.assertRaises( ValueError, CGAssetMeshCache.writeMeshCache, self.dir+"/bad.cgmesh", arrays )
+
+
+
+    def test_rejects_other_files( self ):
+
+        with open( self.dir+"/other.cgmesh", 'wb' ) as f:
+            f.write( b"\0"*64 )
+        self.assertRaises( ValueError, CGAssetMeshCache.loadMeshCache, self.dir+"/other.cgmesh" )
+
+
+
+
+class MeshDigestTest( unittest.TestCase ):
+
+    def test_same_arrays_same_digest( self ):
+
+        self.assertEqual( CGAssetMeshCache.meshDigest( triangleMesh() ), CGAssetMeshCache.meshDigest( triangleMesh() ) )
+
+
+
+    def test_any_change_changes_digest( self ):
+
+        digest = CGAssetMeshCache.meshDigest( triangleMesh() )
+
+        moved = triangleMesh()
+        moved[ "positions" ][0] = 0.001
+        self.assertNotEqual( CGAssetMeshCache.meshDigest( moved ), digest )
+
+        #the same numbers under another name are another mesh
+        renamed = triangleMesh()
+        renamed[ "creases" ] = renamed.pop( "uvIds" )
+        self.assertNotEqual( CGAssetMeshCache.meshDigest( renamed ), digest )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,247 @@
+#OBJ writer tests, synthetic meshes only, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from array import array
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetCompress
+import CGAssetSettings
+import CGAssetVersions
+import CGAssetObjWriter
+
+
+
+
+def quadMesh( offset=0.0 ):
+
+    #one quad with uvs and one normal per corner, the way extractMesh hands them over
+    return {
+        "positions": array( "f", [ offset, 0, 0, offset+1, 0, 0, offset+1, 1, 0, offset, 1, 0 ] ),
+        "normals": array( "f", [ 0, 0, 1 ] ),
+        "normalIds": array( "i", [ 0, 0, 0, 0 ] ),
+        "uvs": array( "f", [ 0, 0, 1, 0, 1, 1, 0, 1 ] ),
+        "uvCounts": array( "i", [ 4 ] ),
+        "uvIds": array( "i", [ 0, 1, 2, 3 ] ),
+        "faceCounts": array( "i", [ 4 ] ),
+        "faceIndices": array( "i", [ 0, 1, 2, 3 ] )
+    }
+
+
+
+def objLines( path, prefix ):
+
+    with CGAssetCompress.openRead( path ) as f:
+        text = f.read()
+    if not isinstance( text, str ):
+        text = text.decode( "utf-8" )
+    return [ line for line in text.splitlines() if line.startswith( prefix+" " ) ]
+
+
+
+
+class WriteObjTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp()
+
+
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def test_single_mesh( self ):
+
+        path = CGAssetObjWriter.writeObj( self.dir+"/quad.obj", [ ( "quad", quadMesh() ) ] )
+
+        self.assertEqual( objLines( path, "g" ), [ "g quad" ] )
+        self.assertEqual( len( objLines( path, "v" ) ), 4 )
+        self.assertEqual( len( objLines( path, "vt" ) ), 4 )
+        self.assertEqual( objLines( path, "vn" ), [ "vn 0.000000 0.000000 1.000000" ] )
+        self.assertEqual( objLines( path, "f" ), [ "f 1/1/1 2/2/1 3/3/1 4/4/1" ] )
+        self.assertFalse( os.path.exists( path+".part" ) )
+
+
+
+    def test_combined_offsets( self ):
+
+        #the second mesh indexes past the first one's vertices, uvs and normals
+        path = CGAssetObjWriter.writeObj( self.dir+"/both.obj", [ ( "a", quadMesh() ), ( "b", quadMesh( 2.0 ) ) ] )
+
+        self.assertEqual( objLines( path, "g" ), [ "g a", "g b" ] )
+        self.assertEqual( objLines( path, "f" ), [ "f 1/1/1 2/2/1 3/3/1 4/4/1", "f 5/5/2 6/6/2 7/7/2 8/8/2" ] )
+
+
+
+    def test_without_uvs_and_normals( self ):
+
+        mesh = quadMesh()
+        for name in ( "normals", "normalIds", "uvs", "uvCounts", "uvIds" ):
+            del mesh[ name ]
+        path = CGAssetObjWriter.writeObj( self.dir+"/bare.obj", [ ( "bare", mesh ) ] )
+
+        self.assertEqual( objLines( path, "vt" ), [] )
+        self.assertEqual( objLines( path, "f" ), [ "f 1 2 3 4" ] )
+
+
+
+    def test_compressed( self ):
+
+        path = CGAssetObjWriter.writeObj( self.dir+"/quad.obj"+CGAssetCompress.gzipExt, [ ( "quad", quadMesh() ) ] )
+
+        with open( path, 'rb' ) as f:
+            self.assertEqual( f.read( 2 ), b"\x1f\x8b" )
+        self.assertEqual( objLines( path, "f" ), [ "f 1/1/1 2/2/1 3/3/1 4/4/1" ] )
+
+
+
+
+class ObjWriterPoolTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp()
+        self.workerContext = CGAssetObjWriter.workerContext
+        self.workerPool = CGAssetObjWriter.workerPool
+        self.localDir = os.environ.get( CGAssetSettings.localDirEnv )
+        os.environ[ CGAssetSettings.localDirEnv ] = self.dir+"/local"
+
+
+
+    def tearDown( self ):
+
+        CGAssetObjWriter.workerContext = self.workerContext
+        CGAssetObjWriter.workerPool = self.workerPool
+        if self.localDir is None:
+            os.environ.pop( CGAssetSettings.localDirEnv, None )
+        else:
+            os.environ[ CGAssetSettings.localDirEnv ] = self.localDir
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def reference( self ):
+
+        CGAssetObjWriter.writeObj( self.dir+"/reference.obj", [ ( "mesh2", quadMesh( 2 ) ) ] )
+        with open( self.dir+"/reference.obj", 'r' ) as f:
+            return f.read()
+
+
+
+    def writeAll( self ):
+
+        with CGAssetObjWriter.ObjWriterPool( processes=2 ) as pool:
+            for i in range( 4 ):
+                pool.submit( self.dir+"/mesh%d.obj" % i, [ ( "mesh%d" % i, quadMesh( i ) ) ] )
+            pool.submit( self.dir+"/missing/mesh.obj", [ ( "mesh", quadMesh() ) ] )
+            return pool.wait(), pool.inline
+
+
+
+    def test_pool( self ):
+
+        if CGAssetObjWriter.workerContext() is None:
+            self.skipTest( "no spawn context in this python" )
+
+        failed, inline = self.writeAll()
+
+        self.assertFalse( inline )
+        self.assertEqual( [ path for path, error in failed ], [ self.dir+"/missing/mesh.obj" ] )
+        for i in range( 4 ):
+            self.assertEqual( objLines( self.dir+"/mesh%d.obj" % i, "g" ), [ "g mesh%d" % i ] )
+
+
+
+    def test_subprocess_pool( self ):
+
+        #without a spawn context, python 2 outside windows, workers are started with subprocess
+        expected = self.reference()
+
+        CGAssetObjWriter.workerContext = lambda: None
+        failed, inline = self.writeAll()
+
+        self.assertFalse( inline )
+        self.assertEqual( [ path for path, error in failed ], [ self.dir+"/missing/mesh.obj" ] )
+        with open( self.dir+"/mesh2.obj", 'r' ) as f:
+            self.assertEqual( f.read(), expected )
+        self.assertEqual( os.listdir( self.dir+"/local/workers" ), [] )
+
+
+
+    def test_inline_matches_pool( self ):
+
+        #without any pool, inside a batch worker, the same files are written in this process
+        expected = self.reference()
+
+        CGAssetObjWriter.workerPool = lambda processes=None: None
+        failed, inline = self.writeAll()
+
+        self.assertTrue( inline )
+        self.assertEqual( len(failed), 1 )
+        with open( self.dir+"/mesh2.obj", 'r' ) as f:
+            self.assertEqual( f.read(), expected )
+
+
+
+
+class SubprocessPoolTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp()
+        self.localDir = os.environ.get( CGAssetSettings.localDirEnv )
+        os.environ[ CGAssetSettings.localDirEnv ] = self.dir
+        self.pool = CGAssetObjWriter.SubprocessPool( 2 )
+
+
+
+    def tearDown( self ):
+
+        self.pool.close()
+        self.pool.join()
+        if self.localDir is None:
+            os.environ.pop( CGAssetSettings.localDirEnv, None )
+        else:
+            os.environ[ CGAssetSettings.localDirEnv ] = self.localDir
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def test_results( self ):
+
+        self.assertEqual( self.pool.apply_async( CGAssetVersions.versionName, ( 7, ) ).get(), "v007" )
+        self.assertEqual( sorted( self.pool.imap_unordered( CGAssetVersions.versionName, range( 1, 6 ) ) ), [ "v001", "v002", "v003", "v004", "v005" ] )
+
+
+
+    def test_errors( self ):
+
+        #a failing job is reported and the worker keeps going
+        result = self.pool.apply_async( CGAssetVersions.versionName, ( "seven", ) )
+        self.assertRaises( CGAssetObjWriter.WorkerError, result.get )
+        self.assertEqual( self.pool.apply_async( CGAssetVersions.versionName, ( 8, ) ).get(), "v008" )
+
+
+
+    def test_other_process( self ):
+
+        path, error, ( start, end, pid, meshCount, size ) = self.pool.apply_async( CGAssetObjWriter.writeObjJob, ( ( self.dir+"/quad.obj", [ ( "quad", quadMesh() ) ] ), ) ).get()
+
+        self.assertIsNone( error )
+        self.assertNotEqual( pid, os.getpid() )
+        self.assertEqual( objLines( path, "g" ), [ "g quad" ] )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
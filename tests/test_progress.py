@@ -0,0 +1,86 @@
+#progress log sink tests, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import logging
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetProgress
+
+
+
+
+class ListHandler( logging.Handler ):
+
+    def __init__( self ):
+
+        logging.Handler.__init__( self )
+        self.lines = []
+
+
+
+    def emit( self, record ):
+
+        self.lines.append( record.getMessage() )
+
+
+
+
+class LogSinkTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        #nothing configured, the way a maya GUI session starts
+        self.logger = logging.getLogger( CGAssetProgress.loggerName )
+        self.root = logging.getLogger()
+        self.saved = ( self.logger.level, list( self.logger.handlers ), self.root.level, list( self.root.handlers ) )
+        self.logger.setLevel( logging.NOTSET )
+        self.logger.handlers = []
+        self.root.setLevel( logging.WARNING )
+        self.root.handlers = []
+
+
+
+    def tearDown( self ):
+
+        self.logger.level, self.logger.handlers, self.root.level, self.root.handlers = self.saved
+
+
+
+    def test_shown_without_configuration( self ):
+
+        CGAssetProgress.LogSink()
+
+        self.assertTrue( self.logger.isEnabledFor( logging.INFO ) )
+        self.assertEqual( len( self.logger.handlers ), 1 )
+
+        #a second sink does not print every line twice
+        CGAssetProgress.LogSink()
+        self.assertEqual( len( self.logger.handlers ), 1 )
+
+
+
+    def test_configured_logging_is_kept( self ):
+
+        #a batch publish sets up the root logger itself, the lines go there
+        handler = ListHandler()
+        self.root.addHandler( handler )
+        self.root.setLevel( logging.INFO )
+
+        progress = CGAssetProgress.Progress( [ CGAssetProgress.LogSink() ], interval=0 )
+        progress.stage( "Exporting Geo", total=2 )
+        progress.end()
+
+        self.assertEqual( self.logger.handlers, [] )
+        self.assertEqual( self.logger.level, logging.NOTSET )
+        self.assertEqual( handler.lines[0], "Exporting Geo 0 of 2." )
+        self.assertTrue( handler.lines[-1].startswith( "Exporting Geo done in " ) )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
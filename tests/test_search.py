@@ -0,0 +1,144 @@
+#asset search tests against a temporary project, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetManifest
+import CGAssetSearch
+
+
+
+
+def document( version, artist="jo" ):
+
+    return CGAssetSearch.versionDocument( "proj", "dragonHead", "model", version, { "artist": artist, "textures": [ { "file": "dragon_diffuse.png" } ] } )
+
+
+
+
+class SearchTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.root = tempfile.mkdtemp().replace( "\\", "/" )+"/"
+        self.rndDir = self.root+"proj/09_CG_RnD"
+        self.jobDir = self.rndDir+"/CG_Assets/dragonHead/model"
+        os.makedirs( self.jobDir )
+        self.index = CGAssetSearch.SearchIndex( self.root )
+
+
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.root, ignore_errors=True )
+
+
+
+    def build( self, version, manifest=True ):
+
+        os.makedirs( self.jobDir+"/"+version+"/notes" )
+        if manifest:
+            with open( CGAssetManifest.manifestPath( self.jobDir+"/"+version ), 'w' ) as f:
+                json.dump( { "artist": "jo" }, f )
+
+
+
+    def versions( self, query ):
+
+        return [ doc[ "version" ] for doc in self.index.search( query ) ]
+
+
+
+    def test_prefix_query( self ):
+
+        CGAssetSearch.appendDocument( self.rndDir, document( "v001" ) )
+        self.index.refresh( [ "proj" ] )
+
+        self.assertEqual( self.versions( "drag diff" ), [ "v001" ] )
+        self.assertEqual( self.versions( "head" ), [ "v001" ] )
+        self.assertEqual( self.versions( "drag normal" ), [] )
+
+
+
+    def test_own_log_per_host( self ):
+
+        CGAssetSearch.appendDocument( self.rndDir, document( "v001" ) )
+        self.assertEqual( CGAssetSearch.searchFiles( self.rndDir ), [ CGAssetSearch.searchFile( self.rndDir ) ] )
+
+        #another workstation's log and the shared one older windows wrote are read as well
+        with open( self.rndDir+"/CG_Search.otherhost.jsonl", 'w' ) as f:
+            f.write( json.dumps( document( "v002" ) )+"\n" )
+        with open( self.rndDir+"/CG_Search.jsonl", 'w' ) as f:
+            f.write( json.dumps( document( "v003" ) )+"\n" )
+        self.index.refresh( [ "proj" ] )
+
+        self.assertEqual( self.versions( "dragon" ), [ "v003", "v002", "v001" ] )
+
+
+
+    def test_broken_lines( self ):
+
+        #interleaved appends, a line of something else, and a line still being written
+        with open( CGAssetSearch.searchFile( self.rndDir ), 'w' ) as f:
+            f.write( json.dumps( document( "v001" ) )+"\n" )
+            f.write( json.dumps( document( "v002" ) )[:20]+json.dumps( document( "v003" ) )+"\n" )
+            f.write( "[1, 2]\n" )
+            f.write( json.dumps( dict( document( "v004" ), meshes="notAList" ) )+"\n" )
+            f.write( "\xff\n" )
+            f.write( json.dumps( document( "v005" ) )[:30] )
+        self.assertTrue( self.index.refresh( [ "proj" ] ) )
+        self.assertEqual( self.versions( "dragon" ), [ "v001" ] )
+
+        #the rest of the last line arrives
+        with open( CGAssetSearch.searchFile( self.rndDir ), 'a' ) as f:
+            f.write( json.dumps( document( "v005" ) )[30:]+"\n" )
+        self.assertTrue( self.index.refresh( [ "proj" ] ) )
+        self.assertEqual( self.versions( "dragon" ), [ "v005", "v001" ] )
+
+
+
+    def test_missing_log_is_not_written( self ):
+
+        #browsing a project nobody logged yet finds its builds but leaves the share alone
+        self.build( "v001" )
+        self.build( "v002", manifest=False )
+        before = sorted( os.listdir( self.rndDir ) ), sorted( os.listdir( self.jobDir ) )
+
+        self.assertTrue( self.index.refresh( [ "proj" ] ) )
+        self.assertEqual( self.versions( "dragon" ), [ "v001" ] )
+        self.assertEqual( ( sorted( os.listdir( self.rndDir ) ), sorted( os.listdir( self.jobDir ) ) ), before )
+
+        #walked once only
+        self.assertFalse( self.index.refresh( [ "proj" ] ) )
+
+
+
+    def test_rebuild( self ):
+
+        self.build( "v001" )
+        self.build( "v002" )
+        CGAssetSearch.rebuildProject( self.rndDir, "proj" )
+
+        self.assertEqual( [ os.path.basename( path ) for path in CGAssetSearch.searchFiles( self.rndDir ) ], [ os.path.basename( CGAssetSearch.searchFile( self.rndDir ) ) ] )
+        self.assertEqual( [ name for name in os.listdir( self.rndDir ) if name.endswith( ".part" ) ], [] )
+        self.index.refresh( [ "proj" ] )
+        self.assertEqual( self.versions( "dragon" ), [ "v002", "v001" ] )
+
+        #a rewritten log is read again from the start
+        shutil.rmtree( self.jobDir+"/v002" )
+        CGAssetSearch.rebuildProject( self.rndDir, "proj" )
+        self.index.refresh( [ "proj" ] )
+        self.assertEqual( self.versions( "dragon" ), [ "v001" ] )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
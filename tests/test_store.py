@@ -0,0 +1,191 @@
+#texture store and hardlink tests against a temporary folder, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import json
+import stat
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetStore
+import CGAssetFingerprint
+
+
+
+
+class StoreTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp().replace( "\\", "/" )
+
+        #keep the fingerprints of this test away from the workstation cache
+        self.fingerprints = CGAssetFingerprint.fingerprints
+        CGAssetFingerprint.fingerprints = CGAssetFingerprint.FingerprintCache( self.dir+"/fingerprints.json" )
+
+
+
+    def tearDown( self ):
+
+        CGAssetFingerprint.fingerprints = self.fingerprints
+
+        #read only store objects still have to go
+        for root, dirs, files in os.walk( self.dir ):
+            for name in files:
+                os.chmod( os.path.join( root, name ), stat.S_IRUSR | stat.S_IWUSR )
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def write( self, path, data ):
+
+        folder = os.path.dirname( path )
+        if not os.path.isdir( folder ):
+            os.makedirs( folder )
+        with open( path, 'wb' ) as f:
+            f.write( data )
+        return path
+
+
+
+    def read( self, path ):
+
+        with open( path, 'rb' ) as f:
+            return f.read()
+
+
+
+    def mode( self, path ):
+
+        return stat.S_IMODE( os.stat( path ).st_mode )
+
+
+
+
+class LinkTest( StoreTest ):
+
+    def test_make_link( self ):
+
+        src = self.write( self.dir+"/a.png", b"pixels" )
+        dst = self.write( self.dir+"/b.png", b"old" )
+
+        self.assertTrue( CGAssetStore.makeLink( src, dst ) )
+        self.assertTrue( os.path.samefile( src, dst ) )
+        self.assertEqual( os.stat( src ).st_nlink, 2 )
+        self.assertEqual( self.read( dst ), b"pixels" )
+
+
+
+    def test_make_link_fails( self ):
+
+        self.assertFalse( CGAssetStore.makeLink( self.dir+"/missing.png", self.dir+"/b.png" ) )
+        self.assertFalse( os.path.exists( self.dir+"/b.png" ) )
+
+
+
+    def test_protect( self ):
+
+        path = self.write( self.dir+"/a.png", b"pixels" )
+        CGAssetStore.protect( path )
+        self.assertEqual( self.mode( path ), CGAssetStore.readOnlyMode )
+
+
+
+    def test_break_link( self ):
+
+        obj = self.write( self.dir+"/store/a.png", b"pixels" )
+        CGAssetStore.protect( obj )
+        dst = self.dir+"/v001/a.png"
+        os.mkdir( self.dir+"/v001" )
+        CGAssetStore.makeLink( obj, dst )
+
+        self.assertTrue( CGAssetStore.breakLink( dst, others=[ obj ] ) )
+
+        #the version has its own writable copy, the store object is untouched
+        self.assertFalse( os.path.samefile( obj, dst ) )
+        self.assertEqual( os.stat( dst ).st_nlink, 1 )
+        self.assertEqual( os.stat( obj ).st_nlink, 1 )
+        self.assertEqual( self.read( dst ), b"pixels" )
+        self.assertTrue( self.mode( dst ) & stat.S_IWUSR )
+        self.assertEqual( self.mode( obj ), CGAssetStore.readOnlyMode )
+        self.assertEqual( [ name for name in os.listdir( self.dir+"/v001" ) if name.endswith( ".part" ) ], [] )
+
+
+
+    def test_break_link_single( self ):
+
+        path = self.write( self.dir+"/a.png", b"pixels" )
+        self.assertFalse( CGAssetStore.breakLink( path ) )
+        self.assertEqual( self.read( path ), b"pixels" )
+
+
+
+
+class TextureStoreTest( StoreTest ):
+
+    def test_publish( self ):
+
+        store = CGAssetStore.TextureStore( self.dir+"/rnd" )
+        diffuse = self.write( self.dir+"/src/diffuse.png", b"red"*100 )
+        copy = self.write( self.dir+"/src/copy.png", b"red"*100 )
+        normal = self.write( self.dir+"/src/normal.png", b"blue"*100 )
+        os.makedirs( self.dir+"/v001" )
+        jobs = [ ( diffuse, self.dir+"/v001/diffuse.png" ), ( copy, self.dir+"/v001/copy.png" ), ( normal, self.dir+"/v001/normal.png" ) ]
+
+        result = store.publish( jobs )
+
+        #the same bytes under two names are stored once
+        self.assertEqual( result.failed, [] )
+        self.assertEqual( result.newBytes, 300+400 )
+        self.assertEqual( sorted( result.linked ), sorted( dst for src, dst in jobs ) )
+        self.assertEqual( result.digests[ self.dir+"/v001/diffuse.png" ], result.digests[ self.dir+"/v001/copy.png" ] )
+
+        obj = store.objectPath( result.digests[ self.dir+"/v001/diffuse.png" ], ".png" )
+        self.assertTrue( os.path.samefile( obj, self.dir+"/v001/diffuse.png" ) )
+        self.assertEqual( self.mode( obj ), CGAssetStore.readOnlyMode )
+
+        #the next version only links, nothing new goes to the store
+        os.makedirs( self.dir+"/v002" )
+        again = store.publish( [ ( diffuse, self.dir+"/v002/diffuse.png" ) ] )
+        self.assertEqual( again.newBytes, 0 )
+        self.assertTrue( os.path.samefile( obj, self.dir+"/v002/diffuse.png" ) )
+
+
+
+    def test_missing_source( self ):
+
+        store = CGAssetStore.TextureStore( self.dir+"/rnd" )
+        os.makedirs( self.dir+"/v001" )
+
+        result = store.publish( [ ( self.dir+"/src/missing.png", self.dir+"/v001/missing.png" ) ] )
+
+        self.assertEqual( [ dst for src, dst, error in result.failed ], [ self.dir+"/v001/missing.png" ] )
+        self.assertEqual( result.digests, {} )
+
+
+
+    def test_pointers( self ):
+
+        store = CGAssetStore.TextureStore( self.dir+"/rnd" )
+        src = self.write( self.dir+"/src/diffuse.png", b"red" )
+        os.makedirs( self.dir+"/v001/notes" )
+
+        result = store.publish( [ ( src, self.dir+"/v001/diffuse.png" ) ] )
+        with open( store.writePointers( self.dir+"/v001/notes", result ), 'r' ) as f:
+            pointers = json.load( f )
+
+        entry = pointers[ "textures" ][ "diffuse.png" ]
+        self.assertEqual( pointers[ "store" ], store.storeDir )
+        self.assertEqual( entry[ "digest" ], CGAssetFingerprint.hashFile( src ) )
+        self.assertEqual( entry[ "object" ], store.objectPath( entry[ "digest" ], ".png" ) )
+        self.assertTrue( entry[ "linked" ] )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#udim and frame token expansion tests against a temporary folder, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetTextures
+
+
+
+
+class TokenTest( unittest.TestCase ):
+
+    def test_has_tokens( self ):
+
+        for path in ( "tex/skin.<UDIM>.exr", "tex/skin.<udim>.exr", "tex/skin_<u>_<v>.exr", "tex/skin<tile>.exr", "tex/smoke.<f>.exr", "tex/smoke.####.exr" ):
+            self.assertTrue( CGAssetTextures.hasTokens( path ), path )
+
+        #only the file name counts, not the folders above it
+        for path in ( "tex/skin.1001.exr", "tex/<UDIM>/skin.exr", "tex/#old/skin.exr", "", None ):
+            self.assertFalse( CGAssetTextures.hasTokens( path ), path )
+
+
+
+    def test_udim( self ):
+
+        regex = CGAssetTextures.patternRegex( "skin.<UDIM>.exr" )
+        self.assertTrue( regex.match( "skin.1001.exr" ) )
+        self.assertFalse( regex.match( "skin.101.exr" ) )
+        self.assertFalse( regex.match( "skin.10011.exr" ) )
+        self.assertFalse( regex.match( "skinX1001.exr" ) )
+        self.assertFalse( regex.match( "skin.1001.exr.bak" ) )
+
+
+
+    def test_uv_tiles( self ):
+
+        self.assertTrue( CGAssetTextures.patternRegex( "skin_u<u>_v<v>.exr" ).match( "skin_u1_v12.exr" ) )
+        self.assertTrue( CGAssetTextures.patternRegex( "skin_<U>_<V>.exr" ).match( "skin_0_0.exr" ) )
+        self.assertTrue( CGAssetTextures.patternRegex( "skin<tile>.exr" ).match( "skin_u1_v2.exr" ) )
+        self.assertFalse( CGAssetTextures.patternRegex( "skin<tile>.exr" ).match( "skin_1_2.exr" ) )
+
+
+
+    def test_frames( self ):
+
+        self.assertTrue( CGAssetTextures.patternRegex( "smoke.<f>.exr" ).match( "smoke.7.exr" ) )
+
+        #padding is a minimum, frames past it grow longer
+        regex = CGAssetTextures.patternRegex( "smoke.####.exr" )
+        self.assertTrue( regex.match( "smoke.0007.exr" ) )
+        self.assertTrue( regex.match( "smoke.10000.exr" ) )
+        self.assertFalse( regex.match( "smoke.007.exr" ) )
+
+
+
+
+class ExpandTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.dir = tempfile.mkdtemp().replace( "\\", "/" )
+        for name, size in ( ( "skin.1001.exr", 10 ), ( "skin.1002.exr", 20 ), ( "skin.1011.exr", 30 ), ( "skin.exr", 40 ), ( "eyes.1001.exr", 50 ), ( "smoke.0001.exr", 1 ), ( "smoke.0002.exr", 2 ) ):
+            with open( self.dir+"/"+name, 'wb' ) as f:
+                f.write( b"x"*size )
+        os.mkdir( self.dir+"/skin.1003.exr" )
+
+
+
+    def tearDown( self ):
+
+        shutil.rmtree( self.dir, ignore_errors=True )
+
+
+
+    def test_expand( self ):
+
+        listings = {}
+
+        #folders that only look like a tile are left out
+        self.assertEqual( CGAssetTextures.expandPattern( self.dir+"/skin.<UDIM>.exr", listings ), [ ( self.dir+"/skin.1001.exr", 10 ), ( self.dir+"/skin.1002.exr", 20 ), ( self.dir+"/skin.1011.exr", 30 ) ] )
+        self.assertEqual( CGAssetTextures.expandPattern( self.dir+"/smoke.####.exr", listings ), [ ( self.dir+"/smoke.0001.exr", 1 ), ( self.dir+"/smoke.0002.exr", 2 ) ] )
+        self.assertEqual( CGAssetTextures.expandPattern( self.dir+"/hair.<UDIM>.exr", listings ), [] )
+
+
+
+    def test_listed_once( self ):
+
+        #a folder is read from the share once per resolve, however many nodes point into it
+        listings = {}
+        CGAssetTextures.expandPattern( self.dir+"/skin.<UDIM>.exr", listings )
+        os.remove( self.dir+"/eyes.1001.exr" )
+
+        self.assertEqual( CGAssetTextures.expandPattern( self.dir+"/eyes.<UDIM>.exr", listings ), [ ( self.dir+"/eyes.1001.exr", 50 ) ] )
+        self.assertEqual( list( listings ), [ self.dir ] )
+
+
+
+    def test_missing_folder( self ):
+
+        self.assertEqual( CGAssetTextures.expandPattern( self.dir+"/gone/skin.<UDIM>.exr", {} ), [] )
+
+
+
+
+class TextureSetTest( unittest.TestCase ):
+
+    def test_shared_files( self ):
+
+        textures = CGAssetTextures.TextureSet()
+        textures.nodes[ "skinFile" ] = []
+        textures.nodes[ "skinCopy" ] = []
+        textures.add( "skinFile", "/tex/skin.1001.exr", 10 )
+        textures.add( "skinFile", "/tex/skin.1002.exr", 20 )
+        textures.add( "skinCopy", "/tex/./skin.1001.exr", 10 )
+
+        #two nodes on one file copy it once
+        self.assertEqual( list( textures.files ), [ "/tex/skin.1001.exr", "/tex/skin.1002.exr" ] )
+        self.assertEqual( textures.nodes[ "skinCopy" ], [ "/tex/skin.1001.exr" ] )
+        self.assertEqual( textures.totalBytes(), 30 )
+        self.assertEqual( textures.copyJobs( "/v001/textures" ), { "/v001/textures/skin.1001.exr": "/tex/skin.1001.exr", "/v001/textures/skin.1002.exr": "/tex/skin.1002.exr" } )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+#version allocation tests against a temporary job folder, no maya needed
+#python -m unittest discover tests
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import subprocess
+import multiprocessing
+
+sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "CGassetManager", "scripts" ) )
+
+import CGAssetVersions
+
+
+
+
+def allocateMany( jobDir ):
+
+    return [ CGAssetVersions.allocateVersion( jobDir ) for i in range( 5 ) ]
+
+
+
+
+class VersionTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        self.jobDir = tempfile.mkdtemp().replace( "\\", "/" )
+        self.session = os.environ.get( CGAssetVersions.sessionEnv )
+
+
+
+    def tearDown( self ):
+
+        if self.session is None:
+            os.environ.pop( CGAssetVersions.sessionEnv, None )
+        else:
+            os.environ[ CGAssetVersions.sessionEnv ] = self.session
+        shutil.rmtree( self.jobDir, ignore_errors=True )
+
+
+
+    def otherSession( self ):
+
+        #the owner files written from here on belong to somebody else
+        os.environ[ CGAssetVersions.sessionEnv ] = "other"
+
+
+
+    def versionDir( self, version ):
+
+        return self.jobDir+"/"+version
+
+
+
+
+class AllocateTest( VersionTest ):
+
+    def test_sequential( self ):
+
+        self.assertEqual( CGAssetVersions.peekVersion( self.jobDir ), "v001" )
+        self.assertEqual( [ CGAssetVersions.allocateVersion( self.jobDir ) for i in range( 3 ) ], [ "v001", "v002", "v003" ] )
+        self.assertEqual( CGAssetVersions.readCounter( self.jobDir ), 3 )
+        self.assertEqual( CGAssetVersions.stagedVersions( self.jobDir ), [ "v001", "v002", "v003" ] )
+        self.assertEqual( CGAssetVersions.listVersions( self.jobDir ), [ "v001", "v002", "v003" ] )
+        self.assertEqual( CGAssetVersions.publishedVersions( self.jobDir ), [] )
+
+        #reserved in staging only, nothing is visible in the job folder yet
+        self.assertFalse( os.path.exists( self.versionDir( "v001" ) ) )
+        self.assertTrue( CGAssetVersions.isStaged( self.versionDir( "v001" ) ) )
+
+
+
+    def test_trailing_slash( self ):
+
+        version = CGAssetVersions.allocateVersion( self.jobDir+"/" )
+
+        self.assertEqual( version, "v001" )
+        self.assertTrue( os.path.isfile( CGAssetVersions.ownerPath( self.versionDir( version ) ) ) )
+        self.assertEqual( CGAssetVersions.stagedVersions( self.jobDir ), [ "v001" ] )
+        self.assertEqual( CGAssetVersions.allocateVersion( self.jobDir ), "v002" )
+
+
+
+    def test_legacy_job( self ):
+
+        #versions made before the counter and staging existed
+        for version in ( "v001", "v002", "v007", "notes" ):
+            os.mkdir( self.versionDir( version ) )
+
+        self.assertEqual( CGAssetVersions.lastVersion( self.jobDir ), 7 )
+        self.assertEqual( CGAssetVersions.allocateVersion( self.jobDir ), "v008" )
+        self.assertEqual( CGAssetVersions.listVersions( self.jobDir ), [ "v001", "v002", "v007", "v008" ] )
+
+
+
+    def test_counter_behind( self ):
+
+        #a lost counter write never hands out a published number again
+        os.mkdir( self.versionDir( "v001" ) )
+        os.mkdir( self.versionDir( "v002" ) )
+        CGAssetVersions.writeCounter( self.jobDir, 1 )
+
+        self.assertEqual( CGAssetVersions.allocateVersion( self.jobDir ), "v003" )
+
+
+
+    def test_threads( self ):
+
+        names = []
+        lock = threading.Lock()
+
+        def allocate():
+            allocated = allocateMany( self.jobDir )
+            with lock:
+                names.extend( allocated )
+
+        threads = [ threading.Thread( target=allocate ) for i in range( 8 ) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual( len( names ), 40 )
+        self.assertEqual( sorted( names ), [ CGAssetVersions.versionName( i ) for i in range( 1, 41 ) ] )
+        self.assertEqual( CGAssetVersions.scanVersions( self.jobDir ), sorted( names ) )
+
+
+
+    def test_processes( self ):
+
+        pool = multiprocessing.Pool( 4 )
+        try:
+            names = sum( pool.map( allocateMany, [ self.jobDir ]*8 ), [] )
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual( len( set( names ) ), 40 )
+        self.assertEqual( sorted( names ), [ CGAssetVersions.versionName( i ) for i in range( 1, 41 ) ] )
+
+
+
+
+class PublishTest( VersionTest ):
+
+    def test_publish( self ):
+
+        version = CGAssetVersions.allocateVersion( self.jobDir )
+        staged = CGAssetVersions.workDir( self.versionDir( version ) )
+        os.mkdir( staged+"/maya_files" )
+
+        self.assertEqual( CGAssetVersions.publishVersion( self.versionDir( version ) ), self.versionDir( version ) )
+        self.assertTrue( os.path.isdir( self.versionDir( version )+"/maya_files" ) )
+        self.assertFalse( os.path.exists( staged ) )
+        self.assertFalse( os.path.exists( CGAssetVersions.ownerPath( self.versionDir( version ) ) ) )
+        self.assertEqual( CGAssetVersions.stagedVersions( self.jobDir ), [] )
+        self.assertEqual( CGAssetVersions.scanVersions( self.jobDir ), [ version ] )
+        self.assertEqual( CGAssetVersions.publishedVersions( self.jobDir ), [ version ] )
+        self.assertEqual( CGAssetVersions.workDir( self.versionDir( version ) ), self.versionDir( version ) )
+
+
+
+    def test_latest( self ):
+
+        for i in range( 3 ):
+            CGAssetVersions.allocateVersion( self.jobDir )
+        CGAssetVersions.publishVersion( self.versionDir( "v001" ) )
+        CGAssetVersions.writeLatest( self.jobDir, "v001" )
+        self.assertEqual( CGAssetVersions.latestVersion( self.jobDir ), "v001" )
+
+        #an older rebuild does not move it back
+        CGAssetVersions.publishVersion( self.versionDir( "v002" ) )
+        CGAssetVersions.writeLatest( self.jobDir, "v002" )
+        CGAssetVersions.writeLatest( self.jobDir, "v001" )
+        self.assertEqual( CGAssetVersions.readLatest( self.jobDir ), "v002" )
+
+
+
+    def test_latest_skips_held( self ):
+
+        #without a latest build, a version somebody else is building is not selected
+        CGAssetVersions.allocateVersion( self.jobDir )
+        CGAssetVersions.publishVersion( self.versionDir( "v001" ) )
+        self.otherSession()
+        CGAssetVersions.allocateVersion( self.jobDir )
+        os.environ[ CGAssetVersions.sessionEnv ] = "mine"
+
+        self.assertEqual( CGAssetVersions.latestVersion( self.jobDir ), "v001" )
+
+
+
+
+class ClaimTest( VersionTest ):
+
+    def test_own_version( self ):
+
+        version = CGAssetVersions.allocateVersion( self.jobDir )
+        CGAssetVersions.claimVersion( self.versionDir( version ) )
+        self.assertIsNone( CGAssetVersions.reservationHolder( self.versionDir( version ) ) )
+
+
+
+    def test_held_by_other_session( self ):
+
+        self.otherSession()
+        version = CGAssetVersions.allocateVersion( self.jobDir )
+        os.environ[ CGAssetVersions.sessionEnv ] = "mine"
+
+        self.assertRaises( CGAssetVersions.ReservedError, CGAssetVersions.claimVersion, self.versionDir( version ) )
+        self.assertEqual( CGAssetVersions.readOwner( self.versionDir( version ) )[ "session" ], "other" )
+
+
+
+    def test_dead_owner( self ):
+
+        #the session that reserved it crashed, its process is gone
+        process = subprocess.Popen( [ sys.executable, "-c", "pass" ] )
+        process.wait()
+
+        version = CGAssetVersions.allocateVersion( self.jobDir )
+        owner = CGAssetVersions.readOwner( self.versionDir( version ) )
+        owner.update( session="other", pid=process.pid )
+        CGAssetVersions.writeText( CGAssetVersions.ownerPath( self.versionDir( version ) ), json.dumps( owner ) )
+
+        CGAssetVersions.claimVersion( self.versionDir( version ) )
+        self.assertEqual( CGAssetVersions.readOwner( self.versionDir( version ) )[ "session" ], CGAssetVersions.sessionId() )
+
+
+
+    def test_legacy_reservation( self ):
+
+        #staged before owner files existed, only the age of the folder tells
+        staged = CGAssetVersions.stagingPath( self.versionDir( "v001" ) )
+        os.makedirs( staged )
+        self.assertIsNotNone( CGAssetVersions.reservationHolder( self.versionDir( "v001" ) ) )
+
+        old = time.time() - CGAssetVersions.staleReservation - 60
+        os.utime( staged, ( old, old ) )
+        self.assertIsNone( CGAssetVersions.reservationHolder( self.versionDir( "v001" ) ) )
+        CGAssetVersions.claimVersion( self.versionDir( "v001" ) )
+
+
+
+    def test_published_needs_no_claim( self ):
+
+        os.mkdir( self.versionDir( "v001" ) )
+        CGAssetVersions.claimVersion( self.versionDir( "v001" ) )
+        self.assertIsNone( CGAssetVersions.readOwner( self.versionDir( "v001" ) ) )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()